@@ -1,210 +1,262 @@
+import asyncio
+import logging
 import os
+import time
 from dotenv import load_dotenv
 
 # 設置環境變量以抑制 gRPC 警告
 os.environ['GRPC_ENABLE_FORK_SUPPORT'] = '0'
 os.environ['GRPC_POLL_STRATEGY'] = 'epoll1'
 
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_openai import ChatOpenAI
-from langchain.agents import AgentExecutor, create_openai_tools_agent
-from langchain_core.messages import SystemMessage
-from langchain.memory import ConversationBufferMemory
-from langchain.callbacks.manager import CallbackManager
-from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.messages import AIMessage, ToolMessage
 import chainlit as cl
+from chainlit.server import app as chainlit_app
 
-from tools.sql_query import SQLQueryTool
-from tools.translator import PowerPointTranslator
+from core.agent import get_agent_components, new_memory
+from core.metrics import MetricsCallbackHandler, mount_metrics
+from core.prompts import (PromptUsageTracker, get_usage_tracker, prompt_tokens,
+                          section_messages, select_sections)
+from core.router import get_intent_router
+from core.session_store import get_session_store, load_job, load_memory, save_job, save_memory
+from core.streaming import TRANSLATION_COMPLETE, ChainlitStreamHandler
+from core.warmup import WARMUP, start_warmup, warm_llm_connection
+from tools.llm_scheduler import INTERACTIVE, set_llm_context
+from tools.logging_setup import get_logger, log_event, setup_logging
+from tools.metrics import METRICS, TURN_SECONDS
+from tools.sql_templates import get_template_store, is_error_result
 
 load_dotenv()
 open_ai_key = os.getenv('OPENAI_API_KEY', None)
 db_url = os.getenv('CLEARDB_DATABASE_URL', None)
 
+# 結構化日誌由背景執行緒寫出，不阻塞事件迴圈
+setup_logging()
+logger = get_logger('app')
+
+# Prometheus 格式的延遲指標，與 Chainlit 介面使用同一個伺服器
+if METRICS:
+    mount_metrics(chainlit_app)
+
+# 代理元件在背景載入並預先建立資料庫連線，伺服器不必等待
+if WARMUP:
+    start_warmup()
+
 @cl.on_chat_start
 async def start():
-    # 設置 callbacks
-    callback_manager = CallbackManager([StreamingStdOutCallbackHandler()])
-
-    # Model
-    llm = ChatOpenAI(
-        temperature=0,
-        model="gpt-4o-mini-2024-07-18",
-        streaming=True,
-        callback_manager=callback_manager
-    )
+    # LLM、工具與 AgentExecutor 整個程序共用，對話記憶放在共用的 session 儲存
+    # 第一次建立時需載入套件，交給執行緒以免阻塞事件迴圈
+    components = await cl.make_async(get_agent_components)()
+    await session_memory()
+    if WARMUP:
+        # 使用者輸入第一個問題的同時建立與 OpenAI 的連線
+        asyncio.create_task(warm_llm_connection())
+    await resume_translation(components)
 
-    # Tools
-    tools = [
-        SQLQueryTool(),
-        PowerPointTranslator()
-    ]
 
-    # System Message
-    system_message = """You are a nice chatbot who can help users query the sales database and translate PowerPoint files.
-        
-        IMPORTANT: You must FIRST determine the user's intent before taking any action.
-        
-        TRANSLATION STATE TRACKING:
-        1. Keep track of the current translation state:
-           - NO_TRANSLATION: No translation in progress
-           - WAITING_FOR_FILE: Waiting for user to upload a file
-           - TRANSLATION_COMPLETE: Translation has been completed
-        
-        2. State transitions:
-           - Start in NO_TRANSLATION state
-           - Move to WAITING_FOR_FILE when user requests translation
-           - Move to TRANSLATION_COMPLETE when translation is done
-           - Return to NO_TRANSLATION when user starts a new conversation
-        
-        For PowerPoint translation:
-        1. ONLY call the translate_ppt tool when:
-           - Current state is NO_TRANSLATION AND
-           - The user EXPLICITLY requests PowerPoint translation AND
-           - The user specifies source and target languages
-        
-        2. DO NOT call translate_ppt when:
-           - Current state is WAITING_FOR_FILE (wait for file upload)
-           - Current state is TRANSLATION_COMPLETE
-           - The user is just chatting
-           - The user asks about other topics
-        
-        The translate_ppt tool requires two parameters:
-        - olang: The original language code
-        - tlang: The target language code
-        
-        Language code mapping rules (STRICTLY FOLLOW THESE):
-        - For Chinese/中文/繁體中文: ALWAYS use "zh-TW"
-        - For English/英文: ALWAYS use "en"
-        - For Japanese/日文: ALWAYS use "ja"
-        
-        TRANSLATION REQUEST PATTERNS TO RECOGNIZE:
-        1. English patterns:
-           - "translate [this/the] [ppt/powerpoint/presentation] from X to Y"
-           - "translate from X to Y"
-           - "X to Y translation"
-        
-        2. Chinese patterns:
-           - "[幫我/請]將[ppt/簡報]從X翻譯成Y"
-           - "[幫我/請]把[ppt/簡報]從X翻譯成Y"
-           - "從X翻譯成Y"
-           - "[ppt/簡報]從X翻Y"
-           - "[X轉Y/X翻Y]"
-        
-        3. Japanese patterns:
-           - "[ppt/パワーポイント]をXからYに翻訳"
-           - "XからYに翻訳"
-           - "X語からY語に"
-        
-        TRANSLATION HANDLING STEPS:
-        1. If you see ANY of the above patterns AND current state is NO_TRANSLATION:
-           - IMMEDIATELY call translate_ppt tool with appropriate language codes
-           - DO NOT ask for confirmation
-           - DO NOT engage in additional dialogue
-           - Just call the tool and wait for upload
-        
-        2. If languages are not specified:
-           - Ask for languages in the same language as the user's request
-           - Once they specify, IMMEDIATELY call translate_ppt
-        
-        3. After translation is complete:
-           - If the tool returns "TRANSLATION_COMPLETE":
-             - DO NOT call translate_ppt again
-             - DO NOT send any message
-             - Wait for the next user request
-           - If the tool returns any other message:
-             - Send that message to the user
-             - Wait for the next user request
-        
-        For database queries:
-        You can execute SQL queries to get information from the database.
-        The database has a 'sales' table with the following columns:
-        - ID (VARCHAR)
-        - Date (DATE)
-        - Region (VARCHAR) - Values: 関東, 関西
-        - City (VARCHAR) - Values: 東京, 横浜, 埼玉, 千葉, 京都, 大阪, 神戸
-        - Category (VARCHAR) - Values: 野菜, 果物
-        - Product (VARCHAR) - Various products like キャベツ, 玉ねぎ, トマト, リンゴ, みかん, バナナ
-        - Quantity (INT)
-        - Unit_Price (DECIMAL)
-        - Total_Price (DECIMAL)
-        
-        LANGUAGE RESPONSE RULES:
-        1. ALWAYS detect the language of the user's input
-        2. Respond in the SAME language as the user's input
-        3. Keep all technical terms and database values in their original form
-        
-        EXAMPLES:
-        User: "I want to translate this presentation from Chinese to English"
-        State: NO_TRANSLATION
-        Action: MUST call translate_ppt with olang="zh-TW", tlang="en" FIRST
-        Assistant: "Please upload your PowerPoint file for translation"
-        
-        User: "幫我將ppt從英文翻譯為繁體中文"
-        State: NO_TRANSLATION
-        Action: MUST call translate_ppt with olang="en", tlang="zh-TW" FIRST
-        Assistant: "請上傳您的 PowerPoint 檔案進行翻譯"
-        
-        User: "PPTファイルを翻訳したい"
-        State: NO_TRANSLATION
-        Assistant: "どの言語からどの言語に翻訳しますか？"
-        User: "日本語から英語に"
-        Action: MUST call translate_ppt with olang="ja", tlang="en" FIRST
-        Assistant: "PowerPointファイルをアップロードしてください"
-        
-        User: "Hello, how are you?"
-        State: NO_TRANSLATION
-        Action: DO NOT call translate_ppt
-        Assistant: "Hello! I'm here to help you with PowerPoint translation or database queries. How can I assist you today?"
-        """
-
-    # Memory
-    memory = ConversationBufferMemory(
-        memory_key="chat_history",
-        return_messages=True,
-        output_key="output"
-    )
+def session_id() -> str:
+    # thread id 在重新連線後不變，換到其他 worker 也能找到同一份狀態
+    return cl.context.session.thread_id
+
+
+async def session_memory():
+    """This conversation's memory, rebuilt from the session store if another worker changed it."""
+    store, cached = get_session_store(), cl.user_session.get("memory")
+    try:
+        memory = await cl.make_async(load_memory)(store, session_id(), cached)
+    except Exception as e:
+        log_event(logger, logging.WARNING, 'session.load_failed', error=str(e))
+        memory = cached or new_memory()
+    cl.user_session.set("memory", memory)
+    return memory
+
+
+async def remember(memory, question: str, answer: str) -> None:
+    """Add the turn to the memory and write it back to the session store."""
+    memory.save_context({"input": question}, {"output": answer})
+    try:
+        await cl.make_async(save_memory)(get_session_store(), session_id(), memory)
+    except Exception as e:
+        # 儲存失敗不影響已送出的回答，本機記憶仍保有這個回合
+        log_event(logger, logging.WARNING, 'session.save_failed', error=str(e))
+
+
+async def record_translation(olang: str, tlang: str, result: str = None) -> None:
+    """Save the translation job's state so any worker can see it."""
+    if result is None:
+        status = 'running'
+    else:
+        status = 'complete' if result == TRANSLATION_COMPLETE else 'failed'
+    try:
+        await cl.make_async(save_job)(get_session_store(), session_id(), olang=olang, tlang=tlang,
+                                      status=status, result=result)
+    except Exception as e:
+        log_event(logger, logging.WARNING, 'session.save_failed', error=str(e))
+
+
+class TranslationJobRecorder(AsyncCallbackHandler):
+    """Records a translation job as running when the translator tool starts,
+    before it waits for the upload, so a reconnect can resume it."""
+
+    def __init__(self, tool_name: str):
+        self.tool_name = tool_name
+
+    async def on_tool_start(self, serialized, input_str, *, inputs=None, **kwargs) -> None:
+        name = (serialized or {}).get("name") or kwargs.get("name")
+        if name == self.tool_name and inputs and inputs.get('olang') and inputs.get('tlang'):
+            await record_translation(inputs['olang'], inputs['tlang'])
 
-    # Agent
-    prompt = ChatPromptTemplate.from_messages([
-        SystemMessage(content=system_message),
-        MessagesPlaceholder(variable_name="chat_history"),
-        ("human", "{input}"),
-        MessagesPlaceholder(variable_name="agent_scratchpad"),
-    ])
-
-    agent = create_openai_tools_agent(llm=llm, tools=tools, prompt=prompt)
-
-    agent_executor = AgentExecutor(
-        agent=agent,
-        tools=tools,
-        memory=memory,
-        verbose=True,
-        return_intermediate_steps=True
+
+async def running_translation():
+    """This conversation's translation job if it is still waiting or running, else None."""
+    try:
+        job = await cl.make_async(load_job)(get_session_store(), session_id())
+    except Exception as e:
+        log_event(logger, logging.WARNING, 'session.load_failed', error=str(e))
+        return None
+    if not job or job.get('status') != 'running' or not (job.get('olang') and job.get('tlang')):
+        return None
+    return job
+
+
+async def resume_translation(components) -> None:
+    """Ask again for the file of a translation job cut off by a restart or reconnect."""
+    job = await running_translation()
+    if not job:
+        return
+    olang, tlang = job['olang'], job['tlang']
+    log_event(logger, logging.INFO, 'translate.resumed', olang=olang, tlang=tlang)
+    # 等待上傳或翻譯中的工作隨舊連線中斷，以相同語言重新要求檔案
+    await cl.Message(content=f"The previous translation ({olang} → {tlang}) did not finish. "
+                             "Please upload the file again.").send()
+    set_llm_context(INTERACTIVE, session_id())
+    result = await components.translator.ainvoke({"olang": olang, "tlang": tlang})
+    await record_translation(olang, tlang, result)
+
+
+async def answer_from_template(question: str, memory, callbacks: list):
+    """Answer with a learned SQL template, skipping the LLM call that writes the query.
+
+    Returns None when no template matches or its SQL fails, so the caller
+    falls back to the agent."""
+    store = get_template_store()
+    if not store:
+        return None
+    match = await cl.make_async(store.match)(question)
+    if not match:
+        return None
+
+    components = get_agent_components()
+    sql_tool = components.sql_tool
+    result = await sql_tool.ainvoke({"query": match.sql})
+    if is_error_result(result):
+        store.forget(match.template)
+        return None
+    log_event(logger, logging.INFO, 'template.answered', sql=match.sql, hits=match.template.hits)
+
+    # 以樣板產生的查詢與結果組成工具呼叫紀錄，只請模型撰寫最後的回答
+    call_id = f"template_{match.template.hits}"
+    scratchpad = [
+        AIMessage(content="", tool_calls=[
+            {"name": sql_tool.name, "args": {"query": match.sql}, "id": call_id}
+        ]),
+        ToolMessage(content=str(result), tool_call_id=call_id),
+    ]
+    messages = components.prompt.format_messages(
+        input=question,
+        chat_history=memory.messages,
+        tool_sections=section_messages(['sql']),
+        agent_scratchpad=scratchpad
     )
-    
-    cl.user_session.set("agent", agent_executor)
+    response = await components.llm.ainvoke(messages, config={"callbacks": callbacks})
+    await remember(memory, question, response.content)
+    return response.content
 
 @cl.on_message
 async def main(message: cl.Message):
-    agent = cl.user_session.get("agent")
-    
+    components = get_agent_components()
+    agent = components.executor
+    memory = await session_memory()
+    # 每則訊息在自己的 task 中處理，這個回合的 LLM 呼叫都以對話優先並計入這個使用者
+    set_llm_context(INTERACTIVE, session_id())
+
+    started = time.perf_counter()
     try:
-        # 打印使用者輸入
-        print(f"\nUser input: {message.content}")
-        
-        response = await cl.make_async(agent.invoke)(
-            {"input": str(message.content)}
-        )
-        print(f"\nTool invocation: {response.get('intermediate_steps', [])}")
-        
-        # 檢查是否為翻譯完成訊息
-        if response["output"] == "TRANSLATION_COMPLETE":
-            # 翻譯已完成，不需要再發送訊息
+        # 使用者原文可能含個人資料，只在 DEBUG 等級記錄
+        log_event(logger, logging.INFO, 'turn.started', chars=len(message.content))
+        log_event(logger, logging.DEBUG, 'turn.input', input=message.content)
+
+        # 模型的 token 與工具步驟在產生時就推送到使用者的畫面
+        stream = ChainlitStreamHandler()
+        usage = PromptUsageTracker()
+        callbacks = [stream, usage, get_usage_tracker(), MetricsCallbackHandler(),
+                     TranslationJobRecorder(components.translator.name)]
+
+        # 明確的翻譯請求直接呼叫翻譯工具，不必等模型決定
+        intent = get_intent_router().route(str(message.content))
+        if intent:
+            job = await running_translation()
+            if job:
+                # 前一個翻譯仍在等待上傳，不再開第二個上傳視窗
+                log_event(logger, logging.INFO, 'turn.translation_busy', olang=job['olang'], tlang=job['tlang'])
+                answer = (f"The translation ({job['olang']} → {job['tlang']}) is still waiting for its file. "
+                          "Please upload it or wait for it to finish.")
+                await stream.finish(answer)
+                TURN_SECONDS.observe(time.perf_counter() - started, path='router')
+                return
+            log_event(logger, logging.INFO, 'turn.routed', olang=intent.olang, tlang=intent.tlang,
+                      **get_intent_router().stats())
+            result = await components.translator.ainvoke(
+                intent.model_dump(), config={"callbacks": callbacks}
+            )
+            await record_translation(intent.olang, intent.tlang, result)
+            await remember(memory, str(message.content), result)
+            await stream.finish(result)
+            TURN_SECONDS.observe(time.perf_counter() - started, path='router')
+            return
+
+        answer = await answer_from_template(str(message.content), memory, callbacks)
+        if answer is not None:
+            await stream.finish(answer)
+            TURN_SECONDS.observe(time.perf_counter() - started, path='template')
             return
-            
-        await cl.Message(content=response["output"]).send()
+
+        # 只附上這個問題可能用到的工具段落
+        history = memory.messages
+        sections = select_sections(str(message.content), history)
+
+        # 整個回合在 event loop 上非同步執行，阻塞的工具各自交給工具執行緒池
+        response = await agent.ainvoke({
+            "input": str(message.content),
+            "chat_history": history,
+            "tool_sections": section_messages(sections)
+        }, config={"callbacks": callbacks})
+        steps = response.get('intermediate_steps', [])
+        log_event(logger, logging.DEBUG, 'agent.steps',
+                  steps=[{'tool': action.tool, 'input': str(action.tool_input)} for action, _ in steps])
+        log_event(logger, logging.INFO, 'turn.answered', tools=[action.tool for action, _ in steps],
+                  sections=sections, memory=memory.last_stats, prompt=prompt_tokens(sections),
+                  usage=usage.stats())
+        await remember(memory, str(message.content), response["output"])
+        for action, observation in steps:
+            if action.tool == components.translator.name and isinstance(action.tool_input, dict):
+                await record_translation(action.tool_input.get('olang'), action.tool_input.get('tlang'),
+                                         str(observation))
+
+        # 結束串流中的訊息；翻譯完成時不顯示狀態字串
+        await stream.finish(response["output"])
+        TURN_SECONDS.observe(time.perf_counter() - started, path='agent')
+        if response["output"] == TRANSLATION_COMPLETE:
+            return
+
+        # 對話第一個問題以單次 SQL 查詢成功回答時學成樣板，下次同類問題可略過產生 SQL
+        store = get_template_store()
+        if store:
+            await cl.make_async(store.learn_from_steps)(
+                str(message.content), response.get('intermediate_steps', []), history
+            )
     except Exception as e:
         error_message = f"Error occurred: {str(e)}"
-        print(f"Error: {error_message}")
+        log_event(logger, logging.ERROR, 'turn.error', exc_info=e, error=str(e))
+        TURN_SECONDS.observe(time.perf_counter() - started, path='error')
         await cl.Message(content=error_message).send()
@@ -0,0 +1,192 @@
+"""Local stand-in for the OpenAI chat-completions API, for load tests.
+
+Usage:
+    python -m benchmarks.fake_llm [--port 8765] [--latency-ms 300] [--token-ms 5]
+
+Point the app at it with ``OPENAI_BASE_URL=http://127.0.0.1:8765/v1``.
+Every reply waits ``--latency-ms`` (plus up to ``--jitter-ms``) before the
+first token, then streams ``--answer-tokens`` tokens ``--token-ms`` apart.
+With ``--capacity N`` only N completions are served at once and the rest
+wait in arrival order, like a provider's throughput limit.
+Replies are scripted from the request instead of generated:
+
+- the agent's first call for a question gets a tool call: ``translate_ppt``
+  when the question asks for a translation, otherwise ``execute_sql_query``
+  with one of ``SQL_QUERIES``;
+- the translator's calls get the text back with a prefix;
+- everything else (the agent after a tool result, summaries) gets a fixed
+  answer.
+
+Streaming, ``stream_options.include_usage`` and tool-call deltas follow the
+OpenAI wire format, so ``ChatOpenAI`` runs unchanged.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+MODEL = 'fake-llm'
+
+SQL_QUERIES = {
+    'city': "SELECT City, SUM(Total_Price) AS total FROM sales GROUP BY City ORDER BY total DESC LIMIT 5",
+    'product': "SELECT Product, SUM(Quantity) AS quantity FROM sales GROUP BY Product "
+               "ORDER BY quantity DESC LIMIT 5",
+    'category': "SELECT Category, SUM(Total_Price) AS total FROM sales GROUP BY Category",
+    'region': "SELECT Region, COUNT(*) AS orders FROM sales GROUP BY Region",
+}
+_SQL_KEYWORDS = {
+    'city': ('city', 'cities', '城市'),
+    'product': ('product', '產品', '商品'),
+    'category': ('category', '類別', '分類'),
+}
+_TRANSLATE_WORDS = ('translate', 'translation', '翻譯', '翻成', '翻譯成')
+
+
+def _text(message: Dict[str, Any]) -> str:
+    content = message.get('content') or ''
+    if isinstance(content, list):
+        content = ' '.join(part.get('text', '') for part in content if isinstance(part, dict))
+    return str(content)
+
+
+def plan_reply(body: Dict[str, Any], answer_tokens: int = 40) -> Dict[str, Any]:
+    """The scripted reply to a chat-completions request: ``content`` or a ``tool_call``."""
+    messages: List[Dict[str, Any]] = body.get('messages') or []
+    tools = {tool['function']['name'] for tool in body.get('tools') or [] if 'function' in tool}
+    system = ' '.join(_text(m) for m in messages if m.get('role') == 'system')
+    last = messages[-1] if messages else {}
+
+    if 'professional translator' in system:
+        return {'content': f"[translated] {_text(last)}"}
+    if tools and last.get('role') == 'user':
+        question = _text(last).lower()
+        if 'translate_ppt' in tools and any(word in question for word in _TRANSLATE_WORDS):
+            return {'tool_call': ('translate_ppt', {'olang': 'en', 'tlang': 'ja'})}
+        if 'execute_sql_query' in tools:
+            key = next((key for key, words in _SQL_KEYWORDS.items() if any(w in question for w in words)),
+                       'region')
+            return {'tool_call': ('execute_sql_query', {'query': SQL_QUERIES[key]})}
+    words = ("根據查詢結果", "銷售", "最高的", "是", "台北", "，", "其次", "是", "台中", "。")
+    return {'content': ''.join(words[i % len(words)] for i in range(answer_tokens))}
+
+
+def _usage(body: Dict[str, Any], completion_tokens: int) -> Dict[str, int]:
+    prompt = sum(len(_text(m)) for m in body.get('messages') or []) // 4
+    return {'prompt_tokens': prompt, 'completion_tokens': completion_tokens,
+            'total_tokens': prompt + completion_tokens,
+            'prompt_tokens_details': {'cached_tokens': 0}}
+
+
+def _tool_call(call) -> Dict[str, Any]:
+    name, args = call
+    return {'id': f"call_{uuid.uuid4().hex[:12]}", 'type': 'function',
+            'function': {'name': name, 'arguments': json.dumps(args, ensure_ascii=False)}}
+
+
+def _chunk(completion_id: str, delta: Dict[str, Any], finish_reason: Optional[str] = None,
+           usage: Optional[Dict[str, int]] = None) -> str:
+    chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()),
+             'model': MODEL, 'choices': [] if usage else [
+                 {'index': 0, 'delta': delta, 'finish_reason': finish_reason}]}
+    if usage:
+        chunk['usage'] = usage
+    return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+
+def create_app(latency_ms: float = 300, jitter_ms: float = 100, token_ms: float = 5,
+               answer_tokens: int = 40, capacity: int = 0):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    app = FastAPI()
+    app.state.requests = 0
+    slots = asyncio.Semaphore(capacity) if capacity > 0 else None
+
+    async def first_token_delay():
+        await asyncio.sleep((latency_ms + random.uniform(0, jitter_ms)) / 1000)
+
+    @asynccontextmanager
+    async def capacity_slot():
+        if slots is None:
+            yield
+            return
+        async with slots:
+            yield
+
+    @app.get('/v1/models')
+    async def models():
+        return {'object': 'list', 'data': [{'id': MODEL, 'object': 'model', 'owned_by': 'local'}]}
+
+    @app.get('/v1/stats')
+    async def stats():
+        return {'requests': app.state.requests}
+
+    @app.post('/v1/chat/completions')
+    async def completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        reply = plan_reply(body, answer_tokens)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+        if not body.get('stream'):
+            async with capacity_slot():
+                await first_token_delay()
+                await asyncio.sleep(token_ms * answer_tokens / 1000)
+            message = {'role': 'assistant', 'content': reply.get('content')}
+            if 'tool_call' in reply:
+                message['tool_calls'] = [_tool_call(reply['tool_call'])]
+            return JSONResponse({
+                'id': completion_id, 'object': 'chat.completion', 'created': int(time.time()),
+                'model': MODEL, 'usage': _usage(body, answer_tokens),
+                'choices': [{'index': 0, 'message': message,
+                             'finish_reason': 'tool_calls' if 'tool_call' in reply else 'stop'}]})
+
+        async def stream():
+            async with capacity_slot():
+                await first_token_delay()
+                if 'tool_call' in reply:
+                    call = _tool_call(reply['tool_call'])
+                    yield _chunk(completion_id, {'role': 'assistant', 'content': None,
+                                                 'tool_calls': [dict(call, index=0)]})
+                    yield _chunk(completion_id, {}, 'tool_calls')
+                    tokens = 1
+                else:
+                    yield _chunk(completion_id, {'role': 'assistant', 'content': ''})
+                    tokens = 0
+                    for token in reply['content']:
+                        if token_ms:
+                            await asyncio.sleep(token_ms / 1000)
+                        yield _chunk(completion_id, {'content': token})
+                        tokens += 1
+                    yield _chunk(completion_id, {}, 'stop')
+            if (body.get('stream_options') or {}).get('include_usage'):
+                yield _chunk(completion_id, {}, usage=_usage(body, tokens))
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type='text/event-stream')
+
+    return app
+
+
+def main(argv=None) -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI chat-completions server.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=300, help="delay before the first token")
+    parser.add_argument('--jitter-ms', type=float, default=100, help="random extra delay")
+    parser.add_argument('--token-ms', type=float, default=5, help="delay between streamed tokens")
+    parser.add_argument('--answer-tokens', type=int, default=40)
+    parser.add_argument('--capacity', type=int, default=0, help="completions served at once (0: unlimited)")
+    args = parser.parse_args(argv)
+    app = create_app(args.latency_ms, args.jitter_ms, args.token_ms, args.answer_tokens, args.capacity)
+    uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
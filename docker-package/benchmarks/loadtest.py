@@ -0,0 +1,275 @@
+"""Concurrent-session load test against a fake LLM and the embedded database.
+
+Usage:
+    python -m benchmarks.loadtest [--sessions 20] [--turns 6] [--translate-every 4]
+                                  [--latency-ms 300] [--token-ms 5] [--slides 3]
+
+Starts ``benchmarks.fake_llm`` on a free port (or uses ``--llm-url``),
+points the app at it and at the embedded ``sqlite://`` database, then runs
+``--sessions`` simulated users at once through the same ``on_chat_start``
+and ``on_message`` handlers Chainlit calls. Each user follows a scripted
+conversation of sales questions, with every ``--translate-every``-th turn a
+translation request whose upload is answered with a generated deck of
+``--slides`` slides. Outgoing UI events go to a stub emitter.
+
+The report (JSON) gives throughput, p50/p95/p99 turn latency overall and
+per kind, event-loop lag sampled every 10 ms, resident memory per session
+and the size of each session's stored state.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from chainlit.emitter import BaseChainlitEmitter
+
+QUESTIONS = [
+    "Which cities had the highest sales?",
+    "各城市的銷售額是多少？",
+    "What are our best-selling products?",
+    "Show total sales by category",
+    "How many orders did each region place?",
+    "哪個產品賣得最多？",
+]
+# 第一句由本機路由直接交給翻譯工具，第二句經過代理決定
+TRANSLATIONS = [
+    "Please translate my PowerPoint from English to Japanese",
+    "Can you translate a presentation for me?",
+]
+PPTX_TYPE = 'application/vnd.openxmlformats-officedocument.presentationml.presentation'
+LAG_INTERVAL = 0.01
+
+
+def conversation(index: int, turns: int, translate_every: int) -> List[Tuple[str, str]]:
+    """The scripted (kind, text) turns of the ``index``-th user."""
+    script = []
+    for turn in range(turns):
+        if translate_every and (turn + 1) % translate_every == 0:
+            script.append(('translate', TRANSLATIONS[(index + turn) % len(TRANSLATIONS)]))
+        else:
+            script.append(('sql', QUESTIONS[(index + turn) % len(QUESTIONS)]))
+    return script
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 1)
+
+    return {'p50': pick(0.5), 'p95': pick(0.95), 'p99': pick(0.99), 'max': round(ordered[-1], 1),
+            'mean': round(statistics.fmean(ordered), 1)}
+
+
+def rss_bytes() -> int:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def make_deck(path: str, slides: int) -> str:
+    from pptx import Presentation
+    from pptx.util import Inches
+
+    presentation = Presentation()
+    for index in range(slides):
+        slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+        slide.shapes.title.text = f"Quarterly sales review {index + 1}"
+        slide.placeholders[1].text = "Revenue grew in every region\nTaipei remains the largest market"
+        box = slide.shapes.add_textbox(Inches(1), Inches(6), Inches(6), Inches(1))
+        box.text_frame.text = "Source: sales database"
+    presentation.save(path)
+    return path
+
+
+class LoadTestEmitter(BaseChainlitEmitter):
+    """Answers file requests with the sample deck and counts error messages."""
+
+    def __init__(self, session, deck_path: str):
+        super().__init__(session)
+        self.deck_path = deck_path
+        self.errors = 0
+
+    async def send_ask_user(self, step_dict, spec, raise_on_timeout=False):
+        if spec.type != 'file':
+            return None
+        # 翻譯工具以檔名建立暫存檔，每次上傳用不同名稱以免互相覆蓋
+        return [{'id': str(uuid.uuid4()), 'name': f"loadtest-{uuid.uuid4().hex[:8]}.pptx",
+                 'path': self.deck_path, 'size': os.path.getsize(self.deck_path), 'type': PPTX_TYPE}]
+
+    async def send_step(self, step_dict):
+        if str(step_dict.get('output') or '').startswith('Error occurred'):
+            self.errors += 1
+
+
+async def run_session(index: int, args, deck_path: str, turns: list) -> str:
+    import chainlit as cl
+    from chainlit.config import config
+    from chainlit.context import ChainlitContext, context_var
+    from chainlit.session import HTTPSession
+
+    session = HTTPSession(id=str(uuid.uuid4()), client_type='webapp', thread_id=str(uuid.uuid4()))
+    emitter = LoadTestEmitter(session, deck_path)
+    # 每個使用者是一個 task，context 只在這個 task 內生效
+    context_var.set(ChainlitContext(session, emitter))
+    await asyncio.sleep(random.uniform(0, args.ramp_seconds))
+    try:
+        await config.code.on_chat_start()
+        for kind, text in conversation(index, args.turns, args.translate_every):
+            errors = emitter.errors
+            started = time.perf_counter()
+            await config.code.on_message(cl.Message(content=text, author='User', type='user_message'))
+            turns.append({'kind': kind, 'ms': (time.perf_counter() - started) * 1000,
+                          'error': emitter.errors > errors})
+            await asyncio.sleep(random.uniform(0, 2 * args.think_ms) / 1000)
+    finally:
+        # 翻譯結果的下載檔案存在 session 目錄（.files），結束時一併刪除
+        session.delete()
+    return session.thread_id
+
+
+async def monitor(stop: asyncio.Event, lags: List[float], peak: List[int]) -> None:
+    """Sample how late the event loop wakes up, and the peak RSS."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        lags.append(max(0.0, loop.time() - started - LAG_INTERVAL) * 1000)
+        peak[0] = max(peak[0], rss_bytes())
+
+
+async def run_load(args, deck_path: str) -> Dict[str, object]:
+    from core.session_store import encode_state, get_session_store
+    from core.warmup import warm_up
+
+    warm_up()
+    baseline = rss_bytes()
+    stop, lags, peak, turns = asyncio.Event(), [], [baseline], []
+    watcher = asyncio.create_task(monitor(stop, lags, peak))
+
+    started = time.perf_counter()
+    thread_ids = await asyncio.gather(*(run_session(i, args, deck_path, turns) for i in range(args.sessions)))
+    duration = time.perf_counter() - started
+    stop.set()
+    await watcher
+
+    store = get_session_store()
+    states = [store.load(thread_id) for thread_id in thread_ids]
+    state_sizes = [len(encode_state(state)) for state in states if state]
+    return {
+        'sessions': args.sessions,
+        'turns': len(turns),
+        'errors': sum(turn['error'] for turn in turns),
+        'duration_s': round(duration, 2),
+        'throughput_turns_per_s': round(len(turns) / duration, 2),
+        'turn_ms': percentiles([turn['ms'] for turn in turns]),
+        'turn_ms_by_kind': {kind: percentiles([t['ms'] for t in turns if t['kind'] == kind])
+                            for kind in sorted({t['kind'] for t in turns})},
+        'event_loop_lag_ms': percentiles(lags),
+        'rss_baseline_mb': round(baseline / 2 ** 20, 1),
+        'rss_peak_mb': round(peak[0] / 2 ** 20, 1),
+        'rss_per_session_kb': round((peak[0] - baseline) / 1024 / max(1, args.sessions), 1),
+        'session_state_bytes': percentiles(state_sizes),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_fake_llm(args) -> Tuple[subprocess.Popen, str]:
+    """Run benchmarks.fake_llm in its own process so it does not share this event loop."""
+    port = _free_port()
+    command = [sys.executable, '-m', 'benchmarks.fake_llm', '--port', str(port),
+               '--latency-ms', str(args.latency_ms), '--jitter-ms', str(args.jitter_ms),
+               '--token-ms', str(args.token_ms), '--answer-tokens', str(args.answer_tokens),
+               '--capacity', str(args.llm_capacity)]
+    process = subprocess.Popen(command)
+    url = f"http://127.0.0.1:{port}/v1"
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            urllib.request.urlopen(f"{url}/models", timeout=1).read()
+            return process, url
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError("The fake LLM server did not start")
+            time.sleep(0.1)
+
+
+def llm_requests(url: str) -> Optional[int]:
+    try:
+        return json.loads(urllib.request.urlopen(f"{url}/stats", timeout=5).read())['requests']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def main(argv=None) -> Dict[str, object]:
+    parser = argparse.ArgumentParser(description="Drive concurrent chat sessions against a fake LLM.")
+    parser.add_argument('--sessions', type=int, default=20)
+    parser.add_argument('--turns', type=int, default=6, help="turns per session")
+    parser.add_argument('--translate-every', type=int, default=4,
+                        help="every n-th turn is a translation request (0: none)")
+    parser.add_argument('--slides', type=int, default=3, help="slides in the uploaded deck")
+    parser.add_argument('--think-ms', type=float, default=200, help="mean pause between turns")
+    parser.add_argument('--ramp-seconds', type=float, default=1.0, help="spread session starts")
+    parser.add_argument('--latency-ms', type=float, default=300, help="fake LLM delay before the first token")
+    parser.add_argument('--jitter-ms', type=float, default=100)
+    parser.add_argument('--token-ms', type=float, default=5)
+    parser.add_argument('--answer-tokens', type=int, default=40)
+    parser.add_argument('--llm-capacity', type=int, default=0,
+                        help="completions the fake LLM serves at once (0: unlimited)")
+    parser.add_argument('--llm-url', help="use a running chat-completions server instead")
+    parser.add_argument('--db-url', default='sqlite://')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='loadtest-')
+    process, url = (None, args.llm_url) if args.llm_url else start_fake_llm(args)
+    try:
+        # 必須在載入 app 之前設定，各模組在載入時讀取環境變數
+        os.environ.update(OPENAI_BASE_URL=url, OPENAI_API_BASE=url, OPENAI_API_KEY='sk-loadtest',
+                          CLEARDB_DATABASE_URL=args.db_url, WARMUP='0',
+                          SQL_TEMPLATE_PATH=os.path.join(workdir, 'sql_templates.json'),
+                          SQL_WORKLOAD_LOG=os.path.join(workdir, 'sql_workload.jsonl'))
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+        import app  # noqa: F401
+        import tools.translator
+
+        # Chainlit 會把每個 HTTP 請求記到 stdout，壓測時只留警告
+        logging.getLogger('httpx').setLevel(logging.WARNING)
+
+        tools.translator.OUTPUT_PATH = os.path.join(workdir, 'output')
+        deck_path = make_deck(os.path.join(workdir, 'deck.pptx'), args.slides)
+        report = asyncio.run(run_load(args, deck_path))
+        report['llm_requests'] = llm_requests(url)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Cold-start benchmark: import time, warm-up and first-request latency.
+
+Usage:
+    python -m benchmarks.startup [--runs 5] [--llm]
+
+Each run starts a fresh interpreter twice, once without and once with the
+warm-up phase (``core.warmup.warm_up``), and measures:
+
+- import_chainlit_ms / import_app_ms: importing Chainlit, then app.py
+- warmup_ms: building the agent components and opening pooled DB
+  connections (on a background thread in the real app)
+- first_request_ms: what the first turn pays before its first LLM call,
+  i.e. building the components if needed plus one SQL query
+- first_llm_ms (with --llm and a real OPENAI_API_KEY): the first LLM call,
+  after warm_llm_connection in the warm run
+
+CLEARDB_DATABASE_URL defaults to the embedded ``sqlite://`` database.
+The median of every metric is printed as JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+RESULT_PREFIX = 'STARTUP_RESULT '
+PROBE_QUERY = "SELECT City, SUM(Total_Price) AS total FROM sales GROUP BY City"
+
+
+def _ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def measure(warm: bool, llm: bool) -> dict:
+    """One cold start in this interpreter."""
+    result = {}
+    started = time.perf_counter()
+    import chainlit  # noqa: F401
+    result['import_chainlit_ms'] = _ms(started)
+
+    started = time.perf_counter()
+    import app  # noqa: F401
+    result['import_app_ms'] = _ms(started)
+
+    from core.agent import get_agent_components
+    from core.warmup import warm_llm_connection, warm_up
+
+    if warm:
+        started = time.perf_counter()
+        warm_up()
+        result['warmup_ms'] = _ms(started)
+
+    started = time.perf_counter()
+    components = get_agent_components()
+    components.sql_tool.invoke({"query": PROBE_QUERY})
+    result['first_request_ms'] = _ms(started)
+
+    if llm:
+        async def first_llm_call():
+            if warm:
+                await warm_llm_connection()
+            started = time.perf_counter()
+            await components.llm.ainvoke("Reply with OK.")
+            return _ms(started)
+
+        result['first_llm_ms'] = asyncio.run(first_llm_call())
+    return result
+
+
+def run_child(warm: bool, llm: bool) -> dict:
+    env = dict(os.environ, WARMUP='0', LOG_LEVEL='WARNING')
+    env.setdefault('CLEARDB_DATABASE_URL', 'sqlite://')
+    env.setdefault('OPENAI_API_KEY', 'sk-benchmark')
+    command = [sys.executable, '-m', 'benchmarks.startup', '--child']
+    command += ['--warm'] if warm else []
+    command += ['--llm'] if llm else []
+    output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+    line = [line for line in output.splitlines() if line.startswith(RESULT_PREFIX)][-1]
+    return json.loads(line[len(RESULT_PREFIX):])
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Measure import time and first-request latency.")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--llm', action='store_true', help="Also time the first LLM call (needs a real API key).")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--warm', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(RESULT_PREFIX + json.dumps(measure(args.warm, args.llm)), flush=True)
+        return
+
+    report = {}
+    for mode in ('cold', 'warm'):
+        runs = [run_child(mode == 'warm', args.llm) for _ in range(args.runs)]
+        report[mode] = {key: round(statistics.median(run[key] for run in runs), 1) for key in runs[0]}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
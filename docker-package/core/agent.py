@@ -0,0 +1,94 @@
+"""Agent components shared by every chat session.
+
+The LLM client, tools, prompt and AgentExecutor are immutable once built, so
+they are created once per process on first use. Only the conversation
+memory is per session (see ``new_memory``) and is passed to the executor as
+``chat_history`` on each turn.
+
+The agent framework, the OpenAI client and the tool modules are imported
+when the components are first built, not when this module is imported, so
+the Chainlit server starts serving before they are loaded (see
+``core.warmup`` for loading them in the background at startup).
+"""
+import threading
+from typing import Optional
+
+from core.memory import TokenBudgetMemory
+from core.prompts import BASE_PROMPT
+from tools.logging_setup import LOG_LEVEL
+
+MODEL_NAME = "gpt-4o-mini-2024-07-18"
+
+
+class AgentComponents:
+    """The process-wide LLM, tools, prompt and executor."""
+
+    def __init__(self):
+        from langchain.agents import AgentExecutor, create_openai_tools_agent
+        from langchain_core.messages import SystemMessage
+        from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+        from langchain_openai import ChatOpenAI
+
+        from tools.llm_scheduler import http_clients
+        from tools.sql_query import SQLQueryTool
+        from tools.sql_schema import DescribeTableTool
+        from tools.translator import PowerPointTranslator
+
+        # Model：token 由每個回合傳入的 callbacks 串流到使用者的訊息（見 core.streaming）
+        # 請求經過共用的 LLM 排程器，與翻譯工作共享連線上限（見 tools.llm_scheduler）
+        self.llm = ChatOpenAI(
+            temperature=0,
+            model=MODEL_NAME,
+            streaming=True,
+            stream_usage=True,
+            **http_clients()
+        )
+
+        # Tools
+        self.sql_tool = SQLQueryTool()
+        self.translator = PowerPointTranslator()
+        self.tools = [
+            self.sql_tool,
+            DescribeTableTool(),
+            self.translator
+        ]
+
+        # Agent
+        self.prompt = ChatPromptTemplate.from_messages([
+            # 固定不變的前綴放最前面，讓供應商的 prefix cache 能重複使用
+            SystemMessage(content=BASE_PROMPT),
+            MessagesPlaceholder(variable_name="chat_history"),
+            # 依問題附上的工具段落（見 core.prompts.select_sections）
+            MessagesPlaceholder(variable_name="tool_sections", optional=True),
+            ("human", "{input}"),
+            MessagesPlaceholder(variable_name="agent_scratchpad"),
+        ])
+        agent = create_openai_tools_agent(llm=self.llm, tools=self.tools, prompt=self.prompt)
+
+        # 執行器本身不帶記憶，對話紀錄由每個 session 自行保存後傳入
+        self.executor = AgentExecutor(
+            agent=agent,
+            tools=self.tools,
+            # 每個步驟的同步輸出只在除錯時開啟，平時由 app.py 記錄結構化日誌
+            verbose=LOG_LEVEL == 'DEBUG',
+            return_intermediate_steps=True
+        )
+
+
+_components: Optional[AgentComponents] = None
+_components_lock = threading.Lock()
+
+
+def get_agent_components() -> AgentComponents:
+    """Build the shared agent components on first use and return them."""
+    global _components
+    if _components is None:
+        with _components_lock:
+            if _components is None:
+                _components = AgentComponents()
+    return _components
+
+
+def new_memory() -> TokenBudgetMemory:
+    """Conversation memory for one chat session."""
+    return TokenBudgetMemory()
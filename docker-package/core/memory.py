@@ -0,0 +1,247 @@
+"""Conversation memory with a hard token budget.
+
+``ConversationBufferMemory`` kept every message of a session, so the prompt
+and the LLM latency grew with every turn. ``TokenBudgetMemory`` keeps the
+most recent turns verbatim, folds older turns into a rolling summary on a
+small executor of its own (so neither the user's turn nor the SQL tools
+wait for it; ``MEMORY_SUMMARY_WORKERS`` threads) and trims long answers,
+such as SQL result tables, before they are stored. The history handed to the
+agent never exceeds ``token_budget`` tokens; until a summary is ready, the
+oldest turns are dropped instead.
+
+Set ``MEMORY_TOKEN_BUDGET=0`` to keep the whole conversation as before.
+
+``to_state``/``from_state`` turn the memory into a small dict of plain
+values so ``core.session_store`` can keep it outside the process.
+"""
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from pydantic import BaseModel
+
+from tools.logging_setup import get_logger, log_event
+from tools.tokens import count_tokens
+
+MEMORY_TOKEN_BUDGET = int(os.getenv('MEMORY_TOKEN_BUDGET', '2000'))
+MEMORY_RECENT_TURNS = int(os.getenv('MEMORY_RECENT_TURNS', '3'))
+MEMORY_MAX_MESSAGE_TOKENS = int(os.getenv('MEMORY_MAX_MESSAGE_TOKENS', '400'))
+# 背景摘要專用的執行緒數；摘要會在 LLM 排程中以批次等級排隊，不占用工具執行緒
+MEMORY_SUMMARY_WORKERS = int(os.getenv('MEMORY_SUMMARY_WORKERS', '2'))
+
+logger = get_logger('memory')
+
+# 每則訊息在對話格式中的額外開銷（角色、分隔符號）
+_MESSAGE_OVERHEAD = 4
+
+_summary_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_summary_executor() -> ThreadPoolExecutor:
+    """Return the process-wide executor that runs background summaries."""
+    global _summary_executor
+    if _summary_executor is None:
+        with _executor_lock:
+            if _summary_executor is None:
+                _summary_executor = ThreadPoolExecutor(max_workers=max(1, MEMORY_SUMMARY_WORKERS),
+                                                       thread_name_prefix="summary")
+    return _summary_executor
+
+SUMMARY_PROMPT = """Summarize the conversation below for a chatbot that answers sales database questions and translates PowerPoint files.
+Merge it with the existing summary. Keep the facts later questions may refer to: figures, cities, products, dates, filters, language pairs and what was already translated.
+Answer in at most {max_words} words, in the language the user writes in.
+
+Existing summary:
+{summary}
+
+Conversation:
+{transcript}"""
+
+
+def message_tokens(message: BaseMessage) -> int:
+    return count_tokens(str(message.content)) + _MESSAGE_OVERHEAD
+
+
+def trim_text(text: str, max_tokens: int) -> str:
+    """Cut ``text`` to about ``max_tokens`` tokens, noting how much was removed."""
+    tokens = count_tokens(text)
+    if max_tokens <= 0 or tokens <= max_tokens:
+        return text
+    keep = int(len(text) * max_tokens / tokens)
+    return f"{text[:keep].rstrip()}\n…[{tokens - max_tokens} tokens trimmed]"
+
+
+def llm_summarizer(summary: str, messages: List[BaseMessage], max_tokens: int) -> str:
+    """Fold ``messages`` into ``summary`` with the shared chat model."""
+    from core.agent import get_agent_components
+    from tools.llm_scheduler import BULK, llm_context
+
+    transcript = "\n".join(f"{m.type}: {m.content}" for m in messages)
+    prompt = SUMMARY_PROMPT.format(max_words=max(20, max_tokens * 2 // 3),
+                                   summary=summary or "(none)", transcript=transcript)
+    with llm_context(BULK):
+        return str(get_agent_components().llm.invoke(prompt).content)
+
+
+class Turn(BaseModel):
+    messages: List[BaseMessage]
+    tokens: int
+
+
+class TokenBudgetMemory:
+    """Per-session chat history: rolling summary plus the most recent turns."""
+
+    memory_key = "chat_history"
+
+    def __init__(self, token_budget: int = MEMORY_TOKEN_BUDGET, recent_turns: int = MEMORY_RECENT_TURNS,
+                 max_message_tokens: int = MEMORY_MAX_MESSAGE_TOKENS,
+                 summarizer: Callable[[str, List[BaseMessage], int], str] = llm_summarizer,
+                 background: bool = True):
+        self.token_budget = token_budget
+        self.recent_turns = recent_turns
+        self.max_message_tokens = max_message_tokens if token_budget else 0
+        self.summarizer = summarizer
+        self.background = background
+        self.summary = ""
+        self._turns: List[Turn] = []
+        # 正在摘要的舊回合，摘要完成前仍可在預算內原文提供
+        self._pending: List[Turn] = []
+        self._summarizing = False
+        self._future = None
+        self._full_tokens = 0
+        self._lock = threading.Lock()
+        self.last_stats: Dict[str, int] = {}
+        # 每次寫入外部儲存都換一個新的隨機值，用來判斷本機的物件是否仍是最新狀態
+        self.token: Optional[str] = None
+        # 背景摘要完成後呼叫，讓外部儲存拿到新的摘要
+        self.on_summary: Optional[Callable[['TokenBudgetMemory'], None]] = None
+
+    @property
+    def memory_variables(self) -> List[str]:
+        return [self.memory_key]
+
+    @property
+    def summary_budget(self) -> int:
+        return self.token_budget // 4
+
+    def _summary_message(self) -> Optional[SystemMessage]:
+        if not self.summary:
+            return None
+        return SystemMessage(content=f"Summary of the earlier conversation:\n{self.summary}")
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        """History for the next prompt, within the token budget."""
+        with self._lock:
+            summary = self._summary_message()
+            turns = self._pending + self._turns
+            used = message_tokens(summary) if summary else 0
+            selected: List[Turn] = []
+            for turn in reversed(turns):
+                if self.token_budget and used + turn.tokens > self.token_budget:
+                    break
+                selected.insert(0, turn)
+                used += turn.tokens
+            self.last_stats = {
+                'history_tokens': used,
+                'full_history_tokens': self._full_tokens,
+                'saved_tokens': max(0, self._full_tokens - used),
+                'verbatim_turns': len(selected),
+                'dropped_turns': len(turns) - len(selected),
+            }
+        messages = [m for turn in selected for m in turn.messages]
+        return [summary] + messages if summary else messages
+
+    def load_memory_variables(self, inputs: Dict[str, object]) -> Dict[str, List[BaseMessage]]:
+        return {self.memory_key: self.messages}
+
+    def save_context(self, inputs: Dict[str, object], outputs: Dict[str, object]) -> None:
+        question = str(inputs.get("input", ""))
+        answer = str(outputs.get("output", ""))
+        messages = [HumanMessage(content=trim_text(question, self.max_message_tokens)),
+                    AIMessage(content=trim_text(answer, self.max_message_tokens))]
+        turn = Turn(messages=messages, tokens=sum(message_tokens(m) for m in messages))
+        with self._lock:
+            self._full_tokens += count_tokens(question) + count_tokens(answer) + 2 * _MESSAGE_OVERHEAD
+            self._turns.append(turn)
+        self._maybe_summarize()
+
+    def _state(self) -> Dict[str, Any]:
+        turns = [[str(t.messages[0].content), str(t.messages[1].content), t.tokens]
+                 for t in self._pending + self._turns]
+        return {'v': self.token, 's': self.summary, 'f': self._full_tokens, 't': turns}
+
+    def to_state(self) -> Dict[str, Any]:
+        """Summary and turns as plain values; turns still being summarized stay verbatim."""
+        with self._lock:
+            return self._state()
+
+    def new_state(self) -> Tuple[Optional[str], Dict[str, Any]]:
+        """The state under a fresh write token, and the token it replaces."""
+        with self._lock:
+            previous, self.token = self.token, uuid.uuid4().hex
+            return previous, self._state()
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any], **kwargs) -> 'TokenBudgetMemory':
+        memory = cls(**kwargs)
+        memory.token = state.get('v')
+        memory.summary = state.get('s', "")
+        memory._full_tokens = state.get('f', 0)
+        memory._turns = [Turn(messages=[HumanMessage(content=question), AIMessage(content=answer)],
+                              tokens=tokens)
+                         for question, answer, tokens in state.get('t', [])]
+        return memory
+
+    def clear(self) -> None:
+        with self._lock:
+            self.summary = ""
+            self._turns, self._pending = [], []
+            self._full_tokens = 0
+
+    def _maybe_summarize(self) -> None:
+        if not self.token_budget:
+            return
+        with self._lock:
+            if self._summarizing or len(self._turns) <= self.recent_turns:
+                return
+            verbatim = sum(t.tokens for t in self._turns)
+            if len(self._turns) <= 2 * self.recent_turns and verbatim <= self.token_budget - self.summary_budget:
+                return
+            # 最近幾個回合保留原文，其餘交給背景摘要
+            split = len(self._turns) - self.recent_turns
+            self._pending, self._turns = self._turns[:split], self._turns[split:]
+            summary, pending = self.summary, [m for t in self._pending for m in t.messages]
+            self._summarizing = True
+        if self.background:
+            self._future = get_summary_executor().submit(self._summarize, summary, pending)
+        else:
+            self._summarize(summary, pending)
+
+    def _summarize(self, summary: str, messages: List[BaseMessage]) -> None:
+        try:
+            summary = self.summarizer(summary, messages, self.summary_budget)
+        except Exception as e:
+            # 摘要失敗時只保留使用者問過的問題，避免預算被舊回合占滿
+            log_event(logger, logging.WARNING, 'memory.summary_failed', error=str(e))
+            questions = [str(m.content) for m in messages if isinstance(m, HumanMessage)]
+            summary = "\n".join(filter(None, [summary, "Earlier questions: " + " / ".join(questions)]))
+        with self._lock:
+            self.summary = trim_text(summary.strip(), self.summary_budget)
+            self._pending = []
+            self._summarizing = False
+        if self.on_summary is not None:
+            try:
+                self.on_summary(self)
+            except Exception as e:
+                log_event(logger, logging.WARNING, 'memory.summary_save_failed', error=str(e))
+
+    def wait(self) -> None:
+        """Block until a background summarization in progress has finished."""
+        if self._future is not None:
+            self._future.result()
@@ -0,0 +1,92 @@
+"""LLM and tool latency from LangChain callbacks, and the /metrics endpoint.
+
+``MetricsCallbackHandler`` is passed with each turn's callbacks. It times
+every LLM call (total and time to first token), records the token usage
+the API reports and times each tool call. The histograms themselves live
+in ``tools.metrics`` so the tools can record their own phases.
+"""
+import os
+import time
+from typing import Any, Dict
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from tools.metrics import (LLM_FIRST_TOKEN_SECONDS, LLM_PROMPT_TOKENS, LLM_SECONDS, LLM_TOKENS,
+                           TOOL_SECONDS, render)
+
+METRICS_PATH = os.getenv('METRICS_PATH', '/metrics')
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _model_name(serialized: Dict[str, Any], kwargs: Dict[str, Any]) -> str:
+    params = kwargs.get('invocation_params') or {}
+    return str(params.get('model') or params.get('model_name')
+               or (serialized or {}).get('kwargs', {}).get('model_name') or 'unknown')
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Records LLM and tool latency into the process-wide histograms."""
+
+    run_inline = True
+
+    def __init__(self):
+        # run_id -> (model, 開始時間, 是否已收到第一個 token)
+        self._llm_runs: Dict[UUID, list] = {}
+        self._tool_runs: Dict[UUID, tuple] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any) -> None:
+        self._llm_runs[run_id] = [_model_name(serialized, kwargs), time.perf_counter(), False]
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs: Any) -> None:
+        self._llm_runs[run_id] = [_model_name(serialized, kwargs), time.perf_counter(), False]
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._llm_runs.get(run_id)
+        if run and not run[2]:
+            run[2] = True
+            LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - run[1], model=run[0])
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._llm_runs.pop(run_id, None)
+        if run is None:
+            return
+        model = run[0]
+        LLM_SECONDS.observe(time.perf_counter() - run[1], model=model)
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+                if not usage:
+                    continue
+                LLM_PROMPT_TOKENS.observe(usage.get('input_tokens', 0), model=model)
+                LLM_TOKENS.inc(usage.get('input_tokens', 0), model=model, kind='prompt')
+                LLM_TOKENS.inc(usage.get('output_tokens', 0), model=model, kind='completion')
+                cached = (usage.get('input_token_details') or {}).get('cache_read') or 0
+                LLM_TOKENS.inc(cached, model=model, kind='cached')
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._llm_runs.pop(run_id, None)
+
+    def on_tool_start(self, serialized, input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        name = (serialized or {}).get('name') or kwargs.get('name') or 'unknown'
+        self._tool_runs[run_id] = (name, time.perf_counter())
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._tool_runs.pop(run_id, None)
+        if run:
+            TOOL_SECONDS.observe(time.perf_counter() - run[1], tool=run[0])
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self.on_tool_end(None, run_id=run_id)
+
+
+def mount_metrics(app, path: str = METRICS_PATH) -> None:
+    """Serve the metrics in the Prometheus text format at ``path`` on ``app``."""
+    from fastapi.responses import Response
+
+    async def metrics():
+        return Response(content=render(), media_type=CONTENT_TYPE)
+
+    app.add_api_route(path, metrics, methods=['GET'], include_in_schema=False)
+    # Chainlit 以萬用路由回傳前端頁面，新路由必須排在它前面才會被比對到
+    app.router.routes.insert(0, app.router.routes.pop())
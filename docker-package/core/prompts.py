@@ -0,0 +1,229 @@
+"""System prompt split into a stable prefix and per-tool sections.
+
+The old system prompt sent the translation state rules, the multilingual
+request patterns and the database instructions on every turn. Now only
+``BASE_PROMPT`` is sent every time. It is byte-identical across turns and
+sessions and comes first, so the provider's prefix cache can reuse it. The
+translation and database sections are attached only when the question (or
+the previous one, for follow-ups) looks like it needs that tool. They go
+after the chat history, so the cached prefix of system prompt plus history
+stays stable as the conversation grows.
+
+``PromptUsageTracker`` records prompt and cached-prefix tokens reported by
+the API for each LLM call.
+"""
+import re
+import threading
+from typing import Any, Dict, List
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+from tools.tokens import count_tokens
+
+BASE_PROMPT = """You are a nice chatbot who can help users query the sales database and translate PowerPoint files.
+
+IMPORTANT: You must FIRST determine the user's intent before taking any action.
+- Questions about sales figures, products, cities, regions or dates: use the database tools.
+- Requests to translate a PowerPoint file: use the translate_ppt tool.
+- Anything else: just chat, DO NOT call any tool.
+
+LANGUAGE RESPONSE RULES:
+1. ALWAYS detect the language of the user's input
+2. Respond in the SAME language as the user's input
+3. Keep all technical terms and database values in their original form
+
+EXAMPLE:
+User: "Hello, how are you?"
+Action: DO NOT call any tool
+Assistant: "Hello! I'm here to help you with PowerPoint translation or database queries. How can I assist you today?"
+"""
+
+TRANSLATION_SECTION = """PowerPoint translation instructions:
+
+TRANSLATION STATE TRACKING:
+1. Keep track of the current translation state:
+   - NO_TRANSLATION: No translation in progress
+   - WAITING_FOR_FILE: Waiting for user to upload a file
+   - TRANSLATION_COMPLETE: Translation has been completed
+
+2. State transitions:
+   - Start in NO_TRANSLATION state
+   - Move to WAITING_FOR_FILE when user requests translation
+   - Move to TRANSLATION_COMPLETE when translation is done
+   - Return to NO_TRANSLATION when user starts a new conversation
+
+For PowerPoint translation:
+1. ONLY call the translate_ppt tool when:
+   - Current state is NO_TRANSLATION AND
+   - The user EXPLICITLY requests PowerPoint translation AND
+   - The user specifies source and target languages
+
+2. DO NOT call translate_ppt when:
+   - Current state is WAITING_FOR_FILE (wait for file upload)
+   - Current state is TRANSLATION_COMPLETE
+   - The user is just chatting
+   - The user asks about other topics
+
+The translate_ppt tool requires two parameters:
+- olang: The original language code
+- tlang: The target language code
+
+Language code mapping rules (STRICTLY FOLLOW THESE):
+- For Chinese/中文/繁體中文: ALWAYS use "zh-TW"
+- For English/英文: ALWAYS use "en"
+- For Japanese/日文: ALWAYS use "ja"
+
+TRANSLATION REQUEST PATTERNS TO RECOGNIZE:
+1. English patterns:
+   - "translate [this/the] [ppt/powerpoint/presentation] from X to Y"
+   - "translate from X to Y"
+   - "X to Y translation"
+
+2. Chinese patterns:
+   - "[幫我/請]將[ppt/簡報]從X翻譯成Y"
+   - "[幫我/請]把[ppt/簡報]從X翻譯成Y"
+   - "從X翻譯成Y"
+   - "[ppt/簡報]從X翻Y"
+   - "[X轉Y/X翻Y]"
+
+3. Japanese patterns:
+   - "[ppt/パワーポイント]をXからYに翻訳"
+   - "XからYに翻訳"
+   - "X語からY語に"
+
+TRANSLATION HANDLING STEPS:
+1. If you see ANY of the above patterns AND current state is NO_TRANSLATION:
+   - IMMEDIATELY call translate_ppt tool with appropriate language codes
+   - DO NOT ask for confirmation
+   - DO NOT engage in additional dialogue
+   - Just call the tool and wait for upload
+
+2. If languages are not specified:
+   - Ask for languages in the same language as the user's request
+   - Once they specify, IMMEDIATELY call translate_ppt
+
+3. After translation is complete:
+   - If the tool returns "TRANSLATION_COMPLETE":
+     - DO NOT call translate_ppt again
+     - DO NOT send any message
+     - Wait for the next user request
+   - If the tool returns any other message:
+     - Send that message to the user
+     - Wait for the next user request
+
+EXAMPLES:
+User: "I want to translate this presentation from Chinese to English"
+State: NO_TRANSLATION
+Action: MUST call translate_ppt with olang="zh-TW", tlang="en" FIRST
+Assistant: "Please upload your PowerPoint file for translation"
+
+User: "幫我將ppt從英文翻譯為繁體中文"
+State: NO_TRANSLATION
+Action: MUST call translate_ppt with olang="en", tlang="zh-TW" FIRST
+Assistant: "請上傳您的 PowerPoint 檔案進行翻譯"
+
+User: "PPTファイルを翻訳したい"
+State: NO_TRANSLATION
+Assistant: "どの言語からどの言語に翻訳しますか？"
+User: "日本語から英語に"
+Action: MUST call translate_ppt with olang="ja", tlang="en" FIRST
+Assistant: "PowerPointファイルをアップロードしてください"
+"""
+
+SQL_SECTION = """Database query instructions:
+You can execute SQL queries to get information from the database.
+The main table is 'sales', which records produce sales by date, region, city, category and product.
+Before writing a query against a table you have not described yet in this conversation,
+call describe_table to get its columns and their possible values.
+"""
+
+SECTIONS = {
+    'translation': TRANSLATION_SECTION,
+    'sql': SQL_SECTION,
+}
+
+# 只要問題可能用到該工具就附上對應段落，多附只多花 token，漏附可能讓模型用錯工具
+_HINTS = {
+    'translation': re.compile(
+        r"translat|\bppt|powerpoint|presentation|slide|翻|簡報|投影片|パワーポイント|スライド|"
+        r"english|chinese|japanese|英文|中文|日文|英語|日本語|中国語|zh-tw|\ben\b|\bja\b",
+        re.I),
+    'sql': re.compile(
+        r"sales|sold|sell|revenue|quantity|price|total|average|\btop\b|city|cities|region|category|product|"
+        r"database|table|query|sql|\b(?:19|20)\d{2}\b|"
+        r"銷售|銷量|營業|營收|業績|數量|金額|價格|平均|總|城市|地區|類別|產品|資料|"
+        r"売上|販売|数量|金額|価格|平均|合計|都市|地域|カテゴリ|商品|データ",
+        re.I),
+}
+
+
+def select_sections(question: str, history: List[BaseMessage] = ()) -> List[str]:
+    """Names of the tool sections the next turn is likely to need.
+
+    The previous user message is included so follow-ups such as "and in
+    大阪?" or "日本語から英語に" keep the section of the turn they refer to.
+    """
+    previous = [str(m.content) for m in history if isinstance(m, HumanMessage)][-1:]
+    text = " ".join([question] + previous)
+    return [name for name, hint in _HINTS.items() if hint.search(text)]
+
+
+def section_messages(names: List[str]) -> List[BaseMessage]:
+    return [SystemMessage(content=SECTIONS[name]) for name in names]
+
+
+def prompt_tokens(names: List[str]) -> Dict[str, int]:
+    """System prompt tokens sent with ``names`` against sending every section."""
+    base = count_tokens(BASE_PROMPT)
+    sent = base + sum(count_tokens(SECTIONS[name]) for name in names)
+    full = base + sum(count_tokens(section) for section in SECTIONS.values())
+    return {'system_tokens': sent, 'system_tokens_saved': full - sent}
+
+
+class PromptUsageTracker(BaseCallbackHandler):
+    """Collects prompt and cached prompt tokens of every LLM call.
+
+    OpenAI caches prompt prefixes of 1024 tokens or more, so cached tokens
+    only appear once the system prompt plus history reaches that size.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self.calls = 0
+        self.cached_calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self._lock = threading.Lock()
+
+    def on_llm_end(self, response, **kwargs: Any) -> None:
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+                if not usage:
+                    continue
+                cached = (usage.get('input_token_details') or {}).get('cache_read') or 0
+                with self._lock:
+                    self.calls += 1
+                    self.cached_calls += 1 if cached else 0
+                    self.prompt_tokens += usage.get('input_tokens', 0)
+                    self.cached_tokens += cached
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'prompt_tokens': self.prompt_tokens,
+                'cached_tokens': self.cached_tokens,
+                'cached_token_rate': round(self.cached_tokens / self.prompt_tokens, 4) if self.prompt_tokens else 0.0,
+                'cache_hit_rate': round(self.cached_calls / self.calls, 4) if self.calls else 0.0,
+            }
+
+
+_usage_tracker = PromptUsageTracker()
+
+
+def get_usage_tracker() -> PromptUsageTracker:
+    """Process-wide prompt usage counters."""
+    return _usage_tracker
@@ -0,0 +1,331 @@
+"""Minimal Redis protocol (RESP2) client and a local stand-in server.
+
+``RespClient`` speaks just enough of the protocol for the session store
+(PING, GET, SET ... EX, DEL, and WATCH/MULTI/EXEC for compare-and-set)
+against Redis or any compatible server, so no Redis client package is
+required. ``LocalRespServer`` implements the same
+commands in memory for tests and for running several local workers
+without installing Redis:
+
+    python -m core.resp --port 6379
+"""
+import argparse
+import socket
+import socketserver
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+
+class RespError(Exception):
+    """Error reply from the server."""
+
+
+def encode_command(*args) -> bytes:
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode('utf-8')
+        parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+    return b''.join(parts)
+
+
+def read_reply(stream):
+    line = stream.readline()
+    if not line:
+        raise ConnectionError("Connection closed by server")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b'+':
+        return rest.decode()
+    if kind == b'-':
+        raise RespError(rest.decode())
+    if kind == b':':
+        return int(rest)
+    if kind == b'$':
+        length = int(rest)
+        if length < 0:
+            return None
+        data = stream.read(length + 2)
+        return data[:-2]
+    if kind == b'*':
+        count = int(rest)
+        return None if count < 0 else [read_reply(stream) for _ in range(count)]
+    raise RespError(f"Unknown reply type {kind!r}")
+
+
+class RespClient:
+    """One connection, shared by threads under a lock, reconnected on failure."""
+
+    def __init__(self, host: str = 'localhost', port: int = 6379, db: int = 0,
+                 password: Optional[str] = None, timeout: float = 5.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._socket = None
+        self._stream = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> 'RespClient':
+        parsed = urlparse(url)
+        db = int(parsed.path.lstrip('/') or 0)
+        return cls(parsed.hostname or 'localhost', parsed.port or 6379, db, parsed.password, **kwargs)
+
+    def _connect(self) -> None:
+        self._socket = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._stream = self._socket.makefile('rb')
+        if self.password:
+            self._call('AUTH', self.password)
+        if self.db:
+            self._call('SELECT', self.db)
+
+    def _call(self, *args):
+        self._socket.sendall(encode_command(*args))
+        return read_reply(self._stream)
+
+    def _stale(self) -> bool:
+        """True if the server already closed the idle connection."""
+        try:
+            self._socket.setblocking(False)
+            try:
+                return self._socket.recv(1, socket.MSG_PEEK) == b''
+            finally:
+                self._socket.settimeout(self.timeout)
+        except BlockingIOError:
+            return False
+        except OSError:
+            return True
+
+    def _open(self) -> None:
+        for attempt in (1, 2):
+            try:
+                self._connect()
+                return
+            except Exception as e:
+                self._close()
+                if attempt == 2 or not isinstance(e, OSError):
+                    raise
+
+    def _run(self, operation: Callable[[], object]):
+        with self._lock:
+            # 伺服器重啟或閒置逾時關閉的連線在送出命令前就換掉；
+            # 只有建立連線可以重試，命令送出後失敗不重送（SET、EXEC 可能已執行）
+            if self._socket is not None and self._stale():
+                self._close()
+            if self._socket is None:
+                self._open()
+            try:
+                return operation()
+            except BaseException:
+                # 回覆可能只讀了一半，丟棄這條連線，下次重新連線
+                self._close()
+                raise
+
+    def execute(self, *args):
+        return self._run(lambda: self._call(*args))
+
+    def transaction(self, key: str, commands: Callable[[Optional[bytes]], Optional[List[tuple]]]) -> bool:
+        """Optimistic update of ``key``: ``commands(current value)`` returns the
+        commands to run in MULTI/EXEC, or None to leave it alone. False when
+        nothing ran or the key changed before EXEC."""
+        def operation():
+            in_multi = False
+            try:
+                self._call('WATCH', key)
+                queued = commands(self._call('GET', key))
+                if queued is None:
+                    self._call('UNWATCH')
+                    return False
+                self._call('MULTI')
+                in_multi = True
+                for command in queued:
+                    self._call(*command)
+                return self._call('EXEC') is not None
+            except BaseException as e:
+                if not isinstance(e, OSError):
+                    # 連線仍可用時先清掉伺服器端的 MULTI/WATCH 狀態
+                    try:
+                        self._call('DISCARD' if in_multi else 'UNWATCH')
+                    except Exception:
+                        pass
+                raise
+
+        return self._run(operation)
+
+    def _close(self) -> None:
+        if self._socket is not None:
+            try:
+                self._stream.close()
+                self._socket.close()
+            except OSError:
+                pass
+        self._socket = self._stream = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+
+
+def _error(e: RespError) -> bytes:
+    return b'-ERR ' + str(e).encode() + b'\r\n'
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        # 每個連線自己的 WATCH 鍵（鍵 -> 寫入序號）與 MULTI 佇列
+        watched: Dict[bytes, int] = {}
+        queued: Optional[list] = None
+        while True:
+            try:
+                command = read_reply(self.rfile)
+            except (ConnectionError, RespError, ValueError):
+                return
+            if not command:
+                return
+            command = [part if isinstance(part, bytes) else str(part).encode() for part in command]
+            name = command[0].upper()
+            if name == b'WATCH':
+                watched.update(self.server.revisions(command[1:]))
+                reply = b'+OK\r\n'
+            elif name == b'UNWATCH':
+                watched = {}
+                reply = b'+OK\r\n'
+            elif name == b'MULTI':
+                queued = []
+                reply = b'+OK\r\n'
+            elif name == b'DISCARD':
+                queued, watched = None, {}
+                reply = b'+OK\r\n'
+            elif name == b'EXEC':
+                reply = self.server.execute(queued or [], watched)
+                queued, watched = None, {}
+            elif queued is not None:
+                queued.append(command)
+                reply = b'+QUEUED\r\n'
+            else:
+                try:
+                    reply = self.server.dispatch(command)
+                except RespError as e:
+                    reply = _error(e)
+            self.wfile.write(reply)
+
+
+class LocalRespServer(socketserver.ThreadingTCPServer):
+    """In-memory stand-in for Redis implementing PING, GET, SET [EX|PX], DEL,
+    EXISTS, EXPIRE, SELECT, AUTH, FLUSHDB and WATCH/MULTI/EXEC."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        super().__init__((host, port), _Handler)
+        self._data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        # 每次寫入遞增的序號，EXEC 以此判斷 WATCH 的鍵是否被改過
+        self._revision = 0
+        self._revisions: Dict[bytes, int] = {}
+        self._lock = threading.RLock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def start(self) -> 'LocalRespServer':
+        self._thread = threading.Thread(target=self.serve_forever, name='resp-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def _touch(self, key: bytes) -> None:
+        self._revision += 1
+        self._revisions[key] = self._revision
+
+    def revisions(self, keys) -> Dict[bytes, int]:
+        with self._lock:
+            return {key: self._revisions.get(key, 0) for key in keys}
+
+    def execute(self, commands: list, watched: Dict[bytes, int]) -> bytes:
+        """Run a MULTI block, or reply nil if a watched key changed."""
+        with self._lock:
+            if any(self._revisions.get(key, 0) != revision for key, revision in watched.items()):
+                return b'*-1\r\n'
+            replies = []
+            for command in commands:
+                try:
+                    replies.append(self.dispatch(command))
+                except RespError as e:
+                    replies.append(_error(e))
+            return b'*%d\r\n' % len(replies) + b''.join(replies)
+
+    def dispatch(self, command) -> bytes:
+        name, args = command[0].upper(), command[1:]
+        with self._lock:
+            if name == b'PING':
+                return b'+PONG\r\n'
+            if name in (b'SELECT', b'AUTH'):
+                return b'+OK\r\n'
+            if name == b'FLUSHDB':
+                for key in self._data:
+                    self._touch(key)
+                self._data.clear()
+                return b'+OK\r\n'
+            if name == b'GET':
+                value = self._get(args[0])
+                return b'$-1\r\n' if value is None else b'$%d\r\n%s\r\n' % (len(value), value)
+            if name == b'SET':
+                expires = None
+                options = [a.upper() for a in args[2:]]
+                if b'EX' in options:
+                    expires = time.monotonic() + int(args[2 + options.index(b'EX') + 1])
+                elif b'PX' in options:
+                    expires = time.monotonic() + int(args[2 + options.index(b'PX') + 1]) / 1000
+                self._data[args[0]] = (args[1], expires)
+                self._touch(args[0])
+                return b'+OK\r\n'
+            if name in (b'DEL', b'EXISTS'):
+                found = [key for key in args if self._get(key) is not None]
+                if name == b'DEL':
+                    for key in found:
+                        del self._data[key]
+                        self._touch(key)
+                return b':%d\r\n' % len(found)
+            if name == b'EXPIRE':
+                value = self._get(args[0])
+                if value is None:
+                    return b':0\r\n'
+                self._data[args[0]] = (value, time.monotonic() + int(args[1]))
+                self._touch(args[0])
+                return b':1\r\n'
+        raise RespError(f"unknown command '{name.decode(errors='replace')}'")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Run the in-memory Redis stand-in.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6379)
+    args = parser.parse_args(argv)
+    server = LocalRespServer(args.host, args.port)
+    print(f"Listening on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
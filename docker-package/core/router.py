@@ -0,0 +1,119 @@
+"""Local intent router for PowerPoint translation requests.
+
+Deciding to call translate_ppt for "從英文翻譯成日文" or "translate from
+English to Japanese" took a full LLM round trip. ``IntentRouter`` matches
+the request patterns listed in the translation prompt section locally,
+maps the language names to the tool's codes (zh-TW / en / ja) and lets
+``app.py`` call the tool directly.
+
+A message is routed only when the whole message is one of these
+requests and both languages are known and different. Anything else,
+including a request with extra text, goes to the agent as before.
+"""
+import os
+import re
+import threading
+from typing import Optional
+
+from pydantic import BaseModel
+
+INTENT_ROUTER = os.getenv('INTENT_ROUTER', '1') == '1'
+
+LANGUAGE_CODES = {
+    'zh-TW': ['繁體中文', '繁体中文', '中文', '繁中', '中國語', '中国語', '華語', 'chinese', 'traditional chinese',
+              'mandarin', 'zh-tw', 'zh'],
+    'en': ['英文', '英語', '英语', 'english', 'en'],
+    'ja': ['日文', '日語', '日语', '日本語', '日本语', 'japanese', 'ja'],
+}
+# 「中翻英」「英轉日」這類縮寫只在緊湊的寫法中接受單字
+SHORT_CODES = {'中': 'zh-TW', '英': 'en', '日': 'ja'}
+
+_ALIASES = {alias: code for code, aliases in LANGUAGE_CODES.items() for alias in aliases}
+_LANGUAGE = "(" + "|".join(re.escape(a) for a in sorted(_ALIASES, key=len, reverse=True)) + ")"
+_SHORT = "([" + "".join(SHORT_CODES) + "])"
+_FILE = r"(?:(?:this|the|my|a)\s+)?(?:ppt|pptx|powerpoint|presentation|slides?|deck|file)(?:\s+file)?"
+_LEAD = r"please\s+|(?:can|could|would) you(?: please)?\s+|(?:i want|i'd like|i would like|i need|help me) to\s+"
+_FILE_ZH = r"(?:這份|這個|这份|这个)?(?:ppt|pptx|powerpoint|簡報|简报|投影片)(?:檔案|文件)?"
+_FILE_JA = r"(?:この)?(?:ppt|pptx|powerpoint|パワーポイント|スライド)(?:ファイル)?"
+
+# 各語言的請求句型（對應提示詞中的 TRANSLATION REQUEST PATTERNS），(olang, tlang) 依群組順序
+_PATTERNS = [
+    re.compile(rf"(?:{_LEAD})?translate\s+(?:{_FILE}\s+)?from\s+{_LANGUAGE}\s+(?:to|into)\s+{_LANGUAGE}"
+               rf"(?:\s+please)?"),
+    re.compile(rf"(?:{_LEAD})?translate\s+(?:{_FILE}\s+)?(?:to|into)\s+{_LANGUAGE}\s+from\s+{_LANGUAGE}"),
+    re.compile(rf"{_LANGUAGE}\s+to\s+{_LANGUAGE}\s+(?:{_FILE}\s+)?translation"),
+    re.compile(rf"(?:幫我|帮我|請|请|麻煩|麻烦)?(?:將|把|将)?(?:{_FILE_ZH})?從{_LANGUAGE}(?:翻譯|翻译|翻|轉|转)(?:成|為|为|到)?{_LANGUAGE}"),
+    re.compile(rf"(?:幫我|帮我|請|请)?(?:將|把|将)?(?:{_FILE_ZH})?{_SHORT}(?:翻|轉|转){_SHORT}"),
+    re.compile(rf"(?:幫我|帮我|請|请)?(?:將|把|将)?(?:{_FILE_ZH})?{_LANGUAGE}(?:翻譯|翻译|翻|轉|转)(?:成|為|为|到){_LANGUAGE}"),
+    re.compile(rf"(?:{_FILE_JA}を)?{_LANGUAGE}から{_LANGUAGE}に翻訳(?:して(?:ください)?|したい|お願いします)?"),
+    re.compile(rf"{_LANGUAGE}から{_LANGUAGE}に(?:翻訳)?(?:して(?:ください)?|お願いします)?"),
+]
+# 第二個英文句型的語言順序相反
+_REVERSED = {1}
+
+
+class TranslationIntent(BaseModel):
+    olang: str
+    tlang: str
+
+
+def normalize_request(text: str) -> str:
+    text = re.sub(r"\s+", ' ', text.strip().lower())
+    return text.strip('?？.。!！~～ ')
+
+
+def _code(name: str) -> Optional[str]:
+    return _ALIASES.get(name) or SHORT_CODES.get(name)
+
+
+class IntentRouter:
+    """Matches whole-message translation requests and counts how often it did."""
+
+    def __init__(self, enabled: bool = INTENT_ROUTER):
+        self.enabled = enabled
+        self.routed = 0
+        self.passed = 0
+        self._lock = threading.Lock()
+
+    def match(self, text: str) -> Optional[TranslationIntent]:
+        text = normalize_request(text)
+        intents = set()
+        for i, pattern in enumerate(_PATTERNS):
+            found = pattern.fullmatch(text)
+            if not found:
+                continue
+            first, second = found.groups()
+            olang, tlang = (_code(second), _code(first)) if i in _REVERSED else (_code(first), _code(second))
+            if olang and tlang and olang != tlang:
+                intents.add((olang, tlang))
+        # 不同句型得到不同的語言組合時交給代理判斷
+        if len(intents) != 1:
+            return None
+        olang, tlang = intents.pop()
+        return TranslationIntent(olang=olang, tlang=tlang)
+
+    def route(self, text: str) -> Optional[TranslationIntent]:
+        """The translation request in ``text``, or None to let the agent decide."""
+        intent = self.match(text) if self.enabled else None
+        with self._lock:
+            if intent:
+                self.routed += 1
+            else:
+                self.passed += 1
+        return intent
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.routed + self.passed
+            return {
+                'routed': self.routed,
+                'passed': self.passed,
+                'fast_path_rate': round(self.routed / total, 4) if total else 0.0,
+            }
+
+
+_intent_router = IntentRouter()
+
+
+def get_intent_router() -> IntentRouter:
+    return _intent_router
@@ -0,0 +1,229 @@
+"""Conversation memory and job state kept outside the Chainlit process.
+
+Memory used to live only in ``cl.user_session``, so a conversation was tied
+to one worker and lost on restart. It is now saved after every turn to the
+store named by ``SESSION_STORE``:
+
+- ``memory://`` (default): a dict in this process, for a single worker;
+- ``redis://[:password@]host:port/db``: any Redis-protocol server, shared
+  by all workers and kept across restarts. ``python -m core.resp`` runs a
+  local stand-in for development and tests.
+
+Entries are keyed by the Chainlit thread id and expire after
+``SESSION_TTL_SECONDS`` without activity. Values are compact JSON, zlib
+compressed above ``SESSION_COMPRESS_MIN_BYTES``, with a one-byte header
+telling which.
+
+Every write tags the memory with a random write token. Each worker keeps
+the memory object it last used; if the stored token is still the one it
+wrote, that object is reused (including a summary still running in the
+background), otherwise another worker answered in between and the memory
+is rebuilt from the store. A finished background summary is written only
+if the stored token is still the one the worker last wrote (compare and
+set), so it never overwrites a newer turn saved by another worker.
+
+The translation job of a session (languages and status) is stored next to
+its memory. A job still marked running when a chat starts was cut off by
+a restart or a reconnect, and the app asks for the file again.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from core.memory import TokenBudgetMemory
+from tools.logging_setup import get_logger, log_event
+
+SESSION_STORE = os.getenv('SESSION_STORE', 'memory://')
+SESSION_TTL_SECONDS = int(os.getenv('SESSION_TTL_SECONDS', str(7 * 24 * 3600)))
+SESSION_COMPRESS_MIN_BYTES = int(os.getenv('SESSION_COMPRESS_MIN_BYTES', '512'))
+SESSION_KEY_PREFIX = os.getenv('SESSION_KEY_PREFIX', 'chatbot:')
+
+_RAW, _ZLIB = b'j', b'z'
+
+logger = get_logger('session_store')
+
+
+def encode_state(state: Dict[str, Any], compress_min_bytes: int = SESSION_COMPRESS_MIN_BYTES) -> bytes:
+    data = json.dumps(state, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if len(data) >= compress_min_bytes:
+        return _ZLIB + zlib.compress(data, 6)
+    return _RAW + data
+
+
+def decode_state(data: bytes) -> Dict[str, Any]:
+    header, body = data[:1], data[1:]
+    if header == _ZLIB:
+        body = zlib.decompress(body)
+    elif header != _RAW:
+        raise ValueError(f"Unknown session state encoding {header!r}")
+    return json.loads(body.decode('utf-8'))
+
+
+class SessionStore:
+    """Key-value storage of encoded session state; subclasses provide
+    get/set/set_if/delete."""
+
+    def __init__(self, ttl_seconds: int = SESSION_TTL_SECONDS, prefix: str = SESSION_KEY_PREFIX):
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes) -> None:
+        raise NotImplementedError
+
+    def set_if(self, key: str, value: bytes, check: Callable[[Optional[bytes]], bool]) -> bool:
+        """Atomically set ``key`` if ``check`` accepts its current value."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def _key(self, kind: str, session_id: str) -> str:
+        return f"{self.prefix}{kind}:{session_id}"
+
+    def load(self, session_id: str, kind: str = 'memory') -> Optional[Dict[str, Any]]:
+        data = self.get(self._key(kind, session_id))
+        return decode_state(data) if data else None
+
+    def save(self, session_id: str, state: Dict[str, Any], kind: str = 'memory') -> None:
+        self.set(self._key(kind, session_id), encode_state(state))
+
+    def save_if(self, session_id: str, state: Dict[str, Any],
+                check: Callable[[Optional[Dict[str, Any]]], bool], kind: str = 'memory') -> bool:
+        """Save ``state`` only if ``check`` accepts the stored state; False otherwise."""
+        return self.set_if(self._key(kind, session_id), encode_state(state),
+                           lambda data: check(decode_state(data) if data else None))
+
+    def remove(self, session_id: str, kind: str = 'memory') -> None:
+        self.delete(self._key(kind, session_id))
+
+
+class InMemorySessionStore(SessionStore):
+    """Process-local store; entries still expire after the TTL."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._data: Dict[str, Tuple[bytes, float]] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry[0]
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._get(key)
+
+    def set(self, key: str, value: bytes) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl_seconds)
+
+    def set_if(self, key: str, value: bytes, check: Callable[[Optional[bytes]], bool]) -> bool:
+        with self._lock:
+            if not check(self._get(key)):
+                return False
+            self._data[key] = (value, time.monotonic() + self.ttl_seconds)
+            return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class RedisSessionStore(SessionStore):
+    """Store on a Redis-protocol server, shared by every worker."""
+
+    def __init__(self, url: str, **kwargs):
+        from core.resp import RespClient
+
+        super().__init__(**kwargs)
+        self.client = RespClient.from_url(url)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.execute('GET', key)
+
+    def set(self, key: str, value: bytes) -> None:
+        self.client.execute('SET', key, value, 'EX', self.ttl_seconds)
+
+    def set_if(self, key: str, value: bytes, check: Callable[[Optional[bytes]], bool]) -> bool:
+        return self.client.transaction(
+            key, lambda current: [('SET', key, value, 'EX', self.ttl_seconds)] if check(current) else None)
+
+    def delete(self, key: str) -> None:
+        self.client.execute('DEL', key)
+
+
+def create_session_store(url: str = SESSION_STORE, **kwargs) -> SessionStore:
+    if url.startswith('redis://'):
+        return RedisSessionStore(url, **kwargs)
+    if url in ('', 'memory://'):
+        return InMemorySessionStore(**kwargs)
+    raise ValueError(f"Unsupported SESSION_STORE: {url}")
+
+
+_session_store: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """Process-wide store built from ``SESSION_STORE``."""
+    global _session_store
+    if _session_store is None:
+        with _store_lock:
+            if _session_store is None:
+                _session_store = create_session_store()
+    return _session_store
+
+
+def load_memory(store: SessionStore, session_id: str,
+                cached: Optional[TokenBudgetMemory] = None) -> TokenBudgetMemory:
+    """The session's memory: ``cached`` if it is still current, else rebuilt from the store."""
+    state = store.load(session_id)
+    if state is None:
+        memory = cached or TokenBudgetMemory()
+    elif cached is not None and cached.token == state.get('v'):
+        memory = cached
+    else:
+        memory = TokenBudgetMemory.from_state(state)
+    memory.on_summary = lambda m: save_summary(store, session_id, m)
+    return memory
+
+
+def save_memory(store: SessionStore, session_id: str, memory: TokenBudgetMemory) -> None:
+    """Write the memory after a turn; the latest turn always wins."""
+    _, state = memory.new_state()
+    store.save(session_id, state)
+
+
+def save_summary(store: SessionStore, session_id: str, memory: TokenBudgetMemory) -> bool:
+    """Write a finished background summary, unless the stored memory has
+    changed since this worker last wrote it."""
+    previous, state = memory.new_state()
+    saved = store.save_if(session_id, state, lambda current: (current or {}).get('v') == previous)
+    if not saved:
+        # 其他 worker 已寫入較新的回合；這份記憶已過期，下一個回合會從儲存重建
+        log_event(logger, logging.INFO, 'session.summary_stale', session=session_id)
+    return saved
+
+
+def load_job(store: SessionStore, session_id: str) -> Optional[Dict[str, Any]]:
+    """The state of the session's translation job, if it has one."""
+    return store.load(session_id, kind='job')
+
+
+def save_job(store: SessionStore, session_id: str, **fields) -> Dict[str, Any]:
+    """Record the state of the session's translation job."""
+    job = {**(load_job(store, session_id) or {}), **fields, 'updated': round(time.time())}
+    store.save(session_id, job, kind='job')
+    return job
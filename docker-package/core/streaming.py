@@ -0,0 +1,73 @@
+"""Stream an agent turn to the Chainlit UI as it happens.
+
+One ``ChainlitStreamHandler`` is created per turn and passed to the shared
+executor through ``config={"callbacks": [...]}``. LLM tokens are appended to
+a Chainlit message as they arrive, so the user sees the answer start before
+the whole AgentExecutor run finishes, and each tool call is shown as a step
+with its input and output.
+"""
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+import chainlit as cl
+from langchain_core.callbacks import AsyncCallbackHandler
+
+TRANSLATION_COMPLETE = "TRANSLATION_COMPLETE"
+
+
+class ChainlitStreamHandler(AsyncCallbackHandler):
+    """Pushes LLM tokens and tool steps of one turn to the user's session."""
+
+    def __init__(self):
+        self.message: Optional[cl.Message] = None
+        self.steps: Dict[UUID, cl.Step] = {}
+
+    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        # 呼叫工具的回合只有 tool_call 片段，沒有文字 token
+        if not token:
+            return
+        if self.message is None:
+            self.message = cl.Message(content="")
+        await self.message.stream_token(token)
+
+    async def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *,
+                            run_id: UUID, **kwargs: Any) -> None:
+        # 模型在呼叫工具前說的話保留為獨立訊息，最後的回答另起一則
+        await self._close_message()
+        step = cl.Step(name=(serialized or {}).get("name") or kwargs.get("name") or "tool", type="tool")
+        step.input = input_str
+        await step.send()
+        self.steps[run_id] = step
+
+    async def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        step = self.steps.pop(run_id, None)
+        if step is not None:
+            step.output = str(getattr(output, "content", output))
+            await step.update()
+
+    async def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        step = self.steps.pop(run_id, None)
+        if step is not None:
+            step.is_error = True
+            step.output = str(error)
+            await step.update()
+
+    async def _close_message(self) -> None:
+        if self.message is not None:
+            await self.message.send()
+            self.message = None
+
+    async def finish(self, output: str) -> None:
+        """Finalize the streamed answer, or send ``output`` if nothing was streamed."""
+        if output == TRANSLATION_COMPLETE:
+            # 翻譯工具已自行回覆使用者，不顯示這個狀態字串
+            if self.message is not None:
+                await self.message.remove()
+                self.message = None
+            return
+        if self.message is None:
+            self.message = cl.Message(content=output)
+        elif self.message.content != output:
+            self.message.content = output
+        await self.message.send()
+        self.message = None
@@ -0,0 +1,120 @@
+"""Optional warm-up so the first chat turn does not pay for cold starts.
+
+With ``WARMUP=1`` (the default), ``start_warmup`` runs ``warm_up`` on a
+background thread when the app is loaded. It imports and builds the agent
+components, opens ``WARMUP_DB_CONNECTIONS`` pooled database connections,
+starts the thread that keeps the MySQL rollup tables fresh and, with
+``SQL_COLUMNAR=1``, loads the in-memory columnar copy of sales. The
+Chainlit server keeps serving while this runs. With ``WARMUP=0``, refresh the rollups
+with ``python -m tools.sql_rollup`` on a schedule instead.
+
+The OpenAI client's connections belong to the event loop that opens them,
+so ``warm_llm_connection`` is awaited from the first chat start instead:
+one cheap models request opens the pooled TLS connection while the user is
+still typing the first message.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from tools.logging_setup import get_logger, log_event
+
+WARMUP = os.getenv('WARMUP', '1') == '1'
+WARMUP_DB_CONNECTIONS = int(os.getenv('WARMUP_DB_CONNECTIONS', '2'))
+
+logger = get_logger('warmup')
+
+_warmup_thread: Optional[threading.Thread] = None
+_llm_warmed = False
+_llm_warming = False
+_llm_lock = threading.Lock()
+
+
+def warm_db_connections(count: int = WARMUP_DB_CONNECTIONS) -> int:
+    """Open up to ``count`` pooled connections and return them to the pool."""
+    from tools.db import get_pool
+
+    pool = get_pool()
+    if not pool or count <= 0:
+        return 0
+    connections = []
+    try:
+        for _ in range(min(count, pool.size)):
+            connections.append(pool.acquire())
+    finally:
+        for connection in connections:
+            pool.release(connection)
+    return len(connections)
+
+
+def warm_up(db_connections: int = WARMUP_DB_CONNECTIONS) -> Dict[str, float]:
+    """Build the agent components, open database connections and start the
+    rollup refresher and the columnar load.
+
+    Returns the milliseconds each phase took."""
+    from core.agent import get_agent_components
+
+    timings = {}
+    started = time.perf_counter()
+    get_agent_components()
+    timings['components_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+    started = time.perf_counter()
+    try:
+        timings['db_connections'] = warm_db_connections(db_connections)
+    except Exception as e:
+        log_event(logger, logging.WARNING, 'warmup.db_failed', error=str(e))
+    timings['db_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+    # 彙總表由背景執行緒刷新，使用者的查詢不必等待
+    from tools.sql_rollup import start_rollup_refresher
+    try:
+        start_rollup_refresher()
+    except Exception as e:
+        log_event(logger, logging.WARNING, 'warmup.rollup_failed', error=str(e))
+    # 欄式副本在背景載入，載入完成前查詢交給資料庫
+    from tools.sql_columnar import start_columnar_load
+    start_columnar_load()
+    log_event(logger, logging.INFO, 'warmup.finished', **timings)
+    return timings
+
+
+def start_warmup() -> threading.Thread:
+    """Run ``warm_up`` once on a daemon thread."""
+    global _warmup_thread
+    if _warmup_thread is None:
+        _warmup_thread = threading.Thread(target=warm_up, name='warmup', daemon=True)
+        _warmup_thread.start()
+    return _warmup_thread
+
+
+async def warm_llm_connection() -> Optional[float]:
+    """Open the shared OpenAI client's connection once per process.
+
+    Returns the milliseconds it took, or None if it already ran, is running
+    or failed. A failed attempt is retried by the next call."""
+    global _llm_warmed, _llm_warming
+    with _llm_lock:
+        if _llm_warmed or _llm_warming:
+            return None
+        _llm_warming = True
+    from core.agent import get_agent_components
+
+    started = time.perf_counter()
+    try:
+        # 列出模型不消耗 token，只為了完成 DNS 與 TLS 交握
+        await get_agent_components().llm.root_async_client.models.list()
+    except Exception as e:
+        log_event(logger, logging.WARNING, 'warmup.llm_failed', error=str(e))
+        return None
+    else:
+        with _llm_lock:
+            _llm_warmed = True
+    finally:
+        with _llm_lock:
+            _llm_warming = False
+    elapsed = round((time.perf_counter() - started) * 1000, 1)
+    log_event(logger, logging.INFO, 'warmup.llm_connected', ms=elapsed)
+    return elapsed
@@ -1,17 +1,52 @@
--- Drop existing table if it exists
+-- Drop existing tables if they exist
+DROP TABLE IF EXISTS sales_daily;
+DROP TABLE IF EXISTS sales_monthly;
+DROP TABLE IF EXISTS rollup_state;
 DROP TABLE IF EXISTS sales;
 
--- Create the sales table
+-- Create the sales table, partitioned by month on Date so queries over a
+-- month or quarter only read those partitions. MySQL requires the
+-- partitioning column in the primary key. New monthly partitions are split
+-- off p_future by `python -m tools.sql_partitions maintain`.
 CREATE TABLE sales (
-    ID VARCHAR(10) PRIMARY KEY,
-    Date DATE,
+    ID VARCHAR(12) NOT NULL,
+    Date DATE NOT NULL,
     Region VARCHAR(50),
     City VARCHAR(50),
     Category VARCHAR(50),
     Product VARCHAR(50),
     Quantity INT,
     Unit_Price DECIMAL(10,2),
-    Total_Price DECIMAL(10,2)
+    Total_Price DECIMAL(10,2),
+    PRIMARY KEY (ID, Date)
+)
+PARTITION BY RANGE (TO_DAYS(Date)) (
+    PARTITION p_before VALUES LESS THAN (TO_DAYS('2023-01-01')),
+    PARTITION p202301 VALUES LESS THAN (TO_DAYS('2023-02-01')),
+    PARTITION p202302 VALUES LESS THAN (TO_DAYS('2023-03-01')),
+    PARTITION p202303 VALUES LESS THAN (TO_DAYS('2023-04-01')),
+    PARTITION p202304 VALUES LESS THAN (TO_DAYS('2023-05-01')),
+    PARTITION p202305 VALUES LESS THAN (TO_DAYS('2023-06-01')),
+    PARTITION p202306 VALUES LESS THAN (TO_DAYS('2023-07-01')),
+    PARTITION p202307 VALUES LESS THAN (TO_DAYS('2023-08-01')),
+    PARTITION p202308 VALUES LESS THAN (TO_DAYS('2023-09-01')),
+    PARTITION p202309 VALUES LESS THAN (TO_DAYS('2023-10-01')),
+    PARTITION p202310 VALUES LESS THAN (TO_DAYS('2023-11-01')),
+    PARTITION p202311 VALUES LESS THAN (TO_DAYS('2023-12-01')),
+    PARTITION p202312 VALUES LESS THAN (TO_DAYS('2024-01-01')),
+    PARTITION p202401 VALUES LESS THAN (TO_DAYS('2024-02-01')),
+    PARTITION p202402 VALUES LESS THAN (TO_DAYS('2024-03-01')),
+    PARTITION p202403 VALUES LESS THAN (TO_DAYS('2024-04-01')),
+    PARTITION p202404 VALUES LESS THAN (TO_DAYS('2024-05-01')),
+    PARTITION p202405 VALUES LESS THAN (TO_DAYS('2024-06-01')),
+    PARTITION p202406 VALUES LESS THAN (TO_DAYS('2024-07-01')),
+    PARTITION p202407 VALUES LESS THAN (TO_DAYS('2024-08-01')),
+    PARTITION p202408 VALUES LESS THAN (TO_DAYS('2024-09-01')),
+    PARTITION p202409 VALUES LESS THAN (TO_DAYS('2024-10-01')),
+    PARTITION p202410 VALUES LESS THAN (TO_DAYS('2024-11-01')),
+    PARTITION p202411 VALUES LESS THAN (TO_DAYS('2024-12-01')),
+    PARTITION p202412 VALUES LESS THAN (TO_DAYS('2025-01-01')),
+    PARTITION p_future VALUES LESS THAN MAXVALUE
 );
 
 -- Insert sample data
@@ -48,4 +83,40 @@ INSERT INTO sales VALUES
 ('ID07380', '2023-03-18', '関東', '東京', '果物', 'みかん', 45, 198.00, 8910.00),
 ('ID07381', '2023-03-20', '関西', '神戸', '野菜', '玉ねぎ', 62, 481.00, 29822.00),
 ('ID07382', '2023-03-22', '関東', '埼玉', '果物', 'バナナ', 38, 228.00, 8664.00),
-('ID07383', '2023-03-25', '関西', '京都', '野菜', 'トマト', 55, 298.00, 16390.00); 
\ No newline at end of file
+('ID07383', '2023-03-25', '関西', '京都', '野菜', 'トマト', 55, 298.00, 16390.00); 
+
+-- Rollup tables: sales pre-aggregated by day and by month.
+-- They are refreshed incrementally by tools/sql_rollup.py, which folds in
+-- sales rows whose ID is above the watermark recorded in rollup_state.
+CREATE TABLE sales_daily (
+    Date DATE NOT NULL,
+    Region VARCHAR(50) NOT NULL,
+    City VARCHAR(50) NOT NULL,
+    Category VARCHAR(50) NOT NULL,
+    Product VARCHAR(50) NOT NULL,
+    Quantity_Sum BIGINT NOT NULL,
+    Total_Price_Sum DECIMAL(20,2) NOT NULL,
+    Row_Count BIGINT NOT NULL,
+    PRIMARY KEY (Date, Region, City, Category, Product)
+);
+
+CREATE TABLE sales_monthly (
+    Month DATE NOT NULL,
+    Region VARCHAR(50) NOT NULL,
+    City VARCHAR(50) NOT NULL,
+    Category VARCHAR(50) NOT NULL,
+    Product VARCHAR(50) NOT NULL,
+    Quantity_Sum BIGINT NOT NULL,
+    Total_Price_Sum DECIMAL(20,2) NOT NULL,
+    Row_Count BIGINT NOT NULL,
+    PRIMARY KEY (Month, Region, City, Category, Product)
+);
+
+CREATE TABLE rollup_state (
+    name VARCHAR(64) PRIMARY KEY,
+    last_id VARCHAR(16) NOT NULL
+);
+
+INSERT INTO rollup_state VALUES
+('sales_daily', ''),
+('sales_monthly', '');
@@ -0,0 +1,79 @@
+import asyncio
+import os
+import threading
+import unittest
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-test')
+
+from core.agent import get_agent_components, new_memory
+from tools.default_tool import TOOL_EXECUTOR_WORKERS, DefaultTool, get_tool_executor
+
+
+class ThreadNameTool(DefaultTool):
+    name: str = "thread_name"
+    description: str = "Returns the name of the thread the tool runs on."
+
+    def _run(self, text: str = ""):
+        return threading.current_thread().name
+
+
+class TestAgentComponents(unittest.TestCase):
+    def test_components_are_shared(self):
+        """LLM、工具與執行器整個程序只建立一次，執行器不帶記憶"""
+        components = get_agent_components()
+        self.assertIs(get_agent_components(), components)
+        self.assertIsNone(components.executor.memory)
+        self.assertIs(components.tools[0], components.sql_tool)
+
+    def test_memory_is_per_session(self):
+        """每個 session 有獨立的對話記憶"""
+        first, second = new_memory(), new_memory()
+        first.save_context({"input": "hi"}, {"output": "hello"})
+        self.assertEqual(len(first.messages), 2)
+        self.assertEqual(second.messages, [])
+
+
+class TestAsyncTools(unittest.TestCase):
+    def test_blocking_tools_run_on_tool_executor(self):
+        """非同步呼叫同步工具時應在工具執行緒池執行，不阻塞 event loop"""
+        name = asyncio.run(ThreadNameTool().ainvoke({"text": "x"}))
+        self.assertTrue(name.startswith("tool"))
+        self.assertNotEqual(name, threading.current_thread().name)
+
+    def test_tool_executor_is_bounded(self):
+        """同時呼叫的工具數超過上限時排隊，執行緒數不超過 TOOL_EXECUTOR_WORKERS"""
+        executors = []
+        threads = [threading.Thread(target=lambda: executors.append(get_tool_executor())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(all(executor is executors[0] for executor in executors))
+
+        running, peak, lock = 0, 0, threading.Lock()
+
+        class SlowTool(DefaultTool):
+            name: str = "slow"
+            description: str = "Sleeps briefly."
+
+            def _run(self, text: str = ""):
+                nonlocal running, peak
+                with lock:
+                    running += 1
+                    peak = max(peak, running)
+                threading.Event().wait(0.02)
+                with lock:
+                    running -= 1
+                return threading.current_thread().name
+
+        async def call_many():
+            return await asyncio.gather(*(SlowTool().ainvoke({"text": "x"})
+                                          for _ in range(TOOL_EXECUTOR_WORKERS * 3)))
+
+        names = asyncio.run(call_many())
+        self.assertLessEqual(peak, TOOL_EXECUTOR_WORKERS)
+        self.assertLessEqual(len(set(names)), TOOL_EXECUTOR_WORKERS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+
+from tools.index_advisor import build_candidates, candidate_columns, report
+from tools.sql_workload import WorkloadLog, read_workload
+
+
+class TestIndexAdvisor(unittest.TestCase):
+    def test_candidate_columns(self):
+        """等值條件在前，範圍條件在後；沒有範圍條件時加上 GROUP BY 欄位"""
+        self.assertEqual(
+            candidate_columns("SELECT SUM(Total_Price) FROM sales "
+                              "WHERE Region = '関東' AND Date BETWEEN '2023-01-01' AND '2023-01-31'"),
+            ['region', 'date']
+        )
+        self.assertEqual(
+            candidate_columns("SELECT Product, SUM(Quantity) FROM sales "
+                              "WHERE Category = '野菜' GROUP BY Product"),
+            ['category', 'product']
+        )
+        self.assertEqual(candidate_columns("SELECT * FROM sales WHERE YEAR(Date) = 2023"), [])
+
+    def test_prefix_candidates_merge(self):
+        """前綴相同的候選索引合併到較長的索引"""
+        entries = [
+            {'sql': "SELECT * FROM sales WHERE City = '東京'", 'latency_ms': 10.0},
+            {'sql': "SELECT * FROM sales WHERE City = '東京' AND Date > '2023-02-01'", 'latency_ms': 30.0},
+            {'sql': "SELECT Region, COUNT(*) FROM sales GROUP BY Region", 'latency_ms': 5.0},
+        ]
+        candidates = build_candidates(entries)
+        self.assertEqual(candidates[0].columns, ['City', 'Date'])
+        self.assertEqual(candidates[0].queries, 2)
+        self.assertEqual(candidates[0].total_ms, 40.0)
+        self.assertIn("CREATE INDEX idx_sales_city_date ON sales (City, Date);", report(candidates))
+
+
+
+class TestWorkloadLog(unittest.TestCase):
+    def test_rotates_and_reads_backups(self):
+        """紀錄檔超過大小上限時輪替，只保留指定數量的舊檔，讀取時依時間順序"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'workload.jsonl')
+            log = WorkloadLog(path, max_bytes=400, backups=2)
+            for i in range(12):
+                log.record(f"SELECT * FROM sales WHERE Quantity = {i}", float(i))
+            log.close()
+            self.assertTrue(os.path.exists(path + '.2'))
+            self.assertFalse(os.path.exists(path + '.3'))
+            self.assertTrue(all(os.path.getsize(path + suffix) <= 400 for suffix in ('', '.1', '.2')))
+            latencies = [entry['latency_ms'] for entry in read_workload(path)]
+            self.assertEqual(latencies, sorted(latencies))
+            self.assertEqual(latencies[-1], 11.0)
+            self.assertLess(len(latencies), 12)
+
+
+if __name__ == '__main__':
+    unittest.main()
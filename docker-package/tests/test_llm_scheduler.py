@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import unittest
+
+import httpx
+
+from tools.llm_scheduler import (BULK, INTERACTIVE, LLMScheduler, ScheduledAsyncTransport,
+                                 llm_context)
+
+
+async def admitted_order(scheduler, holder, waiters):
+    """Queue ``waiters`` (priority, user) behind ``holder`` and return the order they get a slot."""
+    order = []
+
+    async def wait(priority, user):
+        ticket = await scheduler.acquire(priority, user)
+        order.append((priority, user))
+        await asyncio.sleep(0)
+        scheduler.release(ticket)
+
+    tasks = []
+    for priority, user in waiters:
+        tasks.append(asyncio.create_task(wait(priority, user)))
+        await asyncio.sleep(0)
+    scheduler.release(holder)
+    await asyncio.gather(*tasks)
+    return order
+
+
+class TestLLMScheduler(unittest.TestCase):
+    def test_interactive_before_bulk(self):
+        """名額空出時，對話請求先於排在前面的批次翻譯"""
+        async def run():
+            scheduler = LLMScheduler(max_concurrency=1, bulk_max_concurrency=1)
+            holder = await scheduler.acquire(BULK, 'translator')
+            return await admitted_order(scheduler, holder, [(BULK, 'translator'), (INTERACTIVE, 'chat')])
+
+        self.assertEqual(asyncio.run(run()), [(INTERACTIVE, 'chat'), (BULK, 'translator')])
+
+    def test_bulk_cap_keeps_slots_for_chat(self):
+        """批次工作用滿自己的上限後，對話仍可立即取得名額"""
+        async def run():
+            scheduler = LLMScheduler(max_concurrency=2, bulk_max_concurrency=1)
+            await scheduler.acquire(BULK, 'a')
+            waiting = asyncio.create_task(scheduler.acquire(BULK, 'b'))
+            chat = await asyncio.wait_for(scheduler.acquire(INTERACTIVE, 'c'), timeout=1)
+            stats = scheduler.stats()
+            waiting.cancel()
+            await asyncio.gather(waiting, return_exceptions=True)
+            return chat, stats, scheduler.stats()
+
+        chat, stats, after = asyncio.run(run())
+        self.assertEqual(chat.priority, INTERACTIVE)
+        self.assertEqual(stats, {'in_flight': {INTERACTIVE: 1, BULK: 1}, 'waiting': {INTERACTIVE: 0, BULK: 1}})
+        self.assertEqual(after['waiting'][BULK], 0)
+
+    def test_users_take_turns(self):
+        """同一等級內輪流服務，大量排隊的使用者不會擋住其他人"""
+        async def run():
+            scheduler = LLMScheduler(max_concurrency=1, bulk_max_concurrency=1)
+            holder = await scheduler.acquire(BULK, 'heavy')
+            return await admitted_order(scheduler, holder,
+                                        [(BULK, 'heavy')] * 3 + [(BULK, 'light')])
+
+        self.assertEqual([user for _, user in asyncio.run(run())], ['light', 'heavy', 'heavy', 'heavy'])
+
+    def test_sync_callers(self):
+        """執行緒中的同步呼叫也會排隊等候名額"""
+        scheduler = LLMScheduler(max_concurrency=1)
+        holder = scheduler.acquire_sync(INTERACTIVE, 'a')
+        admitted = threading.Event()
+
+        def worker():
+            scheduler.release(scheduler.acquire_sync(BULK, 'b'))
+            admitted.set()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        self.assertFalse(admitted.wait(0.05))
+        scheduler.release(holder)
+        self.assertTrue(admitted.wait(1))
+        thread.join()
+
+
+class ServerSentEvents(httpx.AsyncByteStream):
+    async def __aiter__(self):
+        yield b'data: [DONE]\n\n'
+
+
+class TestScheduledTransport(unittest.TestCase):
+    def test_slot_held_until_body_is_read(self):
+        """對話完成請求的名額在回應內容讀完後才歸還，其他請求不排隊"""
+        scheduler = LLMScheduler(max_concurrency=4)
+        seen = []
+
+        def handler(request):
+            seen.append(scheduler.stats()['in_flight'][BULK])
+            return httpx.Response(200, stream=ServerSentEvents())
+
+        async def run():
+            transport = ScheduledAsyncTransport(scheduler, httpx.MockTransport(handler))
+            async with httpx.AsyncClient(transport=transport, base_url='http://llm/v1') as client:
+                await client.get('/models')
+                with llm_context(BULK, 'user-1'):
+                    async with client.stream('POST', '/chat/completions', json={}) as response:
+                        during = scheduler.stats()['in_flight'][BULK]
+                        await response.aread()
+            return during, scheduler.stats()['in_flight'][BULK]
+
+        during, after = asyncio.run(run())
+        self.assertEqual(seen, [0, 1])
+        self.assertEqual((during, after), (1, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
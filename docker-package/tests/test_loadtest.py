@@ -0,0 +1,64 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+from fastapi.testclient import TestClient
+
+from benchmarks.fake_llm import SQL_QUERIES, create_app, plan_reply
+from benchmarks.loadtest import conversation, percentiles
+
+TOOLS = [{'type': 'function', 'function': {'name': name}} for name in ('execute_sql_query', 'translate_ppt')]
+
+
+class TestFakeLLM(unittest.TestCase):
+    def test_scripted_replies(self):
+        """問題先得到工具呼叫，工具結果之後得到回答，翻譯請求回傳加上前綴的原文"""
+        sql = plan_reply({'tools': TOOLS, 'messages': [{'role': 'user', 'content': "各城市的銷售額"}]})
+        self.assertEqual(sql['tool_call'], ('execute_sql_query', {'query': SQL_QUERIES['city']}))
+        translate = plan_reply({'tools': TOOLS, 'messages': [{'role': 'user', 'content': "幫我翻譯簡報"}]})
+        self.assertEqual(translate['tool_call'][0], 'translate_ppt')
+        answer = plan_reply({'tools': TOOLS, 'messages': [{'role': 'user', 'content': "Sales by city"},
+                                                          {'role': 'tool', 'content': "[]"}]})
+        self.assertIn('content', answer)
+        translated = plan_reply({'messages': [{'role': 'system', 'content': "You are a professional translator."},
+                                              {'role': 'user', 'content': "Hello"}]})
+        self.assertEqual(translated['content'], "[translated] Hello")
+
+    def test_streamed_tool_call(self):
+        """串流回應依 OpenAI 格式送出工具呼叫與用量"""
+        client = TestClient(create_app(latency_ms=0, jitter_ms=0, token_ms=0))
+        response = client.post('/v1/chat/completions', json={
+            'model': 'fake-llm', 'stream': True, 'stream_options': {'include_usage': True}, 'tools': TOOLS,
+            'messages': [{'role': 'user', 'content': "Top products"}]})
+        chunks = [json.loads(line[6:]) for line in response.text.splitlines()
+                  if line.startswith('data: {')]
+        call = chunks[0]['choices'][0]['delta']['tool_calls'][0]
+        self.assertEqual(call['function']['name'], 'execute_sql_query')
+        self.assertEqual(chunks[1]['choices'][0]['finish_reason'], 'tool_calls')
+        self.assertIn('usage', chunks[-1])
+        self.assertTrue(response.text.rstrip().endswith('data: [DONE]'))
+
+
+class TestLoadTest(unittest.TestCase):
+    def test_conversation_script(self):
+        self.assertEqual([kind for kind, _ in conversation(0, 4, 2)], ['sql', 'translate', 'sql', 'translate'])
+        self.assertEqual(percentiles([1, 2, 3, 4])['p50'], 3)
+
+    def test_end_to_end(self):
+        """兩個同時進行的對話經過真實的處理函式，查詢與翻譯都沒有錯誤"""
+        command = [sys.executable, '-m', 'benchmarks.loadtest', '--sessions', '2', '--turns', '2',
+                   '--translate-every', '2', '--slides', '1', '--latency-ms', '0', '--jitter-ms', '0',
+                   '--token-ms', '0', '--think-ms', '0', '--ramp-seconds', '0']
+        output = subprocess.run(command, capture_output=True, text=True, timeout=240, check=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+        report = json.loads(output[output.index('{\n  "sessions"'):])
+        self.assertEqual(report['turns'], 4)
+        self.assertEqual(report['errors'], 0)
+        self.assertEqual(set(report['turn_ms_by_kind']), {'sql', 'translate'})
+        self.assertGreater(report['session_state_bytes']['max'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
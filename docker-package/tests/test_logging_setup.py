@@ -0,0 +1,47 @@
+import io
+import json
+import logging
+import unittest
+from unittest import mock
+
+from tools import logging_setup
+from tools.logging_setup import get_logger, log_event, parse_sample_rates, setup_logging, shutdown_logging
+
+
+class TestStructuredLogging(unittest.TestCase):
+    def setUp(self):
+        shutdown_logging()
+        self.stream = io.StringIO()
+        setup_logging(level='INFO', fmt='json', stream=self.stream)
+        self.addCleanup(shutdown_logging)
+
+    def records(self):
+        shutdown_logging()
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_json_lines_with_levels(self):
+        """每筆紀錄是一行 JSON，低於設定等級的事件不輸出，過長的欄位被截短"""
+        logger = get_logger('test')
+        log_event(logger, logging.INFO, 'turn.started', chars=5, input='東京の売上' * 200)
+        log_event(logger, logging.DEBUG, 'agent.steps', steps=[])
+        [record] = self.records()
+        self.assertEqual((record['event'], record['level'], record['logger']),
+                         ('turn.started', 'info', 'chatbot.test'))
+        self.assertEqual(record['chars'], 5)
+        self.assertLess(len(record['input']), 600)
+
+    def test_sampling(self):
+        """抽樣率為 0 的事件不輸出，保留的事件帶有抽樣率"""
+        logger = get_logger('test')
+        with mock.patch.object(logging_setup, '_sample_rates', {'noisy': 0.0, 'half': 0.5}):
+            with mock.patch.object(logging_setup.random, 'random', return_value=0.1):
+                for _ in range(100):
+                    log_event(logger, logging.INFO, 'noisy')
+                log_event(logger, logging.INFO, 'half')
+        [record] = self.records()
+        self.assertEqual((record['event'], record['sample_rate']), ('half', 0.5))
+        self.assertEqual(parse_sample_rates('a=0.1, b=2,bad=x'), {'a': 0.1, 'b': 1.0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import threading
+import unittest
+
+from langchain_core.messages import SystemMessage
+
+from core.memory import TokenBudgetMemory, trim_text
+from tools.tokens import count_tokens
+
+
+def fake_summarizer(summary, messages, max_tokens):
+    return " ".join(filter(None, [summary, f"{len(messages) // 2} turns"]))
+
+
+class TestTokenBudgetMemory(unittest.TestCase):
+    def save_turns(self, memory, count, answer="ok"):
+        for i in range(count):
+            memory.save_context({"input": f"question {i}"}, {"output": answer})
+
+    def test_old_turns_are_summarized(self):
+        """超過最近回合數的舊回合併入摘要，最近的回合保留原文"""
+        memory = TokenBudgetMemory(token_budget=1000, recent_turns=2, summarizer=fake_summarizer)
+        self.save_turns(memory, 5)
+        memory.wait()
+        messages = memory.messages
+        self.assertIsInstance(messages[0], SystemMessage)
+        self.assertIn("3 turns", messages[0].content)
+        self.assertEqual([m.content for m in messages[1::2]], ["question 3", "question 4"])
+
+    def test_summaries_do_not_use_tool_threads(self):
+        """背景摘要在自己的執行緒池執行，不占用 SQL 工具的執行緒"""
+        threads = []
+
+        def summarizer(summary, messages, max_tokens):
+            threads.append(threading.current_thread().name)
+            return "summary"
+
+        memory = TokenBudgetMemory(token_budget=1000, recent_turns=1, summarizer=summarizer)
+        self.save_turns(memory, 3)
+        memory.wait()
+        self.assertTrue(threads and all(name.startswith("summary") for name in threads))
+
+    def test_history_stays_within_budget(self):
+        """長回答被截短，交給模型的紀錄不超過 token 預算，並回報省下的 token"""
+        long_answer = "| 東京 | 1234 |\n" * 500
+        memory = TokenBudgetMemory(token_budget=300, recent_turns=10, max_message_tokens=100,
+                                   summarizer=fake_summarizer, background=False)
+        self.save_turns(memory, 4, answer=long_answer)
+        messages = memory.messages
+        stats = memory.last_stats
+        self.assertLessEqual(stats['history_tokens'], 300)
+        self.assertGreater(stats['saved_tokens'], count_tokens(long_answer))
+        self.assertIn("tokens trimmed", messages[-1].content)
+
+    def test_failed_summary_keeps_questions(self):
+        """摘要失敗時改以使用者問過的問題作為摘要"""
+        def broken(summary, messages, max_tokens):
+            raise RuntimeError("rate limited")
+
+        memory = TokenBudgetMemory(token_budget=1000, recent_turns=1, summarizer=broken, background=False)
+        self.save_turns(memory, 3)
+        self.assertIn("question 0 / question 1", memory.messages[0].content)
+
+    def test_zero_budget_keeps_everything(self):
+        """預算設為 0 時保留完整對話"""
+        memory = TokenBudgetMemory(token_budget=0, summarizer=fake_summarizer)
+        self.save_turns(memory, 20, answer="x" * 5000)
+        self.assertEqual(len(memory.messages), 40)
+        self.assertEqual(trim_text("short", 10), "short")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import uuid
+
+from fastapi import FastAPI
+from fastapi.responses import HTMLResponse
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from core.metrics import MetricsCallbackHandler, mount_metrics
+from tools.metrics import LLM_SECONDS, LLM_TOKENS, TOOL_SECONDS, Histogram, Registry
+
+
+class TestHistogram(unittest.TestCase):
+    def test_render(self):
+        """輸出 Prometheus 文字格式的累計區間、總和與次數"""
+        registry = Registry()
+        histogram = registry.register(Histogram('demo_seconds', 'Demo.', ['tool'], buckets=(0.1, 1)))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, tool='sql')
+        text = registry.render()
+        self.assertIn('# TYPE demo_seconds histogram', text)
+        self.assertIn('demo_seconds_bucket{tool="sql",le="0.1"} 1', text)
+        self.assertIn('demo_seconds_bucket{tool="sql",le="1"} 2', text)
+        self.assertIn('demo_seconds_bucket{tool="sql",le="+Inf"} 3', text)
+        self.assertIn('demo_seconds_count{tool="sql"} 3', text)
+
+
+class TestMetricsCallbackHandler(unittest.TestCase):
+    def test_llm_and_tool_calls(self):
+        """LLM 呼叫記錄延遲與 token，工具呼叫依名稱記錄延遲"""
+        handler = MetricsCallbackHandler()
+        llm_run, tool_run = uuid.uuid4(), uuid.uuid4()
+        calls = LLM_SECONDS.count(model='test-model')
+        tools = TOOL_SECONDS.count(tool='describe_table')
+        prompt_tokens = LLM_TOKENS.value(model='test-model', kind='prompt')
+
+        handler.on_chat_model_start({}, [[]], run_id=llm_run, invocation_params={'model': 'test-model'})
+        handler.on_llm_new_token("Hi", run_id=llm_run)
+        message = AIMessage(content="Hi", usage_metadata={
+            'input_tokens': 1500, 'output_tokens': 5, 'total_tokens': 1505,
+            'input_token_details': {'cache_read': 1024}})
+        handler.on_llm_end(LLMResult(generations=[[ChatGeneration(message=message)]]), run_id=llm_run)
+        handler.on_tool_start({'name': 'describe_table'}, "sales", run_id=tool_run)
+        handler.on_tool_end("columns", run_id=tool_run)
+
+        self.assertEqual(LLM_SECONDS.count(model='test-model'), calls + 1)
+        self.assertEqual(TOOL_SECONDS.count(tool='describe_table'), tools + 1)
+        self.assertEqual(LLM_TOKENS.value(model='test-model', kind='prompt'), prompt_tokens + 1500)
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+    def test_mounted_before_catch_all(self):
+        """端點排在前端頁面的萬用路由之前"""
+        app = FastAPI()
+
+        @app.get("/{full_path:path}")
+        async def serve(full_path: str):
+            return HTMLResponse("<html></html>")
+
+        mount_metrics(app)
+        response = TestClient(app).get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['content-type'].startswith('text/plain'))
+        self.assertIn('# TYPE chat_turn_seconds histogram', response.text)
+
+
+if __name__ == '__main__':
+    unittest.main()
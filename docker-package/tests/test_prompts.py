@@ -0,0 +1,54 @@
+import os
+import unittest
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-test')
+
+from core.agent import get_agent_components
+from core.prompts import (BASE_PROMPT, SQL_SECTION, TRANSLATION_SECTION, PromptUsageTracker,
+                          prompt_tokens, section_messages, select_sections)
+
+
+class TestPromptSections(unittest.TestCase):
+    def test_select_sections(self):
+        """依問題判斷需要的工具段落，後續追問沿用上一個問題的段落"""
+        self.assertEqual(select_sections("2023年東京的銷售總額是多少？"), ['sql'])
+        self.assertEqual(select_sections("幫我將ppt從英文翻譯為繁體中文"), ['translation'])
+        self.assertEqual(select_sections("Hello, how are you?"), [])
+        history = [HumanMessage(content="PPTファイルを翻訳したい"), AIMessage(content="どの言語から？")]
+        self.assertEqual(select_sections("はい", history), ['translation'])
+
+    def test_stable_prefix(self):
+        """固定前綴在最前面，工具段落放在對話紀錄之後"""
+        prompt = get_agent_components().prompt
+        history = [HumanMessage(content="hi"), AIMessage(content="hello")]
+        first = prompt.format_messages(input="東京の売上", chat_history=history,
+                                       tool_sections=section_messages(['sql']), agent_scratchpad=[])
+        second = prompt.format_messages(input="translate", chat_history=history,
+                                        tool_sections=section_messages(['translation']), agent_scratchpad=[])
+        self.assertEqual(first[:3], second[:3])
+        self.assertEqual(first[0].content, BASE_PROMPT)
+        self.assertEqual(first[3].content, SQL_SECTION)
+        self.assertEqual(second[3].content, TRANSLATION_SECTION)
+        # 沒有附段落時也能組出提示
+        chat = prompt.format_messages(input="hi", chat_history=[], agent_scratchpad=[])
+        self.assertEqual(len(chat), 2)
+        self.assertGreater(prompt_tokens([])['system_tokens_saved'], prompt_tokens(['sql'])['system_tokens_saved'])
+
+    def test_usage_tracker(self):
+        """記錄 API 回報的提示 token 與命中快取的 token"""
+        tracker = PromptUsageTracker()
+        for cached in (0, 1024):
+            message = AIMessage(content="ok", usage_metadata={
+                'input_tokens': 2000, 'output_tokens': 10, 'total_tokens': 2010,
+                'input_token_details': {'cache_read': cached}})
+            tracker.on_llm_end(LLMResult(generations=[[ChatGeneration(message=message)]]))
+        stats = tracker.stats()
+        self.assertEqual((stats['calls'], stats['prompt_tokens'], stats['cached_tokens']), (2, 4000, 1024))
+        self.assertEqual(stats['cache_hit_rate'], 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+from core.router import IntentRouter, TranslationIntent
+
+ROUTED = [
+    ("I want to translate this presentation from Chinese to English", 'zh-TW', 'en'),
+    ("Translate the PPT from English to Japanese.", 'en', 'ja'),
+    ("Could you translate my slides into English from Japanese?", 'ja', 'en'),
+    ("English to Japanese translation", 'en', 'ja'),
+    ("幫我將ppt從英文翻譯為繁體中文", 'en', 'zh-TW'),
+    ("請把簡報從日文翻成英文", 'ja', 'en'),
+    ("中翻英", 'zh-TW', 'en'),
+    ("PPTファイルを日本語から英語に翻訳してください", 'ja', 'en'),
+    ("日本語から英語に", 'ja', 'en'),
+]
+
+PASSED = [
+    "PPTファイルを翻訳したい",
+    "translate from chinese to chinese",
+    "translate this sentence from english to japanese: hello",
+    "2023年東京的銷售額是多少？",
+    "Hello, how are you?",
+]
+
+
+class TestIntentRouter(unittest.TestCase):
+    def test_routes_explicit_requests(self):
+        """完整的翻譯請求直接對應到語言代碼"""
+        router = IntentRouter(enabled=True)
+        for text, olang, tlang in ROUTED:
+            with self.subTest(text=text):
+                self.assertEqual(router.route(text), TranslationIntent(olang=olang, tlang=tlang))
+
+    def test_ambiguous_input_goes_to_agent(self):
+        """缺少語言、語言相同或夾帶其他內容時交給代理，並統計快速路徑的使用次數"""
+        router = IntentRouter(enabled=True)
+        for text in PASSED:
+            with self.subTest(text=text):
+                self.assertIsNone(router.route(text))
+        router.route("中翻英")
+        self.assertEqual(router.stats(), {'routed': 1, 'passed': len(PASSED),
+                                          'fast_path_rate': round(1 / (len(PASSED) + 1), 4)})
+
+
+if __name__ == '__main__':
+    unittest.main()
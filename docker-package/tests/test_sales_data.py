@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+
+from tools.sales_data import CITIES, PRODUCTS, SalesLoader, generate_rows, read_rows, write_rows
+from tools.sqlite_backend import SQLitePool
+
+
+class TestGenerator(unittest.TestCase):
+    def test_rows_use_seed_domains(self):
+        """產生的資料應落在 init.sql 的地區、城市、類別與產品範圍內"""
+        rows = list(generate_rows(2000, seed=1))
+        self.assertEqual(len(rows), 2000)
+        for _, _, region, city, category, product, quantity, unit_price, total in rows:
+            self.assertIn(city, CITIES[region])
+            self.assertIn(product, PRODUCTS[category])
+            self.assertGreater(quantity, 0)
+            self.assertAlmostEqual(float(total), quantity * float(unit_price))
+        self.assertEqual(rows, list(generate_rows(2000, seed=1)))
+
+    def test_ids_sort_after_seed_rows(self):
+        """產生的 ID 以字串排序也須遞增，讓彙總表的水位線持續有效"""
+        ids = [row[0] for row in generate_rows(3, start_id=1_000_000_998)]
+        self.assertEqual(ids, sorted(ids))
+        self.assertGreater(ids[0], 'ID07383')
+
+
+class TestLoader(unittest.TestCase):
+    def test_csv_round_trip_into_sqlite(self):
+        """CSV 經批次 executemany 載入後列數與總額一致"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'sales.csv')
+            rows = list(generate_rows(2500))
+            self.assertEqual(write_rows(path, rows), 2500)
+            self.assertEqual(len(list(read_rows(path))), 2500)
+
+            pool = SQLitePool('sqlite:///' + os.path.join(directory, 'sales.db'))
+            try:
+                stats = SalesLoader(pool, batch_size=1000).load(path)
+                self.assertEqual((stats.rows, stats.batches), (2500, 3))
+                with pool.connection() as connection:
+                    with connection.cursor() as cursor:
+                        cursor.execute("SELECT COUNT(*) AS n, SUM(Quantity) AS q "
+                                       "FROM sales WHERE ID >= 'ID1000000000'")
+                        loaded = cursor.fetchone()
+            finally:
+                pool.close()
+        self.assertEqual(loaded['n'], 2500)
+        self.assertEqual(loaded['q'], sum(row[6] for row in rows))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+import socket
+import time
+import unittest
+
+from core.memory import TokenBudgetMemory
+from core.resp import LocalRespServer, RespClient, RespError
+from core.session_store import (InMemorySessionStore, RedisSessionStore, create_session_store,
+                                decode_state, encode_state, load_job, load_memory, save_job,
+                                save_memory, save_summary)
+
+
+class TestEncoding(unittest.TestCase):
+    def test_small_state_is_plain_json(self):
+        """小的狀態直接存成緊湊的 JSON"""
+        data = encode_state({'s': "摘要", 't': []})
+        self.assertEqual(data, 'j{"s":"摘要","t":[]}'.encode('utf-8'))
+        self.assertEqual(decode_state(data), {'s': "摘要", 't': []})
+
+    def test_large_state_is_compressed(self):
+        """超過門檻的狀態以 zlib 壓縮"""
+        state = {'t': [["台北的銷售額是多少？", "| 台北 | 1234 |\n" * 50, 300]] * 5}
+        data = encode_state(state, compress_min_bytes=512)
+        self.assertTrue(data.startswith(b'z'))
+        self.assertLess(len(data), len(encode_state(state, compress_min_bytes=10 ** 9)) // 5)
+        self.assertEqual(decode_state(data), state)
+
+
+class TestInMemorySessionStore(unittest.TestCase):
+    def test_entries_expire(self):
+        """超過 TTL 的狀態視為不存在"""
+        store = InMemorySessionStore(ttl_seconds=0)
+        store.save('thread', {'v': 1})
+        self.assertIsNone(store.load('thread'))
+
+    def test_unsupported_url(self):
+        with self.assertRaises(ValueError):
+            create_session_store('memcached://localhost')
+
+
+class TestRedisSessionStore(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalRespServer().start()
+        self.store = create_session_store(self.server.url)
+
+    def tearDown(self):
+        self.store.client.close()
+        self.server.stop()
+
+    def test_save_load_remove(self):
+        """透過 Redis 協定存取，刪除後讀不到"""
+        self.assertIsInstance(self.store, RedisSessionStore)
+        self.assertIsNone(self.store.load('thread'))
+        self.store.save('thread', {'s': "summary", 't': [["q", "a", 10]]})
+        self.assertEqual(self.store.load('thread'), {'s': "summary", 't': [["q", "a", 10]]})
+        self.store.remove('thread')
+        self.assertIsNone(self.store.load('thread'))
+
+    def test_ttl_is_set(self):
+        """寫入時附上 TTL，逾時後由伺服器清除"""
+        self.store.ttl_seconds = 1
+        self.store.save('thread', {'v': 1})
+        self.assertIsNotNone(self.store.load('thread'))
+        time.sleep(1.1)
+        self.assertIsNone(self.store.load('thread'))
+
+    def test_set_if_detects_concurrent_write(self):
+        """WATCH 之後鍵被其他連線改過時，交易不執行"""
+        other = RespClient.from_url(self.server.url)
+        self.store.save('thread', {'v': 'a'})
+
+        def check(current):
+            other.execute('SET', self.store._key('memory', 'thread'), encode_state({'v': 'b'}))
+            return True
+
+        self.assertFalse(self.store.save_if('thread', {'v': 'c'}, check))
+        self.assertEqual(self.store.load('thread'), {'v': 'b'})
+        self.assertTrue(self.store.save_if('thread', {'v': 'd'}, lambda current: current['v'] == 'b'))
+        self.assertFalse(self.store.save_if('thread', {'v': 'e'}, lambda current: current['v'] == 'b'))
+        self.assertEqual(self.store.load('thread'), {'v': 'd'})
+        other.close()
+
+    def test_failed_transaction_leaves_client_usable(self):
+        """交易中途出錯時清掉 WATCH 並丟棄連線，之後的命令與交易照常執行"""
+        client = RespClient.from_url(self.server.url)
+        client.execute('SET', 'job', 'a')
+
+        def fail(current):
+            raise ValueError("bad state")
+
+        with self.assertRaises(ValueError):
+            client.transaction('job', fail)
+        self.assertIsNone(client._socket)
+        self.assertEqual(client.execute('GET', 'job'), b'a')
+        self.assertTrue(client.transaction('job', lambda current: [('SET', 'job', 'b')]))
+        self.assertEqual(client.execute('GET', 'job'), b'b')
+        client.close()
+
+    def test_reconnects_after_server_closes_connection(self):
+        """伺服器關閉閒置連線後，下一個命令先重新連線再送出"""
+        client = RespClient.from_url(self.server.url)
+        client.execute('SET', 'job', 'a')
+        client._socket.shutdown(socket.SHUT_WR)
+        client._socket.recv(1)
+        self.assertEqual(client.execute('GET', 'job'), b'a')
+        client.close()
+
+    def test_error_reply(self):
+        client = RespClient.from_url(self.server.url)
+        with self.assertRaises(RespError):
+            client.execute('HGETALL', 'thread')
+        self.assertEqual(client.execute('PING'), 'PONG')
+        client.close()
+
+
+class TestSessionMemory(unittest.TestCase):
+    def save_turn(self, store, memory, question):
+        memory.save_context({"input": question}, {"output": "ok"})
+        save_memory(store, 'thread', memory)
+
+    def test_memory_moves_between_workers(self):
+        """另一個 worker 回答過後，從儲存重建記憶；沒有變動時沿用本機物件"""
+        store = InMemorySessionStore()
+        first = load_memory(store, 'thread')
+        self.save_turn(store, first, "question 1")
+
+        second = load_memory(store, 'thread')
+        self.assertIsNot(second, first)
+        self.assertEqual([m.content for m in second.messages], ["question 1", "ok"])
+        self.save_turn(store, second, "question 2")
+
+        self.assertIsNot(load_memory(store, 'thread', cached=first), first)
+        self.assertIs(load_memory(store, 'thread', cached=second), second)
+
+    def test_workers_never_share_a_token(self):
+        """兩個 worker 從同一份狀態各自寫入，寫入標記不同，過期的本機物件不會被沿用"""
+        store = InMemorySessionStore()
+        self.save_turn(store, load_memory(store, 'thread'), "question 1")
+        first, second = load_memory(store, 'thread'), load_memory(store, 'thread')
+        self.save_turn(store, first, "question 2")
+        self.save_turn(store, second, "question 2b")
+        self.assertNotEqual(first.token, second.token)
+        self.assertIsNot(load_memory(store, 'thread', cached=first), first)
+
+    def test_stale_summary_is_not_saved(self):
+        """摘要完成前其他 worker 已寫入新回合時，不以舊記憶覆蓋"""
+        store = InMemorySessionStore()
+        first = load_memory(store, 'thread')
+        self.save_turn(store, first, "question 1")
+        second = load_memory(store, 'thread')
+        self.save_turn(store, second, "question 2")
+
+        self.assertFalse(save_summary(store, 'thread', first))
+        self.assertEqual([turn[0] for turn in store.load('thread')['t']], ["question 1", "question 2"])
+        self.assertTrue(save_summary(store, 'thread', second))
+        self.assertEqual(store.load('thread')['v'], second.token)
+
+    def test_round_trip_keeps_summary(self):
+        memory = TokenBudgetMemory(token_budget=1000, recent_turns=1, background=False,
+                                   summarizer=lambda summary, messages, max_tokens: "earlier turns")
+        for i in range(3):
+            memory.save_context({"input": f"question {i}"}, {"output": "ok"})
+        restored = TokenBudgetMemory.from_state(decode_state(encode_state(memory.to_state())))
+        self.assertEqual(restored.summary, "earlier turns")
+        self.assertEqual([m.content for m in restored.messages], [m.content for m in memory.messages])
+
+    def test_job_state(self):
+        store = InMemorySessionStore()
+        save_job(store, 'thread', olang='英文', tlang='中文', status='running')
+        job = save_job(store, 'thread', status='complete')
+        self.assertEqual((job['olang'], job['status']), ('英文', 'complete'))
+        self.assertEqual(load_job(store, 'thread')['status'], 'complete')
+        self.assertIsNone(load_job(store, 'other'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import time
+import unittest
+
+from tools.sql_cache import MISS, QueryResultCache
+from tools.sql_utils import is_cacheable, is_read_only, normalize_sql, referenced_tables
+
+
+class TestSQLUtils(unittest.TestCase):
+    def test_normalize_sql(self):
+        """大小寫與空白不同的查詢應正規化為相同的鍵，字串常值保持不變"""
+        a = "SELECT Region, SUM(Total_Price)\n  FROM sales WHERE City = '東京';"
+        b = "select region,  sum(total_price) from SALES where city = '東京'"
+        self.assertEqual(normalize_sql(a), normalize_sql(b.replace('SALES', 'sales')))
+        self.assertIn("'東京'", normalize_sql(a))
+        self.assertNotEqual(normalize_sql("SELECT 'A'"), normalize_sql("SELECT 'a'"))
+
+    def test_read_only(self):
+        """只有單一唯讀語句可以被快取"""
+        self.assertTrue(is_read_only("SELECT * FROM sales"))
+        self.assertTrue(is_read_only("SELECT REPLACE(City, '東', 'x') FROM sales"))
+        self.assertFalse(is_read_only("DELETE FROM sales"))
+        self.assertFalse(is_read_only("SELECT 1; DROP TABLE sales"))
+        self.assertFalse(is_read_only("SELECT * FROM sales FOR UPDATE"))
+        self.assertTrue(is_read_only("SELECT * FROM sales WHERE Product = 'delete'"))
+        self.assertFalse(is_cacheable("SELECT * FROM sales WHERE Date < NOW()"))
+
+    def test_referenced_tables(self):
+        """解析查詢中引用的資料表"""
+        sql = "SELECT * FROM sales s JOIN `regions` r ON s.Region = r.name"
+        self.assertEqual(referenced_tables(sql), ['sales', 'regions'])
+
+
+class TestQueryResultCache(unittest.TestCase):
+    def test_hit_and_version_invalidation(self):
+        """資料版本改變時快取應失效"""
+        cache = QueryResultCache(ttl=60)
+        cache.put('q', ('ID07383',), [{'n': 1}])
+        self.assertEqual(cache.get('q', ('ID07383',)), [{'n': 1}])
+        self.assertIs(cache.get('q', ('ID07384',)), MISS)
+        self.assertIs(cache.get('q', ('ID07383',)), MISS)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['invalidations'], 1)
+
+    def test_ttl(self):
+        """超過 TTL 的結果應失效"""
+        cache = QueryResultCache(ttl=0.01)
+        cache.put('q', 1, 'result')
+        time.sleep(0.02)
+        self.assertIs(cache.get('q', 1), MISS)
+
+    def test_lru_eviction(self):
+        """超過容量時淘汰最久未使用的項目"""
+        cache = QueryResultCache(ttl=60, max_entries=2)
+        cache.put('a', 1, 'a')
+        cache.put('b', 1, 'b')
+        cache.get('a', 1)
+        cache.put('c', 1, 'c')
+        self.assertEqual(cache.get('a', 1), 'a')
+        self.assertIs(cache.get('b', 1), MISS)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_memory_bound(self):
+        """結果總大小不可超過上限"""
+        cache = QueryResultCache(ttl=60, max_bytes=400)
+        for i in range(10):
+            cache.put(str(i), 1, 'x' * 50)
+        self.assertLessEqual(cache.stats()['bytes'], 400)
+        self.assertFalse(cache.put('big', 1, 'x' * 200))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+from decimal import Decimal
+
+from tools.sales_data import SalesLoader, generate_rows
+from tools.sql_columnar import ColumnarEngine
+from tools.sql_results import normalize_value
+from tools.sqlite_backend import SQLitePool
+
+QUERIES = [
+    "SELECT City, SUM(Total_Price) AS total FROM sales GROUP BY City ORDER BY total DESC",
+    "SELECT Region, Category, COUNT(*) AS n, SUM(Quantity) AS q FROM sales "
+    "WHERE Date BETWEEN '2023-03-01' AND '2023-06-30' GROUP BY Region, Category ORDER BY Region, Category",
+    "SELECT MONTH(Date) AS m, AVG(Quantity) AS avg_q FROM sales "
+    "WHERE YEAR(Date) = 2024 AND City IN ('東京', '大阪') GROUP BY MONTH(Date) ORDER BY m",
+    "SELECT DATE_FORMAT(Date, '%Y-%m') AS ym, SUM(Total_Price) AS total FROM sales "
+    "WHERE Product LIKE '%ン%' GROUP BY ym ORDER BY ym DESC LIMIT 5",
+    "SELECT COUNT(*) AS n, SUM(Total_Price) AS total FROM sales WHERE City = '名古屋'",
+    "SELECT Region, COUNT(Quantity) AS nq, COUNT(City) AS nc FROM sales GROUP BY Region ORDER BY Region",
+]
+
+
+def normalized(rows):
+    return [{k: normalize_value(v) for k, v in row.items()} for row in rows]
+
+
+class TestColumnarEngine(unittest.TestCase):
+    def setUp(self):
+        self.pool = SQLitePool('sqlite://')
+        SalesLoader(self.pool, batch_size=5000).insert_rows(generate_rows(20000, seed=3))
+        self.engine = ColumnarEngine(pool=self.pool)
+        # 正式環境在預熱時載入
+        with self.pool.connection() as connection:
+            self.engine.refresh(connection)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def query_db(self, connection, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+            return cursor.fetchall()
+
+    def test_matches_database(self):
+        """記憶體欄式引擎的彙總結果應與資料庫一致"""
+        with self.pool.connection() as connection:
+            for sql in QUERIES:
+                with self.subTest(sql=sql):
+                    expected = normalized(self.query_db(connection, sql))
+                    actual = normalized(self.engine.answer(connection, sql))
+                    self.assertEqual(len(actual), len(expected))
+                    for a, e in zip(actual, expected):
+                        self.assertEqual(a.keys(), e.keys())
+                        for key in a:
+                            if isinstance(e[key], float):
+                                self.assertAlmostEqual(a[key], e[key], places=3)
+                            else:
+                                self.assertEqual(a[key], e[key])
+        self.assertGreater(self.engine.memory_bytes(), 0)
+
+    def test_money_sums_are_exact(self):
+        """金額以分為單位的整數加總，結果為兩位小數的 Decimal"""
+        sql = "SELECT SUM(Total_Price) AS total FROM sales"
+        with self.pool.connection() as connection:
+            expected = self.query_db(connection, sql)[0]['total']
+            total = self.engine.answer(connection, sql)[0]['total']
+        self.assertIsInstance(total, Decimal)
+        self.assertEqual(total, Decimal(str(expected)).quantize(Decimal('0.01')))
+
+    def test_averages_match_mysql_scale(self):
+        """AVG 回傳 Decimal，整數欄位四位小數、金額欄位六位小數"""
+        sql = "SELECT AVG(Quantity) AS q, AVG(Total_Price) AS p FROM sales"
+        with self.pool.connection() as connection:
+            expected = self.query_db(connection, sql)[0]
+            row = self.engine.answer(connection, sql)[0]
+        self.assertEqual(row['q'].as_tuple().exponent, -4)
+        self.assertEqual(row['p'].as_tuple().exponent, -6)
+        self.assertAlmostEqual(float(row['q']), expected['q'], places=4)
+        self.assertAlmostEqual(float(row['p']), expected['p'], places=4)
+
+    def test_incremental_refresh_and_fallback(self):
+        """有新資料時交回資料庫並在背景以 ID 增量載入；不支援的查詢交回資料庫"""
+        sql = "SELECT COUNT(*) AS n FROM sales"
+        with self.pool.connection() as connection:
+            before = self.engine.answer(connection, sql)[0]['n']
+        # 記憶體資料庫只有一條連線，必須先歸還才能寫入
+        SalesLoader(self.pool).insert_rows(generate_rows(10, start_id=2_000_000_000))
+        with self.pool.connection() as connection:
+            self.assertIsNone(self.engine.answer(connection, sql))
+        self.engine.wait()
+        with self.pool.connection() as connection:
+            self.assertEqual(self.engine.answer(connection, sql)[0]['n'], before + 10)
+            self.assertIsNone(self.engine.answer(connection, "SELECT * FROM sales LIMIT 5"))
+            self.assertIsNone(self.engine.answer(
+                connection, "SELECT City, SUM(Quantity) AS q FROM sales WHERE City > '東京' GROUP BY City"
+            ))
+        self.assertEqual(self.engine.stats()['answered'], 2)
+        self.assertEqual(self.engine.stats()['fallbacks'], 3)
+
+    def test_first_query_does_not_load(self):
+        """尚未載入時查詢直接交給資料庫，載入在背景進行"""
+        engine = ColumnarEngine(pool=self.pool)
+        with self.pool.connection() as connection:
+            self.assertIsNone(engine.answer(connection, "SELECT COUNT(*) AS n FROM sales"))
+        engine.wait()
+        self.assertGreater(engine.stats()['rows'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+
+from tools.sql_guard import QueryGuard, QueryRejected, estimate_examined_rows
+
+
+class FakeCursor:
+    """回傳固定執行計畫的游標"""
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.executed = []
+
+    def execute(self, sql):
+        self.executed.append(sql)
+
+    def fetchall(self):
+        return self.plan
+
+
+FULL_SCAN = [{'id': 1, 'table': 'sales', 'type': 'ALL', 'rows': 2000000, 'Extra': 'Using where'}]
+CROSS_JOIN = [
+    {'id': 1, 'table': 'a', 'type': 'ALL', 'rows': 5000, 'Extra': None},
+    {'id': 1, 'table': 'b', 'type': 'ALL', 'rows': 5000, 'Extra': 'Using join buffer (hash join)'},
+]
+
+
+class TestQueryGuard(unittest.TestCase):
+    def setUp(self):
+        self.guard = QueryGuard(max_examined_rows=1000000, max_execution_ms=5000, rewrite_limit=100)
+
+    def test_rejects_writes(self):
+        """非唯讀語句應被拒絕"""
+        with self.assertRaises(QueryRejected):
+            self.guard.check_statement("UPDATE sales SET Quantity = 0")
+
+    def test_estimate(self):
+        """同一個 SELECT 中的資料表列數相乘"""
+        self.assertEqual(estimate_examined_rows(CROSS_JOIN), 25000000)
+
+    def test_rejects_expensive_join(self):
+        """估計列數過多的 JOIN 應被拒絕並提示加上連接條件"""
+        with self.assertRaises(QueryRejected) as ctx:
+            self.guard.check_plan(FakeCursor(CROSS_JOIN), "SELECT * FROM a JOIN b")
+        self.assertIn("join condition", str(ctx.exception))
+        self.assertTrue(str(ctx.exception).startswith("QUERY_REJECTED"))
+
+    def test_rewrites_simple_scan(self):
+        """單純的全表掃描改寫為加上 LIMIT"""
+        cursor = FakeCursor(FULL_SCAN)
+        sql, note = self.guard.check_plan(cursor, "SELECT * FROM sales WHERE Quantity > 1;")
+        self.assertEqual(cursor.executed, ["EXPLAIN SELECT * FROM sales WHERE Quantity > 1;"])
+        self.assertTrue(sql.endswith("LIMIT 100"))
+        self.assertIsNotNone(note)
+
+    def test_execution_time_hint(self):
+        """最外層 SELECT 加上 MAX_EXECUTION_TIME 提示"""
+        sql = "WITH t AS (SELECT 'select' AS s FROM sales) SELECT * FROM t"
+        hinted = self.guard.with_execution_limit(sql)
+        self.assertEqual(
+            hinted,
+            "WITH t AS (SELECT 'select' AS s FROM sales) SELECT /*+ MAX_EXECUTION_TIME(5000) */ * FROM t"
+        )
+
+    def test_timeout_error(self):
+        """伺服器逾時錯誤轉為可重試的訊息"""
+        error = self.guard.timeout_error(Exception(3024, "Query execution was interrupted"))
+        self.assertTrue(str(error).startswith("QUERY_TIMEOUT"))
+        self.assertIsNone(self.guard.timeout_error(Exception(1064, "syntax")))
+
+
+if __name__ == '__main__':
+    unittest.main()
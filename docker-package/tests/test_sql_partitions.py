@@ -0,0 +1,112 @@
+import datetime
+import unittest
+
+from tools.sql_partitions import PartitionManager, add_date_range, date_bounds, partition_clauses, to_days
+from tools.sqlite_backend import SQLitePool
+
+
+class PartitionCursor:
+    """回傳固定分區清單與執行計畫的游標"""
+
+    def __init__(self, partitions, plan=None):
+        self.partitions = partitions
+        self.plan = plan or []
+        self.executed = []
+        self.last = None
+
+    def execute(self, sql, params=None):
+        self.executed.append(sql)
+        self.last = sql
+
+    def fetchall(self):
+        return self.partitions if 'INFORMATION_SCHEMA' in self.last else self.plan
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+
+def monthly_partitions(first: datetime.date, months: int) -> list:
+    partitions = []
+    for clause in partition_clauses(first, months):
+        bound = datetime.date.fromisoformat(clause.split("'")[1])
+        partitions.append({'name': clause.split()[1], 'bound': str(to_days(bound)), 'row_estimate': 0})
+    return partitions + [{'name': 'p_future', 'bound': 'MAXVALUE', 'row_estimate': 0}]
+
+
+class TestDateRange(unittest.TestCase):
+    def test_function_filters_get_a_date_range(self):
+        """以函式包住 Date 的條件應補上等價的 Date 範圍"""
+        self.assertEqual(
+            add_date_range("SELECT SUM(Total_Price) FROM sales WHERE YEAR(Date) = 2023 AND MONTH(Date) = 2"),
+            "SELECT SUM(Total_Price) FROM sales WHERE Date BETWEEN '2023-02-01' AND '2023-02-28' AND "
+            "YEAR(Date) = 2023 AND MONTH(Date) = 2"
+        )
+        self.assertEqual(date_bounds("SELECT COUNT(*) FROM sales s WHERE YEAR(s.Date) = 2024 AND QUARTER(s.Date) = 2"),
+                         (datetime.date(2024, 4, 1), datetime.date(2024, 6, 30), 's'))
+        self.assertEqual(date_bounds("SELECT COUNT(*) FROM sales WHERE DATE_FORMAT(Date, '%Y-%m') = '2023-11'")[:2],
+                         (datetime.date(2023, 11, 1), datetime.date(2023, 11, 30)))
+        self.assertEqual(date_bounds("SELECT City FROM sales WHERE YEAR(Date) IN (2023, 2024)")[:2],
+                         (datetime.date(2023, 1, 1), datetime.date(2024, 12, 31)))
+
+    def test_leaves_other_queries_alone(self):
+        """已有 Date 範圍、含 OR、聯結或只有月份的查詢不改寫"""
+        for sql in [
+            "SELECT * FROM sales WHERE Date >= '2023-01-01' AND YEAR(Date) = 2023",
+            "SELECT * FROM sales WHERE YEAR(Date) = 2023 OR City = '東京'",
+            "SELECT * FROM sales JOIN regions r ON r.name = sales.Region WHERE YEAR(Date) = 2023",
+            "SELECT * FROM sales WHERE MONTH(Date) = 3",
+            "SELECT * FROM sales_daily WHERE YEAR(Date) = 2023",
+        ]:
+            with self.subTest(sql=sql):
+                self.assertEqual(add_date_range(sql), sql)
+
+
+class TestPartitionManager(unittest.TestCase):
+    def test_ensure_future_splits_p_future(self):
+        """p_future 應被拆出到今天之後 N 個月為止的月分區"""
+        cursor = PartitionCursor(monthly_partitions(datetime.date(2024, 11, 1), 2))
+        added = PartitionManager().ensure_future(FakeConnection(cursor), months_ahead=1,
+                                                 today=datetime.date(2025, 1, 15))
+        self.assertEqual(added, ['p202501', 'p202502'])
+        self.assertIn("REORGANIZE PARTITION p_future INTO (PARTITION p202501", cursor.executed[-1])
+        self.assertTrue(cursor.executed[-1].endswith("PARTITION p_future VALUES LESS THAN MAXVALUE)"))
+
+    def test_pruning_note(self):
+        """有日期條件卻讀取所有分區時提示代理改用 Date 範圍"""
+        partitions = monthly_partitions(datetime.date(2023, 1, 1), 3)
+        names = ','.join(p['name'] for p in partitions)
+        manager = PartitionManager()
+        cursor = PartitionCursor(partitions)
+        plan = [{'id': 1, 'table': 'sales', 'partitions': names, 'type': 'ALL', 'rows': 10}]
+        self.assertIn("all 4 monthly partitions",
+                      manager.pruning_note(cursor, "SELECT * FROM sales WHERE YEAR(Date) = 2023", plan))
+        pruned = [{'id': 1, 'table': 'sales', 'partitions': 'p202302', 'type': 'ALL', 'rows': 10}]
+        self.assertIsNone(manager.pruning_note(cursor, "SELECT * FROM sales WHERE Date = '2023-02-01'", pruned))
+        self.assertIsNone(manager.pruning_note(cursor, "SELECT * FROM sales WHERE City = '東京'", plan))
+
+    def test_sqlite_indexes_the_partition_column(self):
+        """內嵌 SQLite 以 Date 索引取代分區"""
+        pool = SQLitePool('sqlite://')
+        try:
+            with pool.connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'sales'")
+                    indexes = [row['name'] for row in cursor.fetchall()]
+        finally:
+            pool.close()
+        self.assertIn('idx_sales_date', indexes)
+
+
+if __name__ == '__main__':
+    unittest.main()
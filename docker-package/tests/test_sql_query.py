@@ -0,0 +1,173 @@
+import json
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+
+from tools.db import PoolTimeout, get_pool
+from tools.sql_cache import QueryResultCache
+from tools.sql_query import SQLQueryTool
+from tools.sql_guard import QUERY_TIMEOUT_ERROR
+from tools.sql_schema import DescribeTableTool, SchemaIntrospector
+from tools.sqlite_backend import SQLitePool
+
+SQLITE_URL = 'sqlite://'
+
+
+def make_tool(**kwargs) -> SQLQueryTool:
+    kwargs.setdefault('workload_log', None)
+    kwargs.setdefault('result_cache', QueryResultCache(ttl=60))
+    return SQLQueryTool(**kwargs)
+
+
+class TestSQLiteBackend(unittest.TestCase):
+    def setUp(self):
+        # 只在這個測試期間指向內嵌資料庫，不影響其他測試
+        patcher = mock.patch.dict(os.environ, {'CLEARDB_DATABASE_URL': SQLITE_URL})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def count_sales(self) -> int:
+        with get_pool(SQLITE_URL).connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) AS n FROM sales")
+                return cursor.fetchone()['n']
+
+    def test_aggregate_matches_seed_data(self):
+        """內嵌 SQLite 後端應載入 init.sql 並執行代理常用的 MySQL 函式"""
+        tool = make_tool(result_format='repr')
+        with get_pool(SQLITE_URL).connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) AS n, SUM(Quantity) AS q FROM sales")
+                expected = cursor.fetchone()
+        self.assertGreater(expected['n'], 0)
+
+        rows = tool._run("SELECT YEAR(Date) AS y, COUNT(*) AS n, SUM(Quantity) AS q "
+                         "FROM sales GROUP BY YEAR(Date) ORDER BY y")
+        self.assertIsInstance(rows, list)
+        self.assertEqual(sum(row['n'] for row in rows), expected['n'])
+        self.assertEqual(sum(row['q'] for row in rows), expected['q'])
+
+    def test_cache_hit_on_repeat(self):
+        """重複查詢應命中結果快取"""
+        tool = make_tool()
+        query = "SELECT Region, SUM(Total_Price) AS total FROM sales GROUP BY Region"
+        first = tool._run(query)
+        second = tool._run(query)
+        self.assertEqual(first, second)
+        self.assertEqual(tool.result_cache.hits, 1)
+        self.assertIn('columns', json.loads(first))
+
+    def test_rejects_writes(self):
+        """寫入語句在送到資料庫前就被拒絕"""
+        tool = make_tool()
+        before = self.count_sales()
+        result = tool._run("DELETE FROM sales")
+        self.assertTrue(result.startswith("QUERY_REJECTED: Only a single read-only statement"), result)
+        self.assertEqual(self.count_sales(), before)
+
+    def test_describe_table(self):
+        """describe_table 在 SQLite 上改用 PRAGMA table_info"""
+        make_tool()
+        tool = DescribeTableTool()
+        text = tool._run('sales')
+        self.assertIn('Table sales:', text)
+        self.assertIn('PRIMARY KEY', text)
+        self.assertIn('Region', text)
+        self.assertIn('sales', tool._run(''))
+
+
+class TestConnectionPool(unittest.TestCase):
+    def test_acquire_times_out_when_exhausted(self):
+        """連線全部借出時等待有上限，逾時丟出 PoolTimeout，歸還後可再借出"""
+        pool = SQLitePool('sqlite://')
+        self.addCleanup(pool.close)
+        connection = pool.acquire()
+        started = time.perf_counter()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(timeout=0.05)
+        self.assertLess(time.perf_counter() - started, 2)
+        pool.release(connection)
+        pool.release(pool.acquire(timeout=0.05))
+
+
+class ProbeCursor:
+    """Cursor that returns one text and one date column and records every statement."""
+
+    def __init__(self, statements, timeout_on=None):
+        self.statements = statements
+        self.timeout_on = timeout_on
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, args=None):
+        self.statements.append(sql)
+        if self.timeout_on and self.timeout_on in sql:
+            raise Exception(QUERY_TIMEOUT_ERROR, "Query execution was interrupted")
+        if 'INFORMATION_SCHEMA' in sql:
+            self.rows = [{'name': 'City', 'type': 'varchar(50)', 'data_type': 'varchar', 'key': '',
+                          'nullable': 'YES'},
+                         {'name': 'Date', 'type': 'date', 'data_type': 'date', 'key': 'PRI', 'nullable': 'NO'}]
+        elif 'DISTINCT' in sql:
+            self.rows = [{'v': '東京'}, {'v': '大阪'}]
+        else:
+            self.rows = [{'lo': '2023-01-01', 'hi': '2024-12-31'}]
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0]
+
+
+class ProbeConnection:
+    def __init__(self, timeout_on=None):
+        self.statements = []
+        self.timeout_on = timeout_on
+
+    def cursor(self, *args):
+        return ProbeCursor(self.statements, self.timeout_on)
+
+
+class TestSchemaIntrospector(unittest.TestCase):
+    def test_probes_have_time_limit(self):
+        """MySQL 上取相異值與日期範圍的查詢帶有執行時間上限，逾時的欄位略過"""
+        connection = ProbeConnection()
+        description = SchemaIntrospector(max_execution_ms=500).describe(connection, 'sales')
+        probes = [sql for sql in connection.statements if 'INFORMATION_SCHEMA' not in sql]
+        self.assertEqual(len(probes), 2)
+        self.assertTrue(all(sql.startswith("SELECT /*+ MAX_EXECUTION_TIME(500) */") for sql in probes))
+        self.assertEqual(description['columns'][0]['values'], ['大阪', '東京'])
+
+        description = SchemaIntrospector().describe(ProbeConnection(timeout_on='DISTINCT'), 'sales')
+        self.assertNotIn('values', description['columns'][0])
+        self.assertEqual(description['columns'][1]['range'], ('2023-01-01', '2024-12-31'))
+
+    def test_single_flight(self):
+        """同時查詢同一個資料表時只建立一次描述"""
+        introspector = SchemaIntrospector()
+        calls, results = [], []
+
+        def build():
+            calls.append(1)
+            time.sleep(0.05)
+            return {'table': 'sales'}
+
+        threads = [threading.Thread(target=lambda: results.append(introspector._cached('sales', build)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'table': 'sales'}] * 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import datetime
+import json
+import unittest
+from decimal import Decimal
+
+from tools.sql_results import EncodingStats, encode_result, summarize_rows
+
+
+def make_rows(n):
+    return ({'ID': f'ID{i:05d}', 'Quantity': i, 'Total_Price': Decimal('1.50')}
+            for i in range(n))
+
+
+class TestSummarizeRows(unittest.TestCase):
+    def test_small_result_unchanged(self):
+        """未超過上限時回傳原本的列清單"""
+        rows = summarize_rows(make_rows(3), max_rows=5)
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['ID'], 'ID00000')
+
+    def test_truncated_result(self):
+        """超過上限時只保留前幾列，並回報總列數與欄位統計"""
+        result = summarize_rows(make_rows(1000), max_rows=10)
+        self.assertTrue(result['truncated'])
+        self.assertEqual(len(result['rows']), 10)
+        self.assertEqual(result['total_rows'], 1000)
+        stats = result['column_stats']
+        self.assertEqual(stats['Quantity']['sum'], sum(range(1000)))
+        self.assertEqual(stats['Quantity']['max'], 999)
+        self.assertEqual(stats['Total_Price']['distinct'], 1)
+        self.assertEqual(stats['ID']['distinct'], '>50')
+
+
+class TestEncodeResult(unittest.TestCase):
+    rows = [
+        {'Date': datetime.date(2023, 1, 1), 'City': '東京', 'Total_Price': Decimal('8052.00')},
+        {'Date': datetime.date(2023, 1, 4), 'City': '京都', 'Total_Price': Decimal('41847.50')},
+    ]
+
+    def test_json(self):
+        """欄名只出現一次，數字與日期正規化"""
+        payload = json.loads(encode_result(self.rows, 'json'))
+        self.assertEqual(payload['columns'], ['Date', 'City', 'Total_Price'])
+        self.assertEqual(payload['rows'][0], ['2023-01-01', '東京', 8052])
+        self.assertEqual(payload['rows'][1][2], 41847.5)
+
+    def test_csv(self):
+        """CSV 格式為標頭加上每列一行"""
+        text = encode_result(self.rows, 'csv')
+        self.assertEqual(text.splitlines()[0], 'Date,City,Total_Price')
+        self.assertEqual(text.splitlines()[1], '2023-01-01,東京,8052')
+
+    def test_truncated_keeps_summary(self):
+        """截斷的結果保留總列數"""
+        result = summarize_rows(iter(self.rows * 10), max_rows=2)
+        payload = json.loads(encode_result(result, 'json'))
+        self.assertEqual(payload['total_rows'], 20)
+        self.assertEqual(len(payload['rows']), 2)
+
+    def test_size_reduction(self):
+        """編碼後的大小應小於原始 repr"""
+        stats = EncodingStats(sample_rate=1.0)
+        rows = self.rows * 20
+        stats.record(rows, encode_result(rows, 'json'))
+        self.assertGreater(stats.stats()['saved_tokens'], 0)
+        self.assertLess(stats.encoded_chars, stats.raw_chars / 2)
+
+    def test_sampling_can_be_disabled(self):
+        """取樣比例為 0 時只計數，不計算 token"""
+        stats = EncodingStats(sample_rate=0)
+        self.assertIsNone(stats.record(self.rows, encode_result(self.rows, 'json')))
+        self.assertEqual((stats.stats()['results'], stats.stats()['sampled']), (1, 0))
+        self.assertEqual(stats.raw_tokens, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+
+from tools.sql_aggregate import parse_aggregate
+from tools.sql_rollup import RollupManager
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, args=None):
+        self.connection.executed.append(sql)
+
+    def fetchone(self):
+        return self.connection.state
+
+
+class FakeConnection:
+    """Answers the freshness probe with a fixed sales MAX(ID) and rollup watermark."""
+
+    def __init__(self, max_id, last_id):
+        self.state = {'max_id': max_id, 'last_id': last_id}
+        self.executed = []
+
+    def cursor(self, *args):
+        return FakeCursor(self)
+
+
+class TestParseAggregate(unittest.TestCase):
+    def test_supported_query(self):
+        """解析常見的彙總查詢"""
+        query = parse_aggregate(
+            "SELECT City, SUM(Quantity) AS qty FROM sales "
+            "WHERE Region = '関東' AND Date BETWEEN '2023-01-01' AND '2023-01-31' "
+            "GROUP BY City ORDER BY qty DESC LIMIT 3"
+        )
+        self.assertEqual([i.label for i in query.items], ['City', 'qty'])
+        self.assertEqual(query.conditions[0].values, ['関東'])
+        self.assertTrue(query.order_by[0].descending)
+        self.assertEqual(query.limit, 3)
+
+    def test_unsupported_queries(self):
+        """不在支援範圍內的查詢回傳 None"""
+        for sql in ("SELECT * FROM sales",
+                    "SELECT City, MAX(Total_Price) FROM sales GROUP BY City",
+                    "SELECT City, SUM(Total_Price) FROM sales WHERE Quantity > 3 GROUP BY City",
+                    "SELECT City, SUM(Total_Price) FROM sales WHERE City = '東京' OR City = '大阪' GROUP BY City",
+                    "SELECT City, Region, SUM(Total_Price) FROM sales GROUP BY City"):
+            self.assertIsNone(parse_aggregate(sql), sql)
+
+
+class TestRollupRewrite(unittest.TestCase):
+    def setUp(self):
+        self.manager = RollupManager()
+
+    def test_monthly_rollup(self):
+        """只用到月份以上粒度時改寫到月彙總表"""
+        sql = self.manager.rewrite(
+            "SELECT DATE_FORMAT(Date, '%Y-%m') AS month, SUM(Total_Price) AS total "
+            "FROM sales WHERE City = '大阪' GROUP BY month ORDER BY month"
+        )
+        self.assertEqual(
+            sql,
+            "SELECT DATE_FORMAT(Month, '%Y-%m') AS `month`, SUM(Total_Price_Sum) AS `total` "
+            "FROM sales_monthly WHERE City = '大阪' GROUP BY DATE_FORMAT(Month, '%Y-%m') ORDER BY `month`"
+        )
+
+    def test_daily_rollup(self):
+        """日期範圍條件改寫到日彙總表"""
+        sql = self.manager.rewrite(
+            "SELECT Region, COUNT(*), SUM(Quantity) FROM sales "
+            "WHERE Date >= '2023-02-01' GROUP BY Region"
+        )
+        self.assertEqual(
+            sql,
+            "SELECT Region AS `Region`, COALESCE(SUM(Row_Count), 0) AS `COUNT(*)`, "
+            "SUM(Quantity_Sum) AS `SUM(Quantity)` "
+            "FROM sales_daily WHERE Date >= '2023-02-01' GROUP BY Region"
+        )
+
+    def test_average_not_rewritten(self):
+        """AVG 不計入 NULL，總列數無法當分母，一律查原表"""
+        self.assertIsNone(self.manager.rewrite("SELECT Region, AVG(Quantity) FROM sales GROUP BY Region"))
+        self.assertIsNone(self.manager.rewrite(
+            "SELECT Region, SUM(Quantity) FROM sales GROUP BY Region ORDER BY AVG(Total_Price) DESC"))
+
+    def test_no_rewrite(self):
+        """無法改寫的查詢保持原樣"""
+        self.assertIsNone(self.manager.rewrite("SELECT * FROM sales WHERE City = '東京'"))
+
+    def test_count_of_nullable_column(self):
+        """COUNT(可為 NULL 的欄位) 不改寫成列數；COUNT(*) 與不可為 NULL 的欄位才改寫"""
+        self.assertIsNone(self.manager.rewrite("SELECT City, COUNT(Quantity) FROM sales GROUP BY City"))
+        self.assertIsNone(self.manager.rewrite(
+            "SELECT City, SUM(Quantity) FROM sales GROUP BY City ORDER BY COUNT(Product) DESC"))
+        self.assertIn("COALESCE(SUM(Row_Count), 0)",
+                      self.manager.rewrite("SELECT City, COUNT(ID) FROM sales GROUP BY City"))
+
+
+class TestRollupRouting(unittest.TestCase):
+    SQL = "SELECT Region, SUM(Total_Price) FROM sales GROUP BY Region"
+
+    def test_routes_only_when_fresh(self):
+        """彙總表已涵蓋所有資料時才改寫，查詢中不刷新彙總表"""
+        manager = RollupManager()
+        stale = FakeConnection(max_id='ID00000200', last_id='ID00000100')
+        self.assertEqual(manager.route(stale, self.SQL), self.SQL)
+        self.assertFalse(any('INSERT' in sql for sql in stale.executed))
+        fresh = FakeConnection(max_id='ID00000200', last_id='ID00000200')
+        self.assertIn("FROM sales_monthly", manager.route(fresh, self.SQL))
+        self.assertEqual((manager.stale, manager.routed), (1, 1))
+        self.assertEqual(manager.route(FakeConnection(max_id='ID00000200', last_id=None), self.SQL), self.SQL)
+
+
+if __name__ == '__main__':
+    unittest.main()
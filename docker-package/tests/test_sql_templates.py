@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from tools.sql_templates import SQLTemplateStore, generalize
+
+DOMAINS = {'City': ['東京', '大阪', '京都'], 'Category': ['野菜', '果物']}
+
+
+def make_store(path=None) -> SQLTemplateStore:
+    return SQLTemplateStore(path=path, domains=lambda: DOMAINS)
+
+
+class TestGeneralize(unittest.TestCase):
+    def test_values_months_and_numbers_become_slots(self):
+        """問題與 SQL 共同出現的維度值、月份與數字應成為槽位"""
+        template = generalize(
+            "Total sales in 大阪 in March?",
+            "SELECT SUM(Total_Price) FROM sales WHERE City = '大阪' AND MONTH(Date) = 3",
+            DOMAINS
+        )
+        self.assertEqual([s.kind for s in template.slots], ['value', 'month'])
+        self.assertEqual(template.sql,
+                         "SELECT SUM(Total_Price) FROM sales WHERE City = {s0} AND MONTH(Date) = {s1}")
+
+    def test_rejects_writes_and_ambiguous_numbers(self):
+        """寫入語句與同一數字對應多個槽位時不學習"""
+        self.assertIsNone(generalize("delete 大阪", "DELETE FROM sales WHERE City = '大阪'", DOMAINS))
+        self.assertIsNone(generalize("top 3 cities in march",
+                                     "SELECT City FROM sales WHERE MONTH(Date) = 3 LIMIT 3", DOMAINS))
+
+    def test_rejects_literals_not_in_question(self):
+        """沿用前幾輪條件的查詢與沒有槽位的問題不學習"""
+        self.assertIsNone(generalize("what about march",
+                                     "SELECT SUM(Total_Price) FROM sales WHERE City = '東京' "
+                                     "AND MONTH(Date) = 3", DOMAINS))
+        self.assertIsNone(generalize("same for 京都",
+                                     "SELECT SUM(Total_Price) FROM sales WHERE City = '京都' "
+                                     "AND YEAR(Date) = 2023", DOMAINS))
+        self.assertIsNone(generalize("yes", "SELECT City, SUM(Total_Price) FROM sales GROUP BY City",
+                                     DOMAINS))
+        template = generalize("top cities for 果物",
+                              "SELECT City FROM sales WHERE Category = '果物' LIMIT 5", DOMAINS)
+        self.assertEqual(template.sql, "SELECT City FROM sales WHERE Category = {s0} LIMIT 5")
+
+
+class TestSQLTemplateStore(unittest.TestCase):
+    def test_match_renders_new_values(self):
+        """相同句型、不同參數的問題應直接產生 SQL"""
+        store = make_store()
+        store.learn("2023年3月の東京の野菜の売上は？",
+                    "SELECT SUM(Total_Price) FROM sales WHERE City='東京' AND Category='野菜' "
+                    "AND YEAR(Date)=2023 AND MONTH(Date)=3")
+        match = store.match("2024年5月の京都の果物の売上は")
+        self.assertEqual(match.sql,
+                         "SELECT SUM(Total_Price) FROM sales WHERE City='京都' AND Category='果物' "
+                         "AND YEAR(Date)=2024 AND MONTH(Date)=5")
+        self.assertIsNone(store.match("2024年5月の名古屋の果物の売上は"))
+        self.assertIsNone(store.match("2024年5月の京都の果物の売上は前年比でどう？"))
+        self.assertEqual(store.stats()['hits'], 1)
+
+    def test_learn_from_steps_and_persistence(self):
+        """只從單次成功的 SQL 呼叫學習，並能從檔案重新載入；失敗的樣板會被移除"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'templates.json')
+            store = make_store(path)
+            action = SimpleNamespace(tool='execute_sql_query',
+                                     tool_input={'query': "SELECT COUNT(*) FROM sales WHERE City = '東京'"})
+            self.assertIsNone(store.learn_from_steps("東京の件数", [(action, "Error executing query: x")]))
+            self.assertIsNone(store.learn_from_steps("東京の件数", [(action, '[]'), (action, '[]')]))
+            self.assertIsNone(store.learn_from_steps("東京の件数", [(action, '{"rows":[[5]]}')],
+                                                     chat_history=["前の質問"]))
+            self.assertIsNotNone(store.learn_from_steps("東京の件数", [(action, '{"rows":[[5]]}')]))
+
+            reloaded = make_store(path)
+            match = reloaded.match("大阪の件数")
+            self.assertEqual(match.sql, "SELECT COUNT(*) FROM sales WHERE City = '大阪'")
+            reloaded.forget(match.template)
+            self.assertEqual(len(make_store(path)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import asyncio
+import types
+import unittest
+from unittest import mock
+
+from core import streaming
+from core.streaming import TRANSLATION_COMPLETE, ChainlitStreamHandler
+from tools.default_tool import DefaultTool
+
+
+class FakeMessage:
+    sent = []
+
+    def __init__(self, content=""):
+        self.content = content
+        self.tokens = []
+        self.removed = False
+
+    async def stream_token(self, token):
+        self.tokens.append(token)
+        self.content += token
+
+    async def send(self):
+        FakeMessage.sent.append(self)
+
+    async def remove(self):
+        self.removed = True
+
+
+class FakeStep:
+    created = []
+
+    def __init__(self, name, type):
+        FakeStep.created.append(self)
+        self.name = name
+        self.input = self.output = None
+        self.is_error = False
+        self.updated = False
+
+    async def send(self):
+        pass
+
+    async def update(self):
+        self.updated = True
+
+
+class EchoTool(DefaultTool):
+    name: str = "echo"
+    description: str = "Returns its input."
+
+    def _run(self, text: str = ""):
+        return text
+
+
+class TestChainlitStreamHandler(unittest.TestCase):
+    def setUp(self):
+        FakeMessage.sent = []
+        FakeStep.created = []
+        fake_cl = types.SimpleNamespace(Message=FakeMessage, Step=FakeStep)
+        patcher = mock.patch.object(streaming, 'cl', fake_cl)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_tokens_stream_into_one_message(self):
+        """token 依序串流到同一則訊息，工具呼叫的空 token 不建立訊息"""
+        async def turn():
+            handler = ChainlitStreamHandler()
+            await handler.on_llm_new_token("")
+            self.assertIsNone(handler.message)
+            for token in ["東京", "の売上", "は 42"]:
+                await handler.on_llm_new_token(token)
+            message = handler.message
+            await handler.finish("東京の売上は 42")
+            return message
+
+        message = asyncio.run(turn())
+        self.assertEqual(message.tokens, ["東京", "の売上", "は 42"])
+        self.assertEqual(FakeMessage.sent, [message])
+
+    def test_tool_steps_and_translation(self):
+        """工具呼叫顯示為步驟；翻譯完成時移除串流中的狀態字串"""
+        async def turn():
+            handler = ChainlitStreamHandler()
+            await handler.on_llm_new_token("Let me check.")
+            before_tool = handler.message
+            await EchoTool().ainvoke({"text": "hello"}, config={"callbacks": [handler]})
+            await handler.on_llm_new_token(TRANSLATION_COMPLETE)
+            streamed = handler.message
+            await handler.finish(TRANSLATION_COMPLETE)
+            return before_tool, streamed
+
+        before_tool, streamed = asyncio.run(turn())
+        self.assertEqual(FakeMessage.sent, [before_tool])
+        self.assertTrue(streamed.removed)
+        [step] = FakeStep.created
+        self.assertEqual((step.name, step.output), ("echo", "hello"))
+        self.assertTrue(step.updated)
+
+    def test_nothing_streamed_sends_output(self):
+        """沒有串流任何 token 時直接送出最後的回答"""
+        asyncio.run(ChainlitStreamHandler().finish("done"))
+        self.assertEqual([m.content for m in FakeMessage.sent], ["done"])
+
+
+if __name__ == '__main__':
+    unittest.main()
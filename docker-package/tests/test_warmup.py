@@ -0,0 +1,53 @@
+import asyncio
+import os
+import subprocess
+import sys
+import unittest
+from unittest import mock
+
+from core import warmup
+from core.warmup import warm_db_connections, warm_llm_connection
+from tools.sqlite_backend import SQLitePool
+
+
+class TestLazyImports(unittest.TestCase):
+    def test_agent_module_does_not_load_tools(self):
+        """匯入 core.agent 時不載入 OpenAI 用戶端、代理框架與 python-pptx"""
+        code = ("import sys, core.agent; "
+                "print([m for m in ('langchain_openai', 'langchain.agents', 'pptx', 'tools.translator') "
+                "if m in sys.modules])")
+        env = dict(os.environ, OPENAI_API_KEY='sk-test')
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), check=True)
+        self.assertEqual(output.stdout.strip(), '[]')
+
+
+class TestWarmup(unittest.TestCase):
+    def test_warm_db_connections(self):
+        """預熱時開啟的連線歸還連線池，之後的查詢直接重用"""
+        pool = SQLitePool('sqlite://')
+        self.addCleanup(pool.close)
+        with mock.patch('tools.db.get_pool', return_value=pool):
+            self.assertEqual(warm_db_connections(3), 1)
+        with pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) AS n FROM sales")
+                self.assertGreater(cursor.fetchone()['n'], 0)
+
+    def test_llm_warmup_retries_after_failure(self):
+        """預熱失敗時不標記為完成，下一次再試；成功後不再重複"""
+        models = mock.Mock()
+        models.list = mock.AsyncMock(side_effect=[OSError("connect failed"), [], []])
+        components = mock.Mock()
+        components.llm.root_async_client.models = models
+        self.addCleanup(setattr, warmup, '_llm_warmed', warmup._llm_warmed)
+        warmup._llm_warmed = False
+        with mock.patch('core.agent.get_agent_components', return_value=components):
+            self.assertIsNone(asyncio.run(warm_llm_connection()))
+            self.assertIsNotNone(asyncio.run(warm_llm_connection()))
+            self.assertIsNone(asyncio.run(warm_llm_connection()))
+        self.assertEqual(models.list.await_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,36 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from typing import Any, Coroutine
 from langchain_core.tools import BaseTool
 
+# 所有同步工具共用一個有上限的執行緒池，避免阻塞 event loop
+TOOL_EXECUTOR_WORKERS = int(os.getenv('TOOL_EXECUTOR_WORKERS', '8'))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_tool_executor() -> ThreadPoolExecutor:
+    """Return the process-wide executor used for blocking tool calls."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=TOOL_EXECUTOR_WORKERS,
+                    thread_name_prefix="tool"
+                )
+    return _executor
+
+
 class DefaultTool(BaseTool):
     async def _arun(self, *args: Any, **kwargs: Any) -> Coroutine[Any, Any, Any]:
-        result = self._run(*args, **kwargs)
-        return result
\ No newline at end of file
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            get_tool_executor(),
+            partial(self._run, *args, **kwargs)
+        )
+        return result
@@ -0,0 +1,207 @@
+"""Offline index advisor driven by the SQL workload log.
+
+Usage:
+    python -m tools.index_advisor [--log /var/log/chatbot/sql_workload.jsonl] [--top 5] [--explain]
+
+Reads the query shapes recorded by SQLQueryTool (enable the log with
+SQL_WORKLOAD_LOG; rotated copies are read too), derives a composite index
+for each shape (equality columns first, then one range column, otherwise
+the GROUP BY columns), merges candidates that are prefixes of one another, and
+ranks them by the total latency of the queries they serve. With --explain,
+every candidate is created as an INVISIBLE index and the logged example
+queries are explained with and without it, so the benefit is measured by
+the optimizer instead of guessed. Run --explain against a staging copy:
+building an index on a large table is expensive.
+"""
+import argparse
+import re
+from typing import Dict, List, Optional
+
+from tools.sql_aggregate import SALES_COLUMNS
+from tools.sql_guard import estimate_examined_rows
+from tools.sql_utils import code_only, referenced_tables
+from tools.sql_workload import SQL_WORKLOAD_LOG, read_workload
+
+MAX_INDEX_COLUMNS = 4
+
+_CLAUSE_END = r"(?=\bgroup\s+by\b|\border\s+by\b|\bhaving\b|\blimit\b|$)"
+_COLUMN = r"(?<![\w(.])(?:[a-z_]\w*\.)?([a-z_]\w*)"
+_EQUALITY = re.compile(_COLUMN + r"\s*(?:=|<=>|\bin\s*\()")
+_RANGE = re.compile(_COLUMN + r"\s*(?:<=|>=|<|>|\bbetween\b|\blike\b)")
+_KEYWORDS = {'and', 'or', 'not', 'where', 'on', 'is', 'null', 'select', 'from'}
+
+
+def _clause(code: str, start: str) -> str:
+    match = re.search(r"\b" + start + r"\b(.*?)" + _CLAUSE_END, code)
+    return match.group(1) if match else ''
+
+
+def _column_list(text: str) -> List[str]:
+    columns = []
+    for item in text.split(','):
+        item = item.strip().split(' ')[0].split('.')[-1].strip('`')
+        if re.fullmatch(r"[a-z_]\w*", item):
+            columns.append(item)
+    return columns
+
+
+def candidate_columns(sql: str) -> List[str]:
+    """Index columns (lower-case) that would serve ``sql``, in index order."""
+    code = code_only(sql)
+    where = _clause(code, 'where')
+    equality = [c for c in _EQUALITY.findall(where) if c not in _KEYWORDS]
+    ranges = [c for c in _RANGE.findall(where) if c not in _KEYWORDS and c not in equality]
+    group_by = _column_list(_clause(code, r"group\s+by"))
+
+    columns = []
+    for column in equality:
+        if column not in columns:
+            columns.append(column)
+    if ranges:
+        columns.append(ranges[0])
+    else:
+        columns += [c for c in group_by if c not in columns]
+    return columns[:MAX_INDEX_COLUMNS]
+
+
+class Candidate:
+    def __init__(self, table: str, columns: List[str]):
+        self.table = table
+        self.columns = columns
+        self.queries = 0
+        self.total_ms = 0.0
+        self.samples: Dict[str, dict] = {}
+        self.rows_before = None
+        self.rows_after = None
+
+    @property
+    def name(self) -> str:
+        return f"idx_{self.table}_" + "_".join(c.lower() for c in self.columns)
+
+    def ddl(self, visibility: str = '') -> str:
+        columns = ", ".join(self.columns)
+        return f"CREATE INDEX {self.name} ON {self.table} ({columns}){visibility};"
+
+    def covers(self, other: 'Candidate') -> bool:
+        return self.table == other.table and self.columns[:len(other.columns)] == other.columns
+
+
+def build_candidates(entries) -> List[Candidate]:
+    """Group workload entries into index candidates ranked by total latency."""
+    candidates: Dict[tuple, Candidate] = {}
+    for entry in entries:
+        sql = entry.get('sql', '')
+        tables = referenced_tables(sql)
+        if not tables:
+            continue
+        columns = candidate_columns(sql)
+        if not columns or columns == ['id']:
+            continue
+        table = tables[0]
+        columns = [SALES_COLUMNS.get(c, c) if table == 'sales' else c for c in columns]
+        candidate = candidates.setdefault((table, tuple(columns)), Candidate(table, columns))
+        candidate.queries += 1
+        candidate.total_ms += entry.get('latency_ms', 0.0)
+        candidate.samples.setdefault(entry.get('shape', sql), entry)
+
+    # 若一個候選索引是另一個的前綴，較長的索引也能服務它的查詢
+    merged = sorted(candidates.values(), key=lambda c: len(c.columns), reverse=True)
+    kept: List[Candidate] = []
+    for candidate in merged:
+        wider = next((k for k in kept if k.covers(candidate)), None)
+        if wider:
+            wider.queries += candidate.queries
+            wider.total_ms += candidate.total_ms
+            for shape, entry in candidate.samples.items():
+                wider.samples.setdefault(shape, entry)
+        else:
+            kept.append(candidate)
+    return sorted(kept, key=lambda c: c.total_ms, reverse=True)
+
+
+def _existing_indexes(cursor, table: str) -> List[List[str]]:
+    cursor.execute(f"SHOW INDEX FROM {table}")
+    indexes: Dict[str, List[str]] = {}
+    for row in cursor.fetchall():
+        indexes.setdefault(row['Key_name'], []).append(row['Column_name'].lower())
+    return list(indexes.values())
+
+
+def _explain_rows(cursor, sql: str) -> int:
+    cursor.execute("EXPLAIN " + sql)
+    return estimate_examined_rows(cursor.fetchall())
+
+
+def measure(connection, candidate: Candidate) -> Optional[bool]:
+    """Fill rows_before/rows_after using an invisible index.
+
+    Returns False when an existing index already starts with the candidate's
+    columns, None when the table cannot be inspected."""
+    samples = [entry['sql'] for entry in candidate.samples.values()]
+    with connection.cursor() as cursor:
+        try:
+            existing = _existing_indexes(cursor, candidate.table)
+        except Exception:
+            return None
+        wanted = [c.lower() for c in candidate.columns]
+        if any(index[:len(wanted)] == wanted for index in existing):
+            return False
+
+        candidate.rows_before = sum(_explain_rows(cursor, sql) for sql in samples)
+        cursor.execute(candidate.ddl(' INVISIBLE').rstrip(';'))
+        try:
+            cursor.execute("SET SESSION optimizer_switch = 'use_invisible_indexes=on'")
+            candidate.rows_after = sum(_explain_rows(cursor, sql) for sql in samples)
+        finally:
+            cursor.execute("SET SESSION optimizer_switch = 'use_invisible_indexes=off'")
+            cursor.execute(f"DROP INDEX {candidate.name} ON {candidate.table}")
+    return True
+
+
+def report(candidates: List[Candidate]) -> str:
+    lines = []
+    for rank, candidate in enumerate(candidates, 1):
+        summary = (f"-- {rank}. {candidate.table} ({', '.join(candidate.columns)}): "
+                   f"{candidate.queries} queries, {candidate.total_ms:.1f} ms total")
+        if candidate.rows_before is not None:
+            summary += f"; EXPLAIN rows {candidate.rows_before} -> {candidate.rows_after}"
+        lines.append(summary)
+        lines.append(candidate.ddl())
+    return "\n".join(lines) if lines else "-- No index candidates found in the workload log."
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Propose indexes from the SQL workload log.")
+    parser.add_argument('--log', default=SQL_WORKLOAD_LOG, help="Workload log to read.")
+    parser.add_argument('--top', type=int, default=5, help="Number of indexes to propose.")
+    parser.add_argument('--explain', action='store_true',
+                        help="Measure each candidate with EXPLAIN before and after an invisible index.")
+    args = parser.parse_args(argv)
+    if not args.log:
+        parser.error("--log is required when SQL_WORKLOAD_LOG is not set")
+
+    candidates = build_candidates(read_workload(args.log))
+    if args.explain:
+        from tools.db import get_pool
+
+        pool = get_pool()
+        if not pool:
+            raise SystemExit("CLEARDB_DATABASE_URL is not set")
+        measured = []
+        with pool.connection() as connection:
+            for candidate in candidates:
+                if len(measured) >= args.top:
+                    break
+                if measure(connection, candidate) is not False:
+                    measured.append(candidate)
+        # 以最佳化器估計減少的列數乘上查詢次數重新排序
+        candidates = sorted(
+            measured,
+            key=lambda c: ((c.rows_before or 0) - (c.rows_after or 0)) * c.queries,
+            reverse=True
+        )
+    print(report(candidates[:args.top]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,329 @@
+"""Process-wide admission control and fair scheduling of LLM calls.
+
+Chat turns, PowerPoint translation and memory summaries used to open as
+many OpenAI requests as they liked, so one large deck could fill the
+connection pool and every chat turn queued behind it. Every chat-completions
+request now passes through ``LLMScheduler``:
+
+- at most ``LLM_MAX_CONCURRENCY`` requests run at once;
+- waiting requests are admitted by priority class: ``interactive`` (chat
+  turns) before ``bulk`` (translation segments, summaries);
+- ``bulk`` never holds more than ``LLM_BULK_MAX_CONCURRENCY`` slots, so a
+  chat turn finds a free slot without waiting for bulk calls to finish;
+- within a class, the user with the fewest calls in flight goes first,
+  then the one served longest ago, so one user's job cannot crowd out
+  others.
+
+The scheduler sits in the HTTP transport of the OpenAI clients
+(``http_clients``), so it covers LangChain's agent loop, streaming and
+retries without changes to the callers. The priority and user come from
+context variables set with ``set_llm_context``/``llm_context``. A slot is
+held until the response body, including a stream, has been read.
+
+Queue depth, slots in use and queue wait are exported as metrics. Set
+``LLM_MAX_CONCURRENCY=0`` to turn the scheduler off.
+"""
+import asyncio
+import itertools
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from tools.metrics import LLM_IN_FLIGHT, LLM_QUEUE_DEPTH, LLM_QUEUE_WAIT_SECONDS
+
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '16'))
+# 預設保留四分之一的名額給對話
+LLM_BULK_MAX_CONCURRENCY = int(os.getenv('LLM_BULK_MAX_CONCURRENCY',
+                                         str(max(1, LLM_MAX_CONCURRENCY * 3 // 4))))
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+PRIORITIES = (INTERACTIVE, BULK)
+
+_MAX_TRACKED_USERS = 4096
+
+_priority: ContextVar[str] = ContextVar('llm_priority', default=INTERACTIVE)
+_user: ContextVar[str] = ContextVar('llm_user', default='anonymous')
+
+
+def set_llm_context(priority: Optional[str] = None, user: Optional[str] = None) -> None:
+    """Tag the LLM calls made from the current task (or thread) from now on."""
+    if priority is not None:
+        _priority.set(priority)
+    if user is not None:
+        _user.set(user)
+
+
+@contextmanager
+def llm_context(priority: Optional[str] = None, user: Optional[str] = None):
+    """Tag the LLM calls made inside the block."""
+    tokens = [(_priority, _priority.set(priority)) if priority else None,
+              (_user, _user.set(user)) if user else None]
+    try:
+        yield
+    finally:
+        for var, token in filter(None, tokens):
+            var.reset(token)
+
+
+class Ticket:
+    """One request's place in the queue, and later its slot."""
+
+    __slots__ = ('priority', 'user', 'order', 'enqueued', 'granted', 'released',
+                 'future', 'loop', 'event')
+
+    def __init__(self, priority: str, user: str, order: int):
+        self.priority = priority
+        self.user = user
+        self.order = order
+        self.enqueued = time.perf_counter()
+        self.granted = False
+        self.released = False
+        self.future: Optional[asyncio.Future] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.event: Optional[threading.Event] = None
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class LLMScheduler:
+    """Admits LLM calls by priority class, then by per-user fair share."""
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 bulk_max_concurrency: int = LLM_BULK_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self.bulk_max_concurrency = min(bulk_max_concurrency, max_concurrency)
+        self._lock = threading.Lock()
+        # 每個優先等級：使用者 -> 排隊中的請求
+        self._queues: Dict[str, 'OrderedDict[str, deque]'] = {p: OrderedDict() for p in PRIORITIES}
+        self._waiting = Counter()
+        self._in_flight = Counter()
+        self._user_in_flight: Dict[Tuple[str, str], int] = Counter()
+        self._order = itertools.count()
+        self._served = itertools.count()
+        # (優先等級, 使用者) -> 最近一次取得名額的序號，用來輪流服務
+        self._last_served: Dict[Tuple[str, str], int] = {}
+
+    def _can_admit(self, priority: str) -> bool:
+        if sum(self._in_flight.values()) >= self.max_concurrency:
+            return False
+        return priority != BULK or self._in_flight[BULK] < self.bulk_max_concurrency
+
+    def _admit(self, ticket: Ticket) -> None:
+        ticket.granted = True
+        self._in_flight[ticket.priority] += 1
+        self._user_in_flight[ticket.priority, ticket.user] += 1
+        self._last_served[ticket.priority, ticket.user] = next(self._served)
+        LLM_IN_FLIGHT.set(self._in_flight[ticket.priority], priority=ticket.priority)
+        LLM_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - ticket.enqueued, priority=ticket.priority)
+
+    def _enqueue(self, ticket: Ticket) -> None:
+        self._queues[ticket.priority].setdefault(ticket.user, deque()).append(ticket)
+        self._waiting[ticket.priority] += 1
+        LLM_QUEUE_DEPTH.set(self._waiting[ticket.priority], priority=ticket.priority)
+
+    def _dequeue(self, ticket: Ticket) -> None:
+        users = self._queues[ticket.priority]
+        users[ticket.user].remove(ticket)
+        if not users[ticket.user]:
+            del users[ticket.user]
+        self._waiting[ticket.priority] -= 1
+        LLM_QUEUE_DEPTH.set(self._waiting[ticket.priority], priority=ticket.priority)
+
+    def _next(self, priority: str) -> Optional[Ticket]:
+        users = self._queues[priority]
+        if not users:
+            return None
+        # 進行中請求最少的使用者優先，其次是最久沒被服務的使用者
+        user = min(users, key=lambda u: (self._user_in_flight[priority, u],
+                                         self._last_served.get((priority, u), -1), users[u][0].order))
+        return users[user][0]
+
+    def _forget_idle_users(self) -> None:
+        for priority, user in list(self._last_served):
+            if not self._user_in_flight[priority, user] and user not in self._queues[priority]:
+                del self._last_served[priority, user]
+
+    def _dispatch(self) -> None:
+        for priority in PRIORITIES:
+            while self._can_admit(priority):
+                ticket = self._next(priority)
+                if ticket is None:
+                    break
+                self._dequeue(ticket)
+                self._admit(ticket)
+                if ticket.event is not None:
+                    ticket.event.set()
+                else:
+                    ticket.loop.call_soon_threadsafe(_wake, ticket.future)
+
+    def _try_admit(self, ticket: Ticket) -> bool:
+        # 同等級已有人排隊時不插隊
+        if not self._queues[ticket.priority] and self._can_admit(ticket.priority):
+            self._admit(ticket)
+            return True
+        self._enqueue(ticket)
+        return False
+
+    async def acquire(self, priority: str = INTERACTIVE, user: str = 'anonymous') -> Ticket:
+        ticket = Ticket(priority, user, next(self._order))
+        with self._lock:
+            if self._try_admit(ticket):
+                return ticket
+            ticket.loop = asyncio.get_running_loop()
+            ticket.future = ticket.loop.create_future()
+        try:
+            await ticket.future
+        except BaseException:
+            with self._lock:
+                granted = ticket.granted
+                if not granted:
+                    self._dequeue(ticket)
+            if granted:
+                self.release(ticket)
+            raise
+        return ticket
+
+    def acquire_sync(self, priority: str = INTERACTIVE, user: str = 'anonymous') -> Ticket:
+        ticket = Ticket(priority, user, next(self._order))
+        with self._lock:
+            if self._try_admit(ticket):
+                return ticket
+            ticket.event = threading.Event()
+        ticket.event.wait()
+        return ticket
+
+    def release(self, ticket: Ticket) -> None:
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            self._in_flight[ticket.priority] -= 1
+            key = (ticket.priority, ticket.user)
+            self._user_in_flight[key] -= 1
+            if not self._user_in_flight[key]:
+                del self._user_in_flight[key]
+            if len(self._last_served) > _MAX_TRACKED_USERS:
+                self._forget_idle_users()
+            LLM_IN_FLIGHT.set(self._in_flight[ticket.priority], priority=ticket.priority)
+            self._dispatch()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {'in_flight': {p: self._in_flight[p] for p in PRIORITIES},
+                    'waiting': {p: self._waiting[p] for p in PRIORITIES}}
+
+
+def _scheduled(request: httpx.Request) -> bool:
+    return request.method == 'POST' and request.url.path.endswith('/chat/completions')
+
+
+class _ReleasingStream(httpx.AsyncByteStream, httpx.SyncByteStream):
+    """Response body that gives the slot back once it is read or closed."""
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+        self._release()
+
+    def __iter__(self):
+        yield from self._stream
+        self._release()
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+class ScheduledAsyncTransport(httpx.AsyncBaseTransport):
+    def __init__(self, scheduler: LLMScheduler, transport: httpx.AsyncBaseTransport):
+        self.scheduler = scheduler
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not _scheduled(request):
+            return await self.transport.handle_async_request(request)
+        ticket = await self.scheduler.acquire(_priority.get(), _user.get())
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException:
+            self.scheduler.release(ticket)
+            raise
+        response.stream = _ReleasingStream(response.stream, lambda: self.scheduler.release(ticket))
+        return response
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class ScheduledTransport(httpx.BaseTransport):
+    def __init__(self, scheduler: LLMScheduler, transport: httpx.BaseTransport):
+        self.scheduler = scheduler
+        self.transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if not _scheduled(request):
+            return self.transport.handle_request(request)
+        ticket = self.scheduler.acquire_sync(_priority.get(), _user.get())
+        try:
+            response = self.transport.handle_request(request)
+        except BaseException:
+            self.scheduler.release(ticket)
+            raise
+        response.stream = _ReleasingStream(response.stream, lambda: self.scheduler.release(ticket))
+        return response
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler() -> Optional[LLMScheduler]:
+    """Process-wide scheduler, or None when ``LLM_MAX_CONCURRENCY`` is 0."""
+    global _scheduler
+    if _scheduler is None and LLM_MAX_CONCURRENCY > 0:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler()
+    return _scheduler
+
+
+def http_clients() -> Dict[str, object]:
+    """``http_client``/``http_async_client`` arguments for ``ChatOpenAI`` that go
+    through the shared scheduler; empty when it is turned off."""
+    scheduler = get_llm_scheduler()
+    if scheduler is None:
+        return {}
+    from openai import DefaultAsyncHttpxClient, DefaultHttpxClient
+    from openai._constants import DEFAULT_CONNECTION_LIMITS
+
+    return {
+        'http_client': DefaultHttpxClient(transport=ScheduledTransport(
+            scheduler, httpx.HTTPTransport(limits=DEFAULT_CONNECTION_LIMITS))),
+        'http_async_client': DefaultAsyncHttpxClient(transport=ScheduledAsyncTransport(
+            scheduler, httpx.AsyncHTTPTransport(limits=DEFAULT_CONNECTION_LIMITS))),
+    }
@@ -0,0 +1,145 @@
+"""Structured, leveled and sampled logging written from a background thread.
+
+Hot paths used to ``print`` every translated text and every agent step,
+so a large deck produced megabytes of synchronous stdout writes. They now
+call ``log_event``, which:
+
+- returns at once when the level is disabled;
+- keeps only a sampled share of high-volume events (``LOG_SAMPLE_RATES``,
+  e.g. ``translate.segment=0.01,agent.steps=0.1``); the kept records carry
+  their ``sample_rate`` so counts can be scaled back up;
+- hands the record to a ``QueueHandler``. A ``QueueListener`` thread
+  formats it as one JSON object per line (``LOG_FORMAT=text`` for a
+  readable console) and writes it to stdout.
+"""
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+from typing import Dict, Optional
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', 'translate.segment=0.01,agent.steps=0.1')
+# 佇列滿時丟棄紀錄，不讓寫日誌拖慢請求
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+# 單一欄位的最大字元數，避免整段原文或查詢結果寫進日誌
+LOG_MAX_FIELD_CHARS = int(os.getenv('LOG_MAX_FIELD_CHARS', '500'))
+
+ROOT_LOGGER = 'chatbot'
+
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        event, _, rate = item.partition('=')
+        try:
+            rates[event.strip()] = min(1.0, max(0.0, float(rate)))
+        except ValueError:
+            continue
+    return rates
+
+
+_sample_rates = parse_sample_rates(LOG_SAMPLE_RATES)
+
+
+def _clip(value):
+    if isinstance(value, str) and len(value) > LOG_MAX_FIELD_CHARS:
+        return f"{value[:LOG_MAX_FIELD_CHARS]}…(+{len(value) - LOG_MAX_FIELD_CHARS} chars)"
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, event and fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc)
+                  .isoformat(timespec='milliseconds'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'event': getattr(record, 'event', None) or record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RESERVED and k != 'event'})
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        fields = ' '.join(f"{k}={v}" for k, v in vars(record).items() if k not in _RESERVED and k != 'event')
+        line = f"{self.formatTime(record)} {record.levelname:<7} {record.name} {record.getMessage()} {fields}"
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line.rstrip()
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 欄位在背景執行緒才格式化，這裡只確保紀錄可跨執行緒傳遞
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_setup_lock = threading.Lock()
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, stream=None) -> logging.Logger:
+    """Route the ``chatbot`` loggers through a queue to a background writer."""
+    global _listener
+    logger = logging.getLogger(ROOT_LOGGER)
+    with _setup_lock:
+        if _listener is not None:
+            return logger
+        records = queue.Queue(LOG_QUEUE_SIZE)
+        output = logging.StreamHandler(stream)
+        output.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+        _listener = logging.handlers.QueueListener(records, output, respect_handler_level=False)
+        _listener.start()
+        atexit.register(shutdown_logging)
+        logger.handlers = [_DroppingQueueHandler(records)]
+        logger.setLevel(level)
+        logger.propagate = False
+    return logger
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+            logging.getLogger(ROOT_LOGGER).handlers = []
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def log_event(logger: logging.Logger, level: int, event: str, exc_info=None, **fields) -> None:
+    """Log ``event`` with ``fields`` if the level is enabled and it is sampled."""
+    if not logger.isEnabledFor(level):
+        return
+    rate = _sample_rates.get(event, 1.0)
+    if rate < 1.0:
+        if random.random() >= rate:
+            return
+        fields['sample_rate'] = rate
+    extra = {k: _clip(v) for k, v in fields.items() if k not in _RESERVED}
+    extra['event'] = event
+    logger.log(level, event, extra=extra, exc_info=exc_info)
@@ -0,0 +1,175 @@
+"""Process-wide latency histograms and counters in the Prometheus text format.
+
+The metrics are kept in plain Python objects guarded by a lock per metric,
+so recording a value costs a bisect and two additions. Hot loops, such as
+one translated segment, only bump counters. ``render()`` produces the
+exposition text served at ``/metrics`` (see ``core.metrics``).
+"""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+METRICS = os.getenv('METRICS', '1') == '1'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+
+def _labels(names: Sequence[str], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if not METRICS:
+            return
+        key = tuple(str(labels.get(n, '')) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels.get(n, '')) for n in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}_total{_labels(self.labelnames, key)} {value:g}" for key, value in values]
+
+
+class Gauge(Counter):
+    """A value that goes up and down, such as a queue depth."""
+
+    kind = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        if not METRICS:
+            return
+        key = tuple(str(labels.get(n, '')) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, key)} {value:g}" for key, value in values]
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # 每組標籤：[各區間計數..., +Inf 計數], 總和
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        if not METRICS:
+            return
+        key = tuple(str(labels.get(n, '')) for n in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        key = tuple(str(labels.get(n, '')) for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            return sum(series[0]) if series else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        lines = []
+        for key, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                labels = _labels(self.labelnames, key, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+TURN_SECONDS = registry.register(Histogram(
+    'chat_turn_seconds', 'Time to answer one chat message.', ['path']))
+LLM_SECONDS = registry.register(Histogram(
+    'llm_call_seconds', 'Latency of one LLM call.', ['model']))
+LLM_FIRST_TOKEN_SECONDS = registry.register(Histogram(
+    'llm_first_token_seconds', 'Time from an LLM call start to its first streamed token.', ['model']))
+LLM_PROMPT_TOKENS = registry.register(Histogram(
+    'llm_prompt_tokens', 'Prompt tokens of one LLM call.', ['model'], TOKEN_BUCKETS))
+LLM_TOKENS = registry.register(Counter(
+    'llm_tokens', 'LLM tokens by kind (prompt, cached, completion).', ['model', 'kind']))
+TOOL_SECONDS = registry.register(Histogram(
+    'tool_seconds', 'Latency of one tool call.', ['tool']))
+SQL_SECONDS = registry.register(Histogram(
+    'sql_query_seconds', 'Time to run one SQL query and read its rows.', ['source']))
+TRANSLATION_PHASE_SECONDS = registry.register(Histogram(
+    'translation_phase_seconds', 'Time spent in each phase of a PowerPoint translation.', ['phase']))
+TRANSLATED_SEGMENTS = registry.register(Counter(
+    'translated_segments', 'Text runs sent to the LLM for translation.'))
+LLM_QUEUE_DEPTH = registry.register(Gauge(
+    'llm_queue_depth', 'LLM calls waiting for a slot in the scheduler.', ['priority']))
+LLM_IN_FLIGHT = registry.register(Gauge(
+    'llm_in_flight', 'LLM calls holding a scheduler slot.', ['priority']))
+LLM_QUEUE_WAIT_SECONDS = registry.register(Histogram(
+    'llm_queue_wait_seconds', 'Time an LLM call waited for a scheduler slot.', ['priority']))
+
+
+def render() -> str:
+    return registry.render()
@@ -0,0 +1,282 @@
+"""Synthetic sales data generator and bulk loader for scale testing.
+
+Usage:
+    python -m tools.sales_data generate --rows 1000000 --out output/sales_1m.csv
+    python -m tools.sales_data load output/sales_1m.csv [--batch-size 10000] [--method auto]
+
+The generator streams rows for the Region/City/Category/Product domains of
+init.sql, with city weights, seasonal demand and price jitter, so 100M rows
+never have to fit in memory. IDs are 'ID' followed by ten digits starting at
+1000000000: they sort after the seed rows (ID07351...) and keep the rollup
+watermark, which compares IDs as strings, correct.
+
+The loader ingests CSV or Parquet into ``sales``. On MySQL a CSV file is sent
+with one ``LOAD DATA LOCAL INFILE``; otherwise rows are inserted with batched
+executemany, one transaction per batch. Parquet needs pyarrow.
+"""
+import argparse
+import csv
+import datetime
+import math
+import os
+import random
+import sys
+import time
+from typing import Iterable, Iterator, Optional
+
+COLUMNS = ('ID', 'Date', 'Region', 'City', 'Category', 'Product',
+           'Quantity', 'Unit_Price', 'Total_Price')
+
+# 地區 -> 城市與相對銷售權重
+CITIES = {
+    '関東': {'東京': 5, '横浜': 3, '千葉': 2, '埼玉': 2},
+    '関西': {'大阪': 4, '京都': 2, '神戸': 2},
+}
+# 類別 -> 產品與基準單價
+PRODUCTS = {
+    '野菜': {'キャベツ': 244, '玉ねぎ': 481, 'トマト': 298},
+    '果物': {'リンゴ': 258, 'みかん': 198, 'バナナ': 228},
+}
+# 產品盛產月份，該月份前後銷量較高
+PEAK_MONTHS = {
+    'キャベツ': 3, '玉ねぎ': 5, 'トマト': 7,
+    'リンゴ': 10, 'みかん': 12, 'バナナ': 6,
+}
+
+FIRST_GENERATED_ID = 1_000_000_000
+LOAD_BATCH_SIZE = int(os.getenv('LOAD_BATCH_SIZE', '10000'))
+
+
+def format_id(number: int) -> str:
+    return f"ID{number:010d}"
+
+
+def _seasonality(product: str, month: int) -> float:
+    distance = (month - PEAK_MONTHS[product]) % 12
+    return 1.0 + 0.4 * math.cos(2 * math.pi * distance / 12)
+
+
+def generate_rows(count: int, start_id: int = FIRST_GENERATED_ID,
+                  start_date: datetime.date = datetime.date(2023, 1, 1),
+                  days: int = 730, seed: Optional[int] = 0) -> Iterator[tuple]:
+    """Yield ``count`` sales rows as tuples in COLUMNS order."""
+    rng = random.Random(seed)
+    cities = [(region, city) for region, members in CITIES.items() for city in members]
+    city_weights = [CITIES[region][city] for region, city in cities]
+    products = [(category, product) for category, members in PRODUCTS.items() for product in members]
+    dates = [start_date + datetime.timedelta(days=offset) for offset in range(days)]
+    seasonality = {(product, month): _seasonality(product, month)
+                   for _, product in products for month in range(1, 13)}
+
+    # 每次抽樣一整塊，避免逐列呼叫 random 的開銷
+    for block_start in range(start_id, start_id + count, 10_000):
+        size = min(10_000, start_id + count - block_start)
+        picked = zip(range(block_start, block_start + size),
+                     rng.choices(cities, city_weights, k=size),
+                     rng.choices(products, k=size),
+                     rng.choices(dates, k=size))
+        for number, (region, city), (category, product), date in picked:
+            mean = 60 * seasonality[product, date.month]
+            quantity = max(1, int(rng.gauss(mean, mean / 3)))
+            unit_price = round(PRODUCTS[category][product] * rng.uniform(0.9, 1.1))
+            yield (format_id(number), date.isoformat(), region, city, category, product,
+                   quantity, f"{unit_price:.2f}", f"{quantity * unit_price:.2f}")
+
+
+def _batches(rows: Iterable[tuple], size: int) -> Iterator[list]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise SystemExit("Parquet support requires pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+def write_rows(path: str, rows: Iterable[tuple], batch_size: int = 100_000) -> int:
+    """Write rows to a .csv or .parquet file and return the row count."""
+    written = 0
+    if path.endswith('.parquet'):
+        pa = _require_pyarrow()
+        schema = pa.schema([(name, pa.string()) for name in COLUMNS[:6]] + [
+            ('Quantity', pa.int32()), ('Unit_Price', pa.string()), ('Total_Price', pa.string())
+        ])
+        writer = pa.parquet.ParquetWriter(path, schema)
+        try:
+            for batch in _batches(rows, batch_size):
+                columns = list(zip(*batch))
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(column, field.type) for column, field in zip(columns, schema)],
+                    schema=schema
+                ))
+                written += len(batch)
+        finally:
+            writer.close()
+        return written
+
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(COLUMNS)
+        for batch in _batches(rows, batch_size):
+            writer.writerows(batch)
+            written += len(batch)
+    return written
+
+
+def read_rows(path: str) -> Iterator[tuple]:
+    """Stream rows from a .csv (with header) or .parquet file."""
+    if path.endswith('.parquet'):
+        pa = _require_pyarrow()
+        parquet_file = pa.parquet.ParquetFile(path)
+        for batch in parquet_file.iter_batches(columns=list(COLUMNS)):
+            yield from zip(*(column.to_pylist() for column in batch.columns))
+        return
+
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        if tuple(header) != COLUMNS:
+            raise ValueError(f"Unexpected CSV header: {header}")
+        for row in reader:
+            yield tuple(row)
+
+
+class LoadStats:
+    """Row count and throughput of one load."""
+
+    def __init__(self, method: str):
+        self.method = method
+        self.rows = 0
+        self.batches = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add(self, rows: int) -> None:
+        self.rows += rows
+        self.batches += 1
+        self.elapsed = time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self) -> str:
+        return (f"{self.rows:,} rows in {self.elapsed:.1f}s "
+                f"({self.rows_per_second:,.0f} rows/s, {self.batches} batches, {self.method})")
+
+
+class SalesLoader:
+    """Bulk-load sales rows into the database behind a connection pool."""
+
+    def __init__(self, pool, batch_size: int = LOAD_BATCH_SIZE, progress=None):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.progress = progress
+
+    def load(self, path: str, method: str = 'auto') -> LoadStats:
+        if method == 'auto':
+            method = ('load-data' if self.pool.dialect == 'mysql' and path.endswith('.csv')
+                      else 'executemany')
+        if method == 'load-data':
+            return self.load_data_infile(path)
+        return self.insert_rows(read_rows(path))
+
+    def insert_rows(self, rows: Iterable[tuple]) -> LoadStats:
+        stats = LoadStats('executemany')
+        sql = (f"INSERT INTO sales ({', '.join(COLUMNS)}) "
+               f"VALUES ({', '.join(['%s'] * len(COLUMNS))})")
+        with self.pool.connection() as connection:
+            for batch in _batches(rows, self.batch_size):
+                # 每批一個交易：pymysql 會把 executemany 改寫成多列 INSERT
+                connection.begin()
+                with connection.cursor() as cursor:
+                    cursor.executemany(sql, batch)
+                connection.commit()
+                stats.add(len(batch))
+                if self.progress:
+                    self.progress(stats)
+        return stats
+
+    def load_data_infile(self, path: str) -> LoadStats:
+        """Send a CSV file with LOAD DATA LOCAL INFILE (MySQL only)."""
+        import pymysql
+        from tools.db import parse_db_url
+
+        stats = LoadStats('load-data')
+        # 連線池的連線未開啟 local_infile，這裡使用專用連線
+        connection = pymysql.connect(charset='utf8mb4', local_infile=True,
+                                     **parse_db_url(self.pool.db_url))
+        try:
+            with connection.cursor() as cursor:
+                rows = cursor.execute(
+                    "LOAD DATA LOCAL INFILE %s INTO TABLE sales "
+                    "CHARACTER SET utf8mb4 FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+                    "LINES TERMINATED BY '\\n' IGNORE 1 LINES "
+                    f"({', '.join(COLUMNS)})",
+                    (os.path.abspath(path),)
+                )
+            connection.commit()
+        finally:
+            connection.close()
+        stats.add(rows)
+        return stats
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Generate or bulk-load sales data.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help="Write synthetic sales rows to CSV or Parquet.")
+    generate.add_argument('--rows', type=int, default=1_000_000)
+    generate.add_argument('--out', required=True, help="Output path ending in .csv or .parquet.")
+    generate.add_argument('--start-id', type=int, default=FIRST_GENERATED_ID,
+                          help="First numeric ID; continue after a previous file to append.")
+    generate.add_argument('--start-date', type=datetime.date.fromisoformat,
+                          default=datetime.date(2023, 1, 1))
+    generate.add_argument('--days', type=int, default=730)
+    generate.add_argument('--seed', type=int, default=0)
+
+    load = commands.add_parser('load', help="Bulk-load a CSV or Parquet file into sales.")
+    load.add_argument('path')
+    load.add_argument('--batch-size', type=int, default=LOAD_BATCH_SIZE)
+    load.add_argument('--method', choices=['auto', 'load-data', 'executemany'], default='auto')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        started = time.perf_counter()
+        rows = generate_rows(args.rows, args.start_id, args.start_date, args.days, args.seed)
+        written = write_rows(args.out, rows)
+        elapsed = time.perf_counter() - started
+        print(f"Wrote {written:,} rows to {args.out} in {elapsed:.1f}s "
+              f"({written / elapsed if elapsed else 0:,.0f} rows/s)")
+        return
+
+    from tools.db import get_pool
+
+    pool = get_pool()
+    if not pool:
+        raise SystemExit("CLEARDB_DATABASE_URL is not set")
+
+    def progress(stats: LoadStats) -> None:
+        if stats.batches % 10 == 0:
+            print(f"  {stats}", file=sys.stderr)
+
+    stats = SalesLoader(pool, args.batch_size, progress).load(args.path, args.method)
+    print(f"Loaded {stats}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,336 @@
+import re
+from typing import List, Optional, Union
+from pydantic import BaseModel
+
+# sales 資料表的欄位（小寫 -> 正式名稱）
+SALES_COLUMNS = {
+    'id': 'ID',
+    'date': 'Date',
+    'region': 'Region',
+    'city': 'City',
+    'category': 'Category',
+    'product': 'Product',
+    'quantity': 'Quantity',
+    'unit_price': 'Unit_Price',
+    'total_price': 'Total_Price',
+}
+DIMENSIONS = ('Date', 'Region', 'City', 'Category', 'Product')
+MEASURE_COLUMNS = ('Quantity', 'Total_Price')
+# 不可為 NULL 的欄位：COUNT(欄位) 與 COUNT(*) 相同
+NOT_NULL_COLUMNS = ('ID', 'Date')
+DATE_FUNCTIONS = ('year', 'month', 'quarter')
+AGGREGATES = ('sum', 'count', 'avg')
+
+_TOKEN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<str>'(?:[^'\\]|\\.|'')*')
+  | (?P<num>\d+(?:\.\d+)?)
+  | (?P<ident>`[^`]+`|[A-Za-z_]\w*)
+  | (?P<op><=|>=|<>|!=|=|<|>)
+  | (?P<punct>[(),*;])
+""", re.X)
+
+
+class Dimension(BaseModel):
+    """A grouping or filter expression: a column, optionally wrapped in a date function."""
+    column: str
+    func: Optional[str] = None
+    arg: Optional[str] = None
+
+    def key(self) -> tuple:
+        return (self.column, self.func, self.arg)
+
+
+class Measure(BaseModel):
+    """SUM/AVG of a numeric column, COUNT(column), or COUNT(*) when column is None."""
+    func: str
+    column: Optional[str] = None
+
+
+class SelectItem(BaseModel):
+    label: str
+    dimension: Optional[Dimension] = None
+    measure: Optional[Measure] = None
+
+
+class Condition(BaseModel):
+    dimension: Dimension
+    op: str
+    values: List[Union[str, int, float]]
+
+
+class OrderItem(BaseModel):
+    descending: bool = False
+    label: Optional[str] = None
+    dimension: Optional[Dimension] = None
+    measure: Optional[Measure] = None
+
+
+class AggregateQuery(BaseModel):
+    """A group-by/filter/sum query over the sales table.
+
+    Only a deliberately small subset of SQL is represented: conditions are
+    joined with AND, grouping is on sales dimensions (or YEAR/MONTH/QUARTER/
+    DATE_FORMAT of Date), and measures are SUM/AVG of Quantity or
+    Total_Price and COUNT(*). Anything else is not parsed.
+    """
+    table: str
+    items: List[SelectItem]
+    conditions: List[Condition] = []
+    group_by: List[Dimension] = []
+    order_by: List[OrderItem] = []
+    limit: Optional[int] = None
+
+
+class _Unsupported(Exception):
+    pass
+
+
+class _Parser:
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.tokens = []
+        position = 0
+        while position < len(sql):
+            match = _TOKEN.match(sql, position)
+            if not match:
+                raise _Unsupported(sql[position:position + 10])
+            if match.lastgroup != 'space':
+                self.tokens.append((match.lastgroup, match.group(), match.start(), match.end()))
+            position = match.end()
+        self.i = 0
+
+    # -- token helpers -------------------------------------------------
+
+    def peek(self, offset: int = 0):
+        index = self.i + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None, len(self.sql), len(self.sql))
+
+    def word(self, offset: int = 0) -> Optional[str]:
+        kind, text, _, _ = self.peek(offset)
+        return text.lower() if kind == 'ident' else None
+
+    def take(self):
+        token = self.peek()
+        if token[0] is None:
+            raise _Unsupported('unexpected end')
+        self.i += 1
+        return token
+
+    def expect(self, text: str):
+        kind, value, _, _ = self.take()
+        if value.lower() != text:
+            raise _Unsupported(value)
+
+    def accept(self, text: str) -> bool:
+        if (self.peek()[1] or '').lower() == text:
+            self.i += 1
+            return True
+        return False
+
+    def accept_words(self, *words) -> bool:
+        if all(self.word(k) == w for k, w in enumerate(words)):
+            self.i += len(words)
+            return True
+        return False
+
+    # -- grammar -------------------------------------------------------
+
+    def column(self) -> str:
+        kind, text, _, _ = self.take()
+        if kind != 'ident':
+            raise _Unsupported(text)
+        name = SALES_COLUMNS.get(text.strip('`').lower())
+        if name is None:
+            raise _Unsupported(text)
+        return name
+
+    def literal(self):
+        kind, text, _, _ = self.take()
+        if kind == 'str':
+            return text[1:-1].replace("''", "'").replace("\\'", "'").replace('\\\\', '\\')
+        if kind == 'num':
+            return float(text) if '.' in text else int(text)
+        raise _Unsupported(text)
+
+    def dimension(self) -> Dimension:
+        word = self.word()
+        if word in DATE_FUNCTIONS and self.peek(1)[1] == '(':
+            self.i += 2
+            column = self.column()
+            self.expect(')')
+            if column != 'Date':
+                raise _Unsupported(word)
+            return Dimension(column=column, func=word)
+        if word == 'date_format' and self.peek(1)[1] == '(':
+            self.i += 2
+            column = self.column()
+            self.expect(',')
+            pattern = self.literal()
+            self.expect(')')
+            if column != 'Date' or not isinstance(pattern, str):
+                raise _Unsupported(word)
+            return Dimension(column=column, func='date_format', arg=pattern)
+        column = self.column()
+        if column not in DIMENSIONS:
+            raise _Unsupported(column)
+        return Dimension(column=column)
+
+    def measure(self) -> Optional[Measure]:
+        word = self.word()
+        if word not in AGGREGATES or self.peek(1)[1] != '(':
+            return None
+        self.i += 2
+        if word == 'count':
+            column = None if self.accept('*') else self.column()
+            self.expect(')')
+            return Measure(func='count', column=column)
+        column = self.column()
+        self.expect(')')
+        if column not in MEASURE_COLUMNS:
+            raise _Unsupported(column)
+        return Measure(func=word, column=column)
+
+    def alias(self) -> Optional[str]:
+        explicit = self.accept('as')
+        kind, text, _, _ = self.peek()
+        if kind == 'str' or (kind == 'ident' and text.lower() not in ('from',)):
+            self.i += 1
+            return text.strip('`\'')
+        if explicit:
+            raise _Unsupported('as')
+        return None
+
+    def select_item(self) -> SelectItem:
+        start = self.peek()[2]
+        measure = self.measure()
+        dimension = None if measure else self.dimension()
+        end = self.tokens[self.i - 1][3]
+        label = self.alias() or self.sql[start:end]
+        if dimension and not dimension.func:
+            label = label.strip('`')
+        return SelectItem(label=label, dimension=dimension, measure=measure)
+
+    def condition(self) -> Condition:
+        dimension = self.dimension()
+        kind, text, _, _ = self.peek()
+        if kind == 'op':
+            self.i += 1
+            op = '!=' if text == '<>' else text
+            return Condition(dimension=dimension, op=op, values=[self.literal()])
+        if self.accept('between'):
+            low = self.literal()
+            self.expect('and')
+            return Condition(dimension=dimension, op='between', values=[low, self.literal()])
+        if self.accept('in'):
+            self.expect('(')
+            values = [self.literal()]
+            while self.accept(','):
+                values.append(self.literal())
+            self.expect(')')
+            return Condition(dimension=dimension, op='in', values=values)
+        if self.accept('like'):
+            return Condition(dimension=dimension, op='like', values=[self.literal()])
+        raise _Unsupported(text)
+
+    def group_item(self, items: List[SelectItem]) -> Dimension:
+        kind, text, _, _ = self.peek()
+        name = text.strip('`') if kind == 'ident' else None
+        if name and name.lower() not in SALES_COLUMNS and self.peek(1)[1] != '(':
+            # GROUP BY 使用 SELECT 中的別名
+            for item in items:
+                if item.dimension and item.label == name:
+                    self.i += 1
+                    return item.dimension
+        return self.dimension()
+
+    def order_item(self, items: List[SelectItem]) -> OrderItem:
+        kind, text, _, _ = self.peek()
+        item = None
+        if kind == 'num':
+            self.i += 1
+            index = int(text) - 1
+            if not 0 <= index < len(items):
+                raise _Unsupported(text)
+            item = OrderItem(label=items[index].label)
+        else:
+            label = text.strip('`\'') if kind in ('ident', 'str') else None
+            by_label = next((s for s in items if s.label == label), None)
+            if by_label and self.peek(1)[1] != '(':
+                self.i += 1
+                item = OrderItem(label=by_label.label)
+            else:
+                measure = self.measure()
+                if measure:
+                    item = OrderItem(measure=measure)
+                else:
+                    item = OrderItem(dimension=self.dimension())
+        if self.accept('desc'):
+            item.descending = True
+        else:
+            self.accept('asc')
+        return item
+
+    def parse(self) -> AggregateQuery:
+        self.expect('select')
+        items = [self.select_item()]
+        while self.accept(','):
+            items.append(self.select_item())
+
+        self.expect('from')
+        table = self.take()[1].strip('`').lower()
+
+        conditions = []
+        if self.accept('where'):
+            conditions.append(self.condition())
+            while self.accept('and'):
+                conditions.append(self.condition())
+
+        group_by = []
+        if self.accept_words('group', 'by'):
+            while True:
+                group_by.append(self.group_item(items))
+                if not self.accept(','):
+                    break
+
+        order_by = []
+        if self.accept_words('order', 'by'):
+            order_by.append(self.order_item(items))
+            while self.accept(','):
+                order_by.append(self.order_item(items))
+
+        limit = None
+        if self.accept('limit'):
+            kind, text, _, _ = self.take()
+            if kind != 'num':
+                raise _Unsupported(text)
+            limit = int(text)
+
+        self.accept(';')
+        if self.peek()[0] is not None:
+            raise _Unsupported(self.peek()[1])
+
+        grouped = {d.key() for d in group_by}
+        for item in items:
+            if item.dimension and item.dimension.key() not in grouped:
+                raise _Unsupported('non-aggregated column outside GROUP BY')
+        if not any(item.measure for item in items):
+            raise _Unsupported('no aggregate')
+
+        return AggregateQuery(table=table, items=items, conditions=conditions,
+                              group_by=group_by, order_by=order_by, limit=limit)
+
+
+def parse_aggregate(sql: str) -> Optional[AggregateQuery]:
+    """Parse ``sql`` into an AggregateQuery, or return None if it is outside
+    the supported subset."""
+    try:
+        return _Parser(sql.strip()).parse()
+    except _Unsupported:
+        return None
+
+
+def render_literal(value) -> str:
+    if isinstance(value, str):
+        return "'" + value.replace('\\', '\\\\').replace("'", "''") + "'"
+    return str(value)
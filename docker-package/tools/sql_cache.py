@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+SQL_CACHE_TTL = float(os.getenv('SQL_CACHE_TTL', '300'))
+SQL_CACHE_MAX_ENTRIES = int(os.getenv('SQL_CACHE_MAX_ENTRIES', '256'))
+SQL_CACHE_MAX_BYTES = int(os.getenv('SQL_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))
+
+# 每個資料表的資料版本探測查詢，必須非常便宜（主鍵 MAX 只讀索引的最後一筆）。
+# 沒有登記探測查詢的資料表不會被快取。
+VERSION_PROBES = {
+    'sales': "SELECT MAX(ID) AS max_id FROM sales",
+    'sales_daily': "SELECT last_id FROM rollup_state WHERE name = 'sales_daily'",
+    'sales_monthly': "SELECT last_id FROM rollup_state WHERE name = 'sales_monthly'",
+}
+
+MISS = object()
+
+
+def estimate_size(value: Any) -> int:
+    """Rough in-memory size of a query result, measured by its repr length."""
+    return len(repr(value))
+
+
+class QueryResultCache:
+    """LRU cache of query results keyed by normalized SQL.
+
+    Each entry remembers the data version it was computed at; a lookup with a
+    different version, or after ``ttl`` seconds, is treated as a miss.
+    The cache is bounded both by entry count and by estimated bytes.
+    """
+
+    def __init__(self, ttl: float = SQL_CACHE_TTL,
+                 max_entries: int = SQL_CACHE_MAX_ENTRIES,
+                 max_bytes: int = SQL_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: str, version: Any) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISS
+            value, entry_version, expires_at, size = entry
+            if entry_version != version or time.monotonic() >= expires_at:
+                self._remove(key)
+                self.invalidations += 1
+                self.misses += 1
+                return MISS
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, version: Any, value: Any) -> bool:
+        size = estimate_size(value)
+        # 單筆結果過大時不快取，避免把其他熱門結果全部擠掉
+        if size > self.max_bytes // 4:
+            return False
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, version, time.monotonic() + self.ttl, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return True
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry[3]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hit_rate, 4),
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> Optional[QueryResultCache]:
+    """Process-wide result cache, or None when SQL_CACHE_TTL is 0."""
+    global _result_cache
+    if SQL_CACHE_TTL <= 0:
+        return None
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = QueryResultCache()
+    return _result_cache
@@ -0,0 +1,162 @@
+import os
+import re
+from typing import Optional
+
+from tools.sql_utils import code_only, is_read_only, split_literals, strip_comments
+
+# 執行計畫估計檢查列數上限，0 表示不檢查
+SQL_MAX_EXAMINED_ROWS = int(os.getenv('SQL_MAX_EXAMINED_ROWS', '5000000'))
+# 單一查詢的最長執行時間（毫秒），0 表示不限制
+SQL_MAX_EXECUTION_MS = int(os.getenv('SQL_MAX_EXECUTION_MS', '15000'))
+# 自動加上 LIMIT 時使用的列數
+SQL_REWRITE_LIMIT = int(os.getenv('SQL_REWRITE_LIMIT', '200'))
+
+# MySQL ER_QUERY_TIMEOUT
+QUERY_TIMEOUT_ERROR = 3024
+
+
+class QueryRejected(Exception):
+    """A query the guard refused to run, with a hint the agent can act on."""
+
+    def __init__(self, reason: str, hint: str, kind: str = "QUERY_REJECTED"):
+        super().__init__(reason)
+        self.reason = reason
+        self.hint = hint
+        self.kind = kind
+
+    def __str__(self):
+        return f"{self.kind}: {self.reason} Hint: {self.hint}"
+
+
+def estimate_examined_rows(plan: list) -> int:
+    """Upper bound of rows examined according to a traditional EXPLAIN plan.
+
+    Tables in the same SELECT are joined with nested loops, so their row
+    estimates multiply; separate SELECTs (subqueries, unions) add up.
+    """
+    per_select = {}
+    for step in plan:
+        rows = int(step.get('rows') or 1)
+        select_id = step.get('id')
+        per_select[select_id] = per_select.get(select_id, 1) * max(rows, 1)
+    return sum(per_select.values())
+
+
+def plan_hint(plan: list) -> str:
+    """Suggest a cheaper query based on the expensive steps of a plan."""
+    for step in plan:
+        extra = step.get('Extra') or ''
+        if step.get('type') == 'ALL' and 'join buffer' in extra.lower():
+            return (f"Table '{step.get('table')}' is joined without a usable join condition. "
+                    "Add an ON condition that relates the joined tables.")
+    full_scans = [step.get('table') for step in plan if step.get('type') == 'ALL']
+    if full_scans:
+        return (f"The query scans all rows of {', '.join(map(str, full_scans))}. "
+                "Filter on a narrower Date range or on Region/City/Category/Product, "
+                "aggregate with GROUP BY, or add a LIMIT.")
+    return "Narrow the query with a WHERE condition, aggregate with GROUP BY, or add a LIMIT."
+
+
+def _main_select_position(code: str) -> Optional[int]:
+    """Index of the top-level SELECT keyword (after any WITH clause) in ``code``."""
+    depth = 0
+    for match in re.finditer(r"[()]|\bselect\b", code, re.I):
+        token = match.group(0)
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        elif depth == 0:
+            return match.start()
+    return None
+
+
+def _is_simple_scan(code: str) -> bool:
+    """A plain row listing that a LIMIT lets the server stop early on."""
+    if re.search(r"\blimit\b|\bgroup\s+by\b|\border\s+by\b|\bdistinct\b|\bjoin\b|\bunion\b", code):
+        return False
+    if re.search(r"\b(sum|count|avg|min|max|group_concat)\s*\(", code):
+        return False
+    if not code.startswith('select') or len(re.findall(r"\bselect\b", code)) != 1:
+        return False
+    from_clause = re.split(r"\bwhere\b", code.split(' from ', 1)[-1])[0]
+    return ',' not in from_clause
+
+
+class QueryGuard:
+    """Checks agent-generated SQL before it reaches the database.
+
+    Only single read-only statements are accepted. SELECTs are explained
+    first and rejected when the optimizer expects to examine more than
+    ``max_examined_rows`` rows, unless a plain scan can be bounded with a
+    LIMIT instead. Every SELECT runs with a MAX_EXECUTION_TIME hint.
+    ``plan_checks`` are called with ``(cursor, sql, plan)`` and may return a
+    note for the agent about an accepted but suboptimal plan.
+    """
+
+    def __init__(self, max_examined_rows: int = SQL_MAX_EXAMINED_ROWS,
+                 max_execution_ms: int = SQL_MAX_EXECUTION_MS,
+                 rewrite_limit: int = SQL_REWRITE_LIMIT,
+                 plan_checks: Optional[list] = None):
+        self.max_examined_rows = max_examined_rows
+        self.max_execution_ms = max_execution_ms
+        self.rewrite_limit = rewrite_limit
+        self.plan_checks = plan_checks or []
+
+    def check_statement(self, sql: str) -> None:
+        if not is_read_only(sql):
+            raise QueryRejected(
+                "Only a single read-only statement (SELECT, SHOW, DESCRIBE) is allowed.",
+                "Rewrite the request as one SELECT query without data modification."
+            )
+
+    def check_plan(self, cursor, sql: str):
+        """Return ``(sql, note)``: the statement to execute and an optional note
+        describing a rewrite. Raises QueryRejected for plans that are too expensive."""
+        code = code_only(sql)
+        notes = []
+        if self.max_examined_rows > 0 and code.split(' ', 1)[0] in ('select', 'with'):
+            cursor.execute("EXPLAIN " + sql)
+            plan = cursor.fetchall()
+            estimate = estimate_examined_rows(plan)
+            if estimate > self.max_examined_rows:
+                if not _is_simple_scan(code):
+                    raise QueryRejected(
+                        f"The query is estimated to examine {estimate} rows, "
+                        f"above the limit of {self.max_examined_rows}.",
+                        plan_hint(plan)
+                    )
+                sql = f"{strip_comments(sql).strip().rstrip(';')} LIMIT {self.rewrite_limit}"
+                notes.append(f"The query was estimated to examine {estimate} rows; "
+                             f"LIMIT {self.rewrite_limit} was added.")
+            for check in self.plan_checks:
+                note = check(cursor, sql, plan)
+                if note:
+                    notes.append(note)
+        return self.with_execution_limit(sql), ' '.join(notes) or None
+
+    def with_execution_limit(self, sql: str) -> str:
+        """Add a MAX_EXECUTION_TIME optimizer hint to the top-level SELECT."""
+        if self.max_execution_ms <= 0 or 'max_execution_time' in code_only(sql):
+            return sql
+
+        # 在原始字串中定位最外層的 SELECT，字串常值不參與比對
+        parts = split_literals(sql)
+        masked = ''.join(part if i % 2 == 0 else ' ' * len(part) for i, part in enumerate(parts))
+        position = _main_select_position(masked)
+        if position is None:
+            return sql
+        end = position + len('select')
+        return f"{sql[:end]} /*+ MAX_EXECUTION_TIME({self.max_execution_ms}) */{sql[end:]}"
+
+    def timeout_error(self, error: Exception) -> Optional[QueryRejected]:
+        """Translate a server-side execution timeout into an actionable error."""
+        args = getattr(error, 'args', None)
+        # MySQL 回傳錯誤碼 3024；內嵌 SQLite 的逾時中斷回傳 "interrupted"
+        if args and (args[0] == QUERY_TIMEOUT_ERROR or args[0] == 'interrupted'):
+            return QueryRejected(
+                f"The query exceeded the {self.max_execution_ms} ms execution time limit.",
+                "Use a cheaper query: a narrower Date range, fewer joins, or an aggregate instead of raw rows.",
+                kind="QUERY_TIMEOUT"
+            )
+        return None
@@ -0,0 +1,276 @@
+"""Monthly RANGE partitions of sales on Date, and partition pruning checks.
+
+Usage:
+    python -m tools.sql_partitions list
+    python -m tools.sql_partitions maintain [--months-ahead 3] [--drop-before 2023-01-01]
+
+init.sql creates sales with one partition per month plus p_before and
+p_future catch-alls. ``maintain`` splits p_future so the next months always
+have their own partition, and optionally drops partitions older than a
+retention date (the rollup tables keep their aggregates).
+
+Pruning only happens when the optimizer sees a range on Date itself.
+YEAR(Date) = 2023 or DATE_FORMAT(Date, '%Y-%m') = '2023-03' hide the column
+inside a function, so ``add_date_range`` adds the equivalent
+``Date BETWEEN ... AND ...`` to such queries, and ``pruning_note`` warns
+the agent when EXPLAIN shows a date-filtered query still reading every
+partition.
+"""
+import argparse
+import calendar
+import datetime
+import os
+import re
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from tools.sql_utils import code_only, normalize_sql, split_literals
+
+SQL_DATE_PRUNING = os.getenv('SQL_DATE_PRUNING', '1') == '1'
+SQL_PARTITION_MONTHS_AHEAD = int(os.getenv('SQL_PARTITION_MONTHS_AHEAD', '3'))
+
+PARTITIONED_TABLE = 'sales'
+# MySQL TO_DAYS() 與 Python date.toordinal() 相差 365 天
+_TO_DAYS_OFFSET = 365
+
+_DATE_COLUMN = r"(?:(\w+)\.)?`?date`?"
+_YEAR = re.compile(r"\byear\s*\(\s*" + _DATE_COLUMN + r"\s*\)\s*(=|between|in)\s*"
+                   r"(\d{4}(?:\s*and\s*\d{4})?|\(\s*\d{4}(?:\s*,\s*\d{4})*\s*\))")
+_MONTH = re.compile(r"\bmonth\s*\(\s*" + _DATE_COLUMN + r"\s*\)\s*=\s*(\d{1,2})\b")
+_QUARTER = re.compile(r"\bquarter\s*\(\s*" + _DATE_COLUMN + r"\s*\)\s*=\s*([1-4])\b")
+_FORMATTED = re.compile(r"\bdate_format\s*\(\s*" + _DATE_COLUMN +
+                        r"\s*,\s*'(%Y-%m|%Y)'\s*\)\s*=\s*'(\d{4})(?:-(\d{2}))?'")
+_LIKE = re.compile(r"(?<![\w(])" + _DATE_COLUMN + r"\s+like\s+'(\d{4})(?:-(\d{2}))?-?%'")
+_DIRECT_RANGE = re.compile(r"(?<![\w(])" + _DATE_COLUMN + r"\s*(?:=|<|>|<=|>=|between)\s*'")
+
+
+def to_days(date: datetime.date) -> int:
+    return date.toordinal() + _TO_DAYS_OFFSET
+
+
+def from_days(days: int) -> datetime.date:
+    return datetime.date.fromordinal(days - _TO_DAYS_OFFSET)
+
+
+def add_months(date: datetime.date, months: int) -> datetime.date:
+    month = date.month - 1 + months
+    return datetime.date(date.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(month: datetime.date) -> str:
+    return f"p{month.year}{month.month:02d}"
+
+
+def partition_clauses(first_month: datetime.date, months: int) -> List[str]:
+    """PARTITION clauses for ``months`` monthly partitions starting at ``first_month``."""
+    clauses = []
+    for i in range(months):
+        month = add_months(first_month, i)
+        clauses.append(f"PARTITION {partition_name(month)} VALUES LESS THAN "
+                       f"(TO_DAYS('{add_months(month, 1).isoformat()}'))")
+    return clauses
+
+
+def _where_clause(code: str) -> Optional[str]:
+    match = re.search(r"\bwhere\b(.*?)(?=\bgroup\s+by\b|\border\s+by\b|\bhaving\b|\blimit\b|$)", code)
+    return match.group(1) if match else None
+
+
+def date_bounds(sql: str) -> Optional[Tuple[datetime.date, datetime.date, Optional[str]]]:
+    """``(first_day, last_day, qualifier)`` implied by function filters on
+    sales.Date, or None when the query is not a simple single-table SELECT
+    with such a filter, or already has a direct range on Date."""
+    code = code_only(sql)
+    if not code.startswith('select') or len(re.findall(r"\bselect\b", code)) != 1:
+        return None
+    if re.search(r"\bjoin\b|\bunion\b", code):
+        return None
+    table = re.search(r"\bfrom\s+`?(\w+)`?(?:\s+(?:as\s+)?(\w+))?", code)
+    if not table or table.group(1) != PARTITIONED_TABLE or ',' in code.split(' from ', 1)[-1].split(' where ')[0]:
+        return None
+    where_code = _where_clause(code)
+    # OR 會讓追加的日期範圍改變語意，這類查詢不處理
+    if where_code is None or re.search(r"\bor\b|\bnot\b", where_code):
+        return None
+
+    where = _where_clause(normalize_sql(sql)) or ''
+    if _DIRECT_RANGE.search(where):
+        return None
+
+    qualifier = None
+    first_year = last_year = None
+    month_range = None
+    year = _YEAR.search(where)
+    if year:
+        qualifier = year.group(1)
+        years = [int(y) for y in re.findall(r"\d{4}", year.group(3))]
+        first_year, last_year = min(years), max(years)
+    month = _MONTH.search(where)
+    if month and 1 <= int(month.group(2)) <= 12:
+        month_range = (int(month.group(2)), int(month.group(2)))
+    quarter = _QUARTER.search(where)
+    if quarter:
+        q = int(quarter.group(2))
+        month_range = (3 * q - 2, 3 * q)
+    for pattern in (_FORMATTED, _LIKE):
+        found = pattern.search(where)
+        if found:
+            qualifier = found.group(1)
+            groups = found.groups()
+            first_year = last_year = int(groups[-2])
+            if groups[-1]:
+                month_range = (int(groups[-1]), int(groups[-1]))
+
+    if first_year is None:
+        return None
+    if month_range and first_year == last_year:
+        first = datetime.date(first_year, month_range[0], 1)
+        last_month = month_range[1]
+        last = datetime.date(last_year, last_month, calendar.monthrange(last_year, last_month)[1])
+    else:
+        first = datetime.date(first_year, 1, 1)
+        last = datetime.date(last_year, 12, 31)
+    return first, last, qualifier
+
+
+def add_date_range(sql: str) -> str:
+    """Add ``Date BETWEEN first AND last`` next to function filters on Date so
+    the optimizer can prune partitions (and use an index on Date)."""
+    bounds = date_bounds(sql)
+    if bounds is None:
+        return sql
+    first, last, qualifier = bounds
+    column = f"{qualifier}.Date" if qualifier else "Date"
+
+    parts = split_literals(sql)
+    masked = ''.join(part if i % 2 == 0 else ' ' * len(part) for i, part in enumerate(parts))
+    where = re.search(r"\bwhere\b", masked, re.I)
+    if where is None:
+        return sql
+    end = where.end()
+    return f"{sql[:end]} {column} BETWEEN '{first.isoformat()}' AND '{last.isoformat()}' AND{sql[end:]}"
+
+
+class PartitionManager:
+    """Reads and maintains the monthly partitions of sales."""
+
+    def __init__(self, table: str = PARTITIONED_TABLE, cache_seconds: float = 300):
+        self.table = table
+        self.cache_seconds = cache_seconds
+        self._count = None
+        self._count_at = 0.0
+        self._lock = threading.Lock()
+
+    def partitions(self, cursor) -> List[dict]:
+        cursor.execute(
+            "SELECT PARTITION_NAME AS name, PARTITION_DESCRIPTION AS bound, TABLE_ROWS AS row_estimate "
+            "FROM INFORMATION_SCHEMA.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION",
+            (self.table,)
+        )
+        return cursor.fetchall()
+
+    def partition_count(self, cursor) -> int:
+        with self._lock:
+            if self._count is None or time.monotonic() - self._count_at > self.cache_seconds:
+                self._count = len(self.partitions(cursor))
+                self._count_at = time.monotonic()
+            return self._count
+
+    def ensure_future(self, connection, months_ahead: int = SQL_PARTITION_MONTHS_AHEAD,
+                      today: Optional[datetime.date] = None) -> List[str]:
+        """Split p_future so every month up to ``months_ahead`` from today has
+        its own partition. Returns the names of the partitions added."""
+        today = today or datetime.date.today()
+        with connection.cursor() as cursor:
+            partitions = self.partitions(cursor)
+            bounds = [int(p['bound']) for p in partitions if str(p['bound']).isdigit()]
+            if not partitions or not bounds or partitions[-1]['bound'] != 'MAXVALUE':
+                return []
+            next_month = from_days(max(bounds))
+            target = add_months(today.replace(day=1), months_ahead + 1)
+            months = (target.year - next_month.year) * 12 + target.month - next_month.month
+            if months <= 0:
+                return []
+            clauses = partition_clauses(next_month, months)
+            future = partitions[-1]['name']
+            cursor.execute(
+                f"ALTER TABLE {self.table} REORGANIZE PARTITION {future} INTO ("
+                + ", ".join(clauses + [f"PARTITION {future} VALUES LESS THAN MAXVALUE"]) + ")"
+            )
+        self._count = None
+        return [clause.split()[1] for clause in clauses]
+
+    def drop_before(self, connection, cutoff: datetime.date) -> List[str]:
+        """Drop partitions holding only rows dated before ``cutoff``."""
+        with connection.cursor() as cursor:
+            partitions = self.partitions(cursor)
+            old = [p['name'] for p in partitions
+                   if str(p['bound']).isdigit() and int(p['bound']) <= to_days(cutoff)]
+            # 至少保留一個有上限的分區，REORGANIZE 需要它決定下一個月份
+            if len(old) >= len(partitions) - 1:
+                old = old[:-1]
+            if old:
+                cursor.execute(f"ALTER TABLE {self.table} DROP PARTITION {', '.join(old)}")
+        self._count = None
+        return old
+
+    def pruning_note(self, cursor, sql: str, plan: list) -> Optional[str]:
+        """Note for the agent when a date-filtered query reads every partition."""
+        where = _where_clause(normalize_sql(sql)) or ''
+        if not re.search(r"(?<![\w])`?date`?\b", where):
+            return None
+        steps = [s for s in plan if s.get('table') and s.get('partitions')]
+        if not steps:
+            return None
+        total = self.partition_count(cursor)
+        for step in steps:
+            if total > 1 and len(str(step['partitions']).split(',')) >= total:
+                return (f"The query reads all {total} monthly partitions of {self.table}. "
+                        "Filter Date with a range, e.g. Date >= '2023-03-01' AND Date < '2023-04-01', "
+                        "instead of wrapping Date in a function, so only the needed partitions are read.")
+        return None
+
+
+_partition_manager = PartitionManager()
+
+
+def get_partition_manager() -> PartitionManager:
+    return _partition_manager
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="List or maintain the monthly partitions of sales.")
+    parser.add_argument('command', choices=['list', 'maintain'])
+    parser.add_argument('--months-ahead', type=int, default=SQL_PARTITION_MONTHS_AHEAD)
+    parser.add_argument('--drop-before', type=datetime.date.fromisoformat, default=None,
+                        help="Drop partitions with only rows before this date.")
+    args = parser.parse_args(argv)
+
+    from tools.db import get_pool
+
+    pool = get_pool()
+    if not pool:
+        raise SystemExit("CLEARDB_DATABASE_URL is not set")
+    if pool.dialect != 'mysql':
+        raise SystemExit("Partitioning is only available on MySQL")
+
+    manager = get_partition_manager()
+    with pool.connection() as connection:
+        if args.command == 'maintain':
+            added = manager.ensure_future(connection, args.months_ahead)
+            print(f"Added partitions: {', '.join(added) or 'none'}")
+            if args.drop_before:
+                dropped = manager.drop_before(connection, args.drop_before)
+                print(f"Dropped partitions: {', '.join(dropped) or 'none'}")
+        with connection.cursor() as cursor:
+            for partition in manager.partitions(cursor):
+                bound = partition['bound']
+                bound = from_days(int(bound)).isoformat() if str(bound).isdigit() else bound
+                print(f"{partition['name']:<10} < {bound:<10} ~{partition['row_estimate']} rows")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+import csv
+import datetime
+import io
+import json
+import os
+import random
+import threading
+from decimal import Decimal
+from typing import Iterable, Optional
+
+from tools.tokens import count_tokens
+
+# 超過此數量的相異值不再逐一追蹤，只回報下限
+DISTINCT_TRACK_LIMIT = 50
+# 計算編碼前後 token 數的結果比例；0 表示停用，1 表示每個結果都計算
+SQL_ENCODING_STATS_SAMPLE = float(os.getenv('SQL_ENCODING_STATS_SAMPLE', '0.01'))
+
+
+class ColumnStats:
+    """Single-pass statistics for one result column."""
+
+    def __init__(self):
+        self.count = 0
+        self.nulls = 0
+        self.min = None
+        self.max = None
+        self.sum = None
+        self._distinct = set()
+        self._distinct_overflow = False
+
+    def add(self, value) -> None:
+        if value is None:
+            self.nulls += 1
+            return
+        self.count += 1
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+            self.sum = value if self.sum is None else self.sum + value
+        if not self._distinct_overflow:
+            self._distinct.add(value)
+            if len(self._distinct) > DISTINCT_TRACK_LIMIT:
+                self._distinct_overflow = True
+                self._distinct.clear()
+
+    def summary(self) -> dict:
+        summary = {'count': self.count, 'nulls': self.nulls,
+                   'min': self.min, 'max': self.max}
+        if self.sum is not None:
+            summary['sum'] = self.sum
+            summary['avg'] = round(float(self.sum) / self.count, 4) if self.count else None
+        if self._distinct_overflow:
+            summary['distinct'] = f">{DISTINCT_TRACK_LIMIT}"
+        else:
+            summary['distinct'] = len(self._distinct)
+        return summary
+
+
+def summarize_rows(rows: Iterable[dict], max_rows: int):
+    """Consume ``rows`` keeping at most ``max_rows`` of them in memory.
+
+    Returns the rows as a plain list when everything fit, otherwise a dict
+    with the first ``max_rows`` rows, the total row count and per-column
+    statistics computed over the full result.
+    """
+    kept = []
+    stats = None
+    total = 0
+    for row in rows:
+        if stats is None:
+            stats = {column: ColumnStats() for column in row}
+        for column, value in row.items():
+            stats[column].add(value)
+        if total < max_rows:
+            kept.append(row)
+        total += 1
+
+    if total <= max_rows:
+        return kept
+
+    return {
+        'rows': kept,
+        'truncated': True,
+        'returned_rows': len(kept),
+        'total_rows': total,
+        'column_stats': {column: s.summary() for column, s in stats.items()},
+        'note': (f"Only the first {len(kept)} of {total} rows are shown. "
+                 "Use WHERE, GROUP BY or LIMIT to narrow the result."),
+    }
+
+
+def add_note(result, note: str):
+    """Attach a note for the agent to a row list or a truncated result."""
+    if isinstance(result, dict):
+        existing = result.get('note')
+        return {**result, 'note': f"{note} {existing}" if existing else note}
+    return {'rows': result, 'note': note}
+
+
+def normalize_value(value):
+    """Plain JSON-friendly form of a value returned by the database driver."""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return str(value)
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return value
+
+
+def _columnar(rows: list) -> tuple:
+    columns = list(rows[0].keys()) if rows else []
+    data = [[normalize_value(row[column]) for column in columns] for row in rows]
+    return columns, data
+
+
+def _csv(columns: list, data: list) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(columns)
+    writer.writerows(data)
+    return buffer.getvalue().rstrip('\n')
+
+
+def encode_result(result, fmt: str = 'json'):
+    """Encode a query result for the agent.
+
+    ``repr`` returns the result unchanged. ``json`` returns one header and
+    row arrays, ``csv`` returns a header line plus one line per row. Decimals
+    and dates are normalized to plain numbers and ISO strings in both, and a
+    truncated result keeps its summary fields.
+    """
+    if fmt == 'repr' or isinstance(result, str):
+        return result
+
+    summary = {}
+    rows = result
+    if isinstance(result, dict):
+        rows = result['rows']
+        summary = {key: value for key, value in result.items() if key != 'rows'}
+    columns, data = _columnar(list(rows))
+
+    if fmt == 'csv':
+        text = _csv(columns, data)
+        if summary:
+            text += '\n# ' + json.dumps(summary, ensure_ascii=False,
+                                        separators=(',', ':'), default=normalize_value)
+        return text
+
+    payload = {'columns': columns, 'rows': data}
+    payload.update(summary)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':'),
+                      default=normalize_value)
+
+
+class EncodingStats:
+    """Running totals of result size before and after encoding.
+
+    Tokenizing both forms costs more than encoding itself, so only a
+    ``sample_rate`` fraction of results is measured; ``results`` counts
+    every result and ``sampled`` the measured ones the totals cover.
+    """
+
+    def __init__(self, sample_rate: float = SQL_ENCODING_STATS_SAMPLE):
+        self.sample_rate = sample_rate
+        self.results = 0
+        self.sampled = 0
+        self.raw_chars = 0
+        self.encoded_chars = 0
+        self.raw_tokens = 0
+        self.encoded_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, raw, encoded) -> Optional[dict]:
+        """Measure one result if it falls in the sample; None otherwise."""
+        with self._lock:
+            self.results += 1
+        if self.sample_rate <= 0 or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            return None
+        raw_text, encoded_text = str(raw), str(encoded)
+        sample = {
+            'raw_chars': len(raw_text),
+            'encoded_chars': len(encoded_text),
+            'raw_tokens': count_tokens(raw_text),
+            'encoded_tokens': count_tokens(encoded_text),
+        }
+        with self._lock:
+            self.sampled += 1
+            self.raw_chars += sample['raw_chars']
+            self.encoded_chars += sample['encoded_chars']
+            self.raw_tokens += sample['raw_tokens']
+            self.encoded_tokens += sample['encoded_tokens']
+        return sample
+
+    def stats(self) -> dict:
+        with self._lock:
+            saved = self.raw_tokens - self.encoded_tokens
+            return {
+                'results': self.results,
+                'sampled': self.sampled,
+                'raw_chars': self.raw_chars,
+                'encoded_chars': self.encoded_chars,
+                'raw_tokens': self.raw_tokens,
+                'encoded_tokens': self.encoded_tokens,
+                'saved_tokens': saved,
+                'saved_ratio': round(saved / self.raw_tokens, 4) if self.raw_tokens else 0.0,
+            }
+
+
+encoding_stats = EncodingStats()
@@ -0,0 +1,311 @@
+import logging
+import os
+import re
+import threading
+import time
+from typing import List, Optional
+
+import pymysql
+from pydantic import BaseModel
+
+from tools.logging_setup import get_logger, log_event
+from tools.sql_aggregate import (NOT_NULL_COLUMNS, AggregateQuery, Dimension, Measure, parse_aggregate,
+                                 render_literal)
+
+SQL_ROLLUPS = os.getenv('SQL_ROLLUPS', '1') == '1'
+# 背景刷新彙總表的間隔秒數；0 表示只由 python -m tools.sql_rollup（例如排程）刷新
+SQL_ROLLUP_REFRESH_SECONDS = float(os.getenv('SQL_ROLLUP_REFRESH_SECONDS', '60'))
+
+logger = get_logger('sql_rollup')
+
+# 月粒度彙總表能回答的 DATE_FORMAT 格式碼
+MONTH_FORMAT_CODES = set('YymcMb%')
+
+
+class Rollup(BaseModel):
+    """A pre-aggregated copy of sales at a given time grain."""
+    table: str
+    time_column: str
+    time_expr: str
+    grain: str
+
+    def refresh_sql(self) -> str:
+        # 維度欄位是主鍵的一部分，NULL 以空字串儲存
+        return f"""
+            INSERT INTO {self.table}
+                ({self.time_column}, Region, City, Category, Product,
+                 Quantity_Sum, Total_Price_Sum, Row_Count)
+            SELECT {self.time_expr}, IFNULL(Region, ''), IFNULL(City, ''),
+                   IFNULL(Category, ''), IFNULL(Product, ''),
+                   COALESCE(SUM(Quantity), 0), COALESCE(SUM(Total_Price), 0), COUNT(*)
+            FROM sales
+            WHERE ID > %s AND ID <= %s AND Date IS NOT NULL
+            GROUP BY 1, 2, 3, 4, 5
+            ON DUPLICATE KEY UPDATE
+                Quantity_Sum = Quantity_Sum + VALUES(Quantity_Sum),
+                Total_Price_Sum = Total_Price_Sum + VALUES(Total_Price_Sum),
+                Row_Count = Row_Count + VALUES(Row_Count)
+        """
+
+
+# 依粒度由粗到細排列，優先使用最小的彙總表
+ROLLUPS = [
+    Rollup(table='sales_monthly', time_column='Month',
+           time_expr='DATE_SUB(Date, INTERVAL DAYOFMONTH(Date) - 1 DAY)', grain='month'),
+    Rollup(table='sales_daily', time_column='Date', time_expr='Date', grain='day'),
+]
+
+
+def _supports(rollup: Rollup, dimension: Dimension) -> bool:
+    if dimension.column != 'Date' or rollup.grain == 'day':
+        return True
+    if dimension.func in ('year', 'month', 'quarter'):
+        return True
+    if dimension.func == 'date_format':
+        return set(re.findall(r"%(.)", dimension.arg)) <= MONTH_FORMAT_CODES
+    return False
+
+
+def _dimensions(query: AggregateQuery) -> List[Dimension]:
+    dimensions = list(query.group_by)
+    dimensions += [c.dimension for c in query.conditions]
+    dimensions += [i.dimension for i in query.items if i.dimension]
+    dimensions += [o.dimension for o in query.order_by if o.dimension]
+    return dimensions
+
+
+def _quote_label(label: str) -> str:
+    return '`' + label.replace('`', '``') + '`'
+
+
+class RollupManager:
+    """Keeps the sales rollup tables up to date and routes matching aggregate
+    queries to them.
+
+    Refresh is incremental: rows with an ID above the watermark stored in
+    rollup_state are folded into each rollup, which assumes sales IDs only
+    grow. Updates or deletes of existing sales rows need ``rebuild``.
+
+    Refreshing never happens inside a user's query: it runs on a background
+    thread (``start_rollup_refresher``) or from the command line, and a
+    query is routed only when its rollup already covers every sales row.
+    """
+
+    def __init__(self, rollups: List[Rollup] = ROLLUPS):
+        self.rollups = rollups
+        self.enabled = True
+        self.routed = 0
+        self.stale = 0
+        self._watermark = None
+        # refresh 由 ensure_fresh 在持有鎖時呼叫，需可重入
+        self._lock = threading.RLock()
+
+    def choose(self, query: AggregateQuery) -> Optional[Rollup]:
+        if query.table != 'sales':
+            return None
+        # COUNT(欄位) 與 AVG 不計入 NULL，彙總表只有總列數，
+        # 只能回答不可為 NULL 的欄位的 COUNT，AVG 一律查原表
+        measures = [i.measure for i in query.items if i.measure] + [o.measure for o in query.order_by if o.measure]
+        if any(m.func == 'avg' or (m.func == 'count' and m.column not in (None, *NOT_NULL_COLUMNS))
+               for m in measures):
+            return None
+        dimensions = _dimensions(query)
+        for rollup in self.rollups:
+            if all(_supports(rollup, d) for d in dimensions):
+                return rollup
+        return None
+
+    def rewrite(self, sql: str) -> Optional[str]:
+        """SQL answering ``sql`` from a rollup table, or None if no rollup can."""
+        query = parse_aggregate(sql)
+        if query is None:
+            return None
+        rollup = self.choose(query)
+        if rollup is None:
+            return None
+
+        def dimension(d: Dimension) -> str:
+            column = rollup.time_column if d.column == 'Date' else d.column
+            if d.func == 'date_format':
+                return f"DATE_FORMAT({column}, {render_literal(d.arg)})"
+            if d.func:
+                return f"{d.func.upper()}({column})"
+            return column
+
+        def measure(m: Measure) -> str:
+            if m.func == 'count':
+                return "COALESCE(SUM(Row_Count), 0)"
+            return f"SUM({m.column}_Sum)"
+
+        def condition(c) -> str:
+            left = dimension(c.dimension)
+            values = [render_literal(v) for v in c.values]
+            if c.op == 'between':
+                return f"{left} BETWEEN {values[0]} AND {values[1]}"
+            if c.op == 'in':
+                return f"{left} IN ({', '.join(values)})"
+            if c.op == 'like':
+                return f"{left} LIKE {values[0]}"
+            return f"{left} {c.op} {values[0]}"
+
+        select = ', '.join(
+            f"{measure(i.measure) if i.measure else dimension(i.dimension)} AS {_quote_label(i.label)}"
+            for i in query.items
+        )
+        sql = f"SELECT {select} FROM {rollup.table}"
+        if query.conditions:
+            sql += " WHERE " + " AND ".join(condition(c) for c in query.conditions)
+        if query.group_by:
+            sql += " GROUP BY " + ", ".join(dimension(d) for d in query.group_by)
+        if query.order_by:
+            order = []
+            for o in query.order_by:
+                if o.label is not None:
+                    target = _quote_label(o.label)
+                elif o.measure:
+                    target = measure(o.measure)
+                else:
+                    target = dimension(o.dimension)
+                order.append(target + (" DESC" if o.descending else ""))
+            sql += " ORDER BY " + ", ".join(order)
+        if query.limit is not None:
+            sql += f" LIMIT {query.limit}"
+        return sql
+
+    def route(self, connection, sql: str) -> str:
+        """Return the rollup rewrite of ``sql`` when that rollup is current,
+        otherwise ``sql`` itself."""
+        if not self.enabled:
+            return sql
+        query = parse_aggregate(sql)
+        rollup = self.choose(query) if query else None
+        if rollup is None:
+            return sql
+        try:
+            fresh = self.is_fresh(connection, rollup)
+        except pymysql.err.ProgrammingError:
+            # 彙總表尚未建立（舊版 init.sql），停用改寫
+            self.enabled = False
+            return sql
+        if not fresh:
+            # 尚未刷新的新資料只在 sales 中，直接查詢原表
+            self.stale += 1
+            return sql
+        self.routed += 1
+        return self.rewrite(sql)
+
+    def is_fresh(self, connection, rollup: Rollup) -> bool:
+        """True if ``rollup`` already includes every sales row (two primary-key lookups)."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT (SELECT MAX(ID) FROM sales) AS max_id, "
+                "(SELECT last_id FROM rollup_state WHERE name = %s) AS last_id",
+                (rollup.table,)
+            )
+            row = cursor.fetchone()
+        return row['max_id'] is None or (row['last_id'] is not None and row['last_id'] >= row['max_id'])
+
+    def ensure_fresh(self, connection) -> None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT MAX(ID) AS max_id FROM sales")
+            latest = cursor.fetchone()['max_id']
+        if latest is None or latest == self._watermark:
+            return
+        with self._lock:
+            if latest != self._watermark:
+                self.refresh(connection, latest)
+
+    def refresh(self, connection, upper: str) -> None:
+        """Fold sales rows with last_id < ID <= upper into every rollup."""
+        with self._lock:
+            connection.begin()
+            try:
+                with connection.cursor() as cursor:
+                    for rollup in self.rollups:
+                        # FOR UPDATE 讓多個 worker 同時刷新時依序進行，避免重複累加
+                        cursor.execute(
+                            "SELECT last_id FROM rollup_state WHERE name = %s FOR UPDATE",
+                            (rollup.table,)
+                        )
+                        row = cursor.fetchone()
+                        last_id = row['last_id'] if row else ''
+                        if last_id >= upper:
+                            continue
+                        cursor.execute(rollup.refresh_sql(), (last_id, upper))
+                        cursor.execute(
+                            "INSERT INTO rollup_state (name, last_id) VALUES (%s, %s) "
+                            "ON DUPLICATE KEY UPDATE last_id = VALUES(last_id)",
+                            (rollup.table, upper)
+                        )
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            self._watermark = upper
+
+    def rebuild(self, connection) -> None:
+        """Recompute every rollup from scratch."""
+        with self._lock:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT MAX(ID) AS max_id FROM sales")
+                latest = cursor.fetchone()['max_id']
+                for rollup in self.rollups:
+                    cursor.execute(f"DELETE FROM {rollup.table}")
+                    cursor.execute("DELETE FROM rollup_state WHERE name = %s", (rollup.table,))
+            connection.commit()
+            self._watermark = None
+            if latest is not None:
+                self.refresh(connection, latest)
+
+
+_rollup_manager = RollupManager()
+_refresher: Optional[threading.Thread] = None
+
+
+def get_rollup_manager() -> Optional[RollupManager]:
+    return _rollup_manager if SQL_ROLLUPS else None
+
+
+def _refresh_loop(pool, interval: float) -> None:
+    while _rollup_manager.enabled:
+        try:
+            with pool.connection() as connection:
+                _rollup_manager.ensure_fresh(connection)
+        except pymysql.err.ProgrammingError as e:
+            log_event(logger, logging.WARNING, 'rollup.disabled', error=str(e))
+            _rollup_manager.enabled = False
+            return
+        except Exception as e:
+            log_event(logger, logging.WARNING, 'rollup.refresh_failed', error=str(e))
+        time.sleep(interval)
+
+
+def start_rollup_refresher(interval: float = SQL_ROLLUP_REFRESH_SECONDS) -> Optional[threading.Thread]:
+    """Refresh the rollups every ``interval`` seconds on a daemon thread (MySQL only)."""
+    global _refresher
+    if not SQL_ROLLUPS or interval <= 0 or _refresher is not None:
+        return _refresher
+    from tools.db import get_pool
+
+    pool = get_pool()
+    if not pool or pool.dialect != 'mysql':
+        return None
+    _refresher = threading.Thread(target=_refresh_loop, args=(pool, interval), name='rollup-refresh',
+                                  daemon=True)
+    _refresher.start()
+    return _refresher
+
+
+if __name__ == '__main__':
+    import sys
+    from tools.db import get_pool
+
+    pool = get_pool()
+    if not pool:
+        sys.exit("CLEARDB_DATABASE_URL is not set")
+    with pool.connection() as connection:
+        if sys.argv[1:] == ['rebuild']:
+            _rollup_manager.rebuild(connection)
+        else:
+            _rollup_manager.ensure_fresh(connection)
+    print("Rollups refreshed")
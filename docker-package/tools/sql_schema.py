@@ -0,0 +1,223 @@
+import os
+import threading
+import time
+from typing import Dict, Optional, Type
+from pydantic import BaseModel, Field
+
+from tools.db import get_pool
+from tools.default_tool import DefaultTool
+from tools.sql_guard import QUERY_TIMEOUT_ERROR
+
+SCHEMA_CACHE_TTL = float(os.getenv('SCHEMA_CACHE_TTL', '3600'))
+# 相異值不超過此數量的文字欄位會附上所有值
+SCHEMA_MAX_DISTINCT = int(os.getenv('SCHEMA_MAX_DISTINCT', '20'))
+# 取相異值與日期範圍的查詢在 MySQL 上的執行時間上限（毫秒），逾時則略過該欄位
+SCHEMA_MAX_EXECUTION_MS = int(os.getenv('SCHEMA_MAX_EXECUTION_MS', '2000'))
+
+TEXT_TYPES = ('char', 'varchar', 'enum', 'set', 'tinytext', 'text')
+RANGE_TYPES = ('date', 'datetime', 'timestamp')
+
+
+def quote_identifier(name: str) -> str:
+    return '`' + name.replace('`', '``') + '`'
+
+
+class SchemaIntrospector:
+    """Reads table definitions from INFORMATION_SCHEMA (PRAGMA table_info on
+    the embedded SQLite backend) and caches them.
+
+    Low-cardinality text columns are described with their distinct values and
+    date columns with their range, so the agent can write correct filters
+    without the schema being hard-coded in the system prompt. These probes
+    run against the live table, so on MySQL each one carries a
+    MAX_EXECUTION_TIME hint, and only one thread builds a given entry while
+    the others wait for its result.
+    """
+
+    def __init__(self, ttl: float = SCHEMA_CACHE_TTL, max_distinct: int = SCHEMA_MAX_DISTINCT,
+                 max_execution_ms: int = SCHEMA_MAX_EXECUTION_MS):
+        self.ttl = ttl
+        self.max_distinct = max_distinct
+        self.max_execution_ms = max_execution_ms
+        self._cache = {}
+        self._building: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: str):
+        entry = self._cache.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry
+        return None
+
+    def _cached(self, key: str, build):
+        with self._lock:
+            entry = self._lookup(key)
+            if entry:
+                return entry[1]
+            building = self._building.setdefault(key, threading.Lock())
+        with building:
+            with self._lock:
+                # 等待期間其他執行緒可能已經建好
+                entry = self._lookup(key)
+            if entry:
+                return entry[1]
+            try:
+                value = build()
+                if value is not None:
+                    with self._lock:
+                        self._cache[key] = (time.monotonic() + self.ttl, value)
+            finally:
+                with self._lock:
+                    if self._building.get(key) is building:
+                        del self._building[key]
+        return value
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def list_tables(self, connection, dialect: str = 'mysql') -> list:
+        def build():
+            with connection.cursor() as cursor:
+                if dialect == 'sqlite':
+                    cursor.execute(
+                        "SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name"
+                    )
+                    tables = cursor.fetchall()
+                    for table in tables:
+                        cursor.execute(f"SELECT COUNT(*) AS n FROM {quote_identifier(table['name'])}")
+                        table['row_estimate'] = cursor.fetchone()['n']
+                    return tables
+                cursor.execute(
+                    "SELECT TABLE_NAME AS name, TABLE_ROWS AS row_estimate "
+                    "FROM INFORMATION_SCHEMA.TABLES "
+                    "WHERE TABLE_SCHEMA = DATABASE() ORDER BY TABLE_NAME"
+                )
+                return cursor.fetchall()
+        return self._cached('__tables__', build)
+
+    def describe(self, connection, table: str, dialect: str = 'mysql') -> Optional[dict]:
+        return self._cached(table, lambda: self._describe(connection, table, dialect))
+
+    def _columns(self, cursor, table: str, dialect: str) -> list:
+        if dialect == 'sqlite':
+            cursor.execute(f"PRAGMA table_info({quote_identifier(table)})")
+            return [{
+                'name': row['name'],
+                'type': row['type'].lower(),
+                'data_type': row['type'].split('(')[0].lower(),
+                'key': 'PRI' if row['pk'] else '',
+                'nullable': 'NO' if row['notnull'] else 'YES',
+            } for row in cursor.fetchall()]
+
+        cursor.execute(
+            "SELECT COLUMN_NAME AS name, COLUMN_TYPE AS type, DATA_TYPE AS data_type, "
+            "COLUMN_KEY AS `key`, IS_NULLABLE AS nullable "
+            "FROM INFORMATION_SCHEMA.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s "
+            "ORDER BY ORDINAL_POSITION",
+            (table,)
+        )
+        return cursor.fetchall()
+
+    def _probe(self, cursor, dialect: str, sql: str) -> Optional[list]:
+        """Rows of a value or range probe, or None if it hit the time limit."""
+        select = "SELECT"
+        if dialect == 'mysql' and self.max_execution_ms > 0:
+            select += f" /*+ MAX_EXECUTION_TIME({self.max_execution_ms}) */"
+        try:
+            cursor.execute(select + sql)
+        except Exception as e:
+            if getattr(e, 'args', None) and e.args[0] == QUERY_TIMEOUT_ERROR:
+                return None
+            raise
+        return cursor.fetchall()
+
+    def _describe(self, connection, table: str, dialect: str) -> Optional[dict]:
+        with connection.cursor() as cursor:
+            columns = self._columns(cursor, table, dialect)
+            if not columns:
+                return None
+
+            for column in columns:
+                name = quote_identifier(column['name'])
+                if column['data_type'] in TEXT_TYPES and column['key'] != 'PRI':
+                    rows = self._probe(
+                        cursor, dialect,
+                        f" DISTINCT {name} AS v FROM {quote_identifier(table)} "
+                        f"WHERE {name} IS NOT NULL LIMIT {self.max_distinct + 1}"
+                    )
+                    values = [row['v'] for row in rows or ()]
+                    if rows is not None and len(values) <= self.max_distinct:
+                        column['values'] = sorted(values)
+                elif column['data_type'] in RANGE_TYPES:
+                    rows = self._probe(
+                        cursor, dialect, f" MIN({name}) AS lo, MAX({name}) AS hi FROM {quote_identifier(table)}"
+                    )
+                    if rows:
+                        column['range'] = (rows[0]['lo'], rows[0]['hi'])
+
+        return {'table': table, 'columns': columns}
+
+
+def format_table(description: dict) -> str:
+    """Compact text form of a table description for the agent."""
+    lines = [f"Table {description['table']}:"]
+    for column in description['columns']:
+        line = f"- {column['name']} {column['type'].upper()}"
+        if column['key'] == 'PRI':
+            line += " PRIMARY KEY"
+        if 'values' in column:
+            line += " values: " + ", ".join(str(v) for v in column['values'])
+        if column.get('range') and column['range'][0] is not None:
+            lo, hi = column['range']
+            line += f" range: {lo} .. {hi}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+_introspector = SchemaIntrospector()
+
+
+def get_introspector() -> SchemaIntrospector:
+    return _introspector
+
+
+class DescribeTableInput(BaseModel):
+    """Input for describe_table."""
+
+    table_name: str = Field("",
+                            description="Name of the table to describe. Leave empty to list all tables.")
+
+
+class DescribeTableTool(DefaultTool):
+    name: str = "describe_table"
+    description: str = """
+            Returns the columns of a database table with their types, the possible values of
+            low-cardinality text columns and the range of date columns.
+            Call it before writing a SQL query against a table you have not described yet.
+            Call it with an empty table_name to list the available tables.
+            """
+
+    def _run(self, table_name: str = ""):
+        pool = get_pool()
+        if not pool:
+            return "Database URL not found in environment variables"
+
+        introspector = get_introspector()
+        try:
+            with pool.connection() as connection:
+                if not table_name.strip():
+                    tables = introspector.list_tables(connection, pool.dialect)
+                    return "Tables: " + ", ".join(
+                        f"{t['name']} (~{t['row_estimate']} rows)" for t in tables
+                    )
+                description = introspector.describe(connection, table_name.strip(), pool.dialect)
+            if description is None:
+                return f"Table '{table_name}' does not exist. Call describe_table with an empty table_name to list tables."
+            return format_table(description)
+
+        except Exception as e:
+            return f"Error describing table: {str(e)}"
+
+    args_schema: Optional[Type[BaseModel]] = DescribeTableInput
@@ -0,0 +1,324 @@
+"""Learned question -> SQL templates that let common questions skip the
+LLM's query-writing step.
+
+When a chat turn answers a question with a single successful
+execute_sql_query call, the question and the SQL are generalized together.
+Values that appear in both become slots: sales dimension values (大阪, 果物,
+...) matching a quoted literal, numbers matching a numeric literal, and
+English month names matching a month number. For example, "total sales in
+大阪 in march" and its SQL become the pattern "total sales in {s0} in {s1}"
+with a value slot and a month slot.
+
+Only self-contained questions are learned: the turn must open the
+conversation, and every literal in the SQL must come from a slot. A
+follow-up such as "what about march" leans on filters from earlier turns
+that the question does not state, so replaying its SQL for a new question
+would answer with the wrong filters. ``LIMIT``/``OFFSET`` counts are the
+only literals allowed to stay fixed. Questions without any slot (e.g.
+"yes") are not learned either.
+
+A later question that fully matches a pattern, with every slot value valid
+for its column, gets its SQL rendered from the template and run directly.
+A template whose SQL fails is dropped. Templates are kept in a JSON file so
+they survive restarts.
+"""
+import json
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from tools.sql_aggregate import render_literal
+from tools.sql_utils import is_read_only, split_literals
+
+SQL_TEMPLATES = os.getenv('SQL_TEMPLATES', '1') == '1'
+SQL_TEMPLATE_PATH = os.getenv('SQL_TEMPLATE_PATH', os.path.join('output', 'sql_templates.json'))
+SQL_TEMPLATE_MAX = int(os.getenv('SQL_TEMPLATE_MAX', '500'))
+
+SQL_TOOL_NAME = 'execute_sql_query'
+
+MONTHS = ['january', 'february', 'march', 'april', 'may', 'june', 'july',
+          'august', 'september', 'october', 'november', 'december']
+_MONTH_NAMES = {name: i for i, name in enumerate(MONTHS, 1)}
+_MONTH_NAMES.update({name[:3]: i for i, name in enumerate(MONTHS, 1) if name != 'may'})
+_MONTH_PATTERN = r"\b(" + "|".join(sorted(_MONTH_NAMES, key=len, reverse=True)) + r")\b"
+
+_SLOT_PATTERNS = {
+    'value': r".+?",
+    'number': r"[0-9]+",
+    'month': "|".join(sorted(_MONTH_NAMES, key=len, reverse=True)),
+}
+_SLOT_TOKEN = re.compile(r"\{(s\d+)\}")
+_NUMBER = re.compile(r"(?<![\w.])[0-9]+(?:\.[0-9]+)?(?![\w.])")
+_ROW_LIMIT = re.compile(r"\b(LIMIT\s+[0-9]+(\s*,\s*[0-9]+)?|OFFSET\s+[0-9]+)\b", re.IGNORECASE)
+_ERROR_RESULT = re.compile(r"^(Error|Database URL|[A-Z_]+:)")
+
+
+def normalize_question(question: str) -> str:
+    question = re.sub(r"\s+", ' ', question.strip().lower())
+    return question.rstrip('?？.。!！ ')
+
+
+def is_error_result(result) -> bool:
+    """True for the error strings SQLQueryTool returns instead of rows."""
+    return isinstance(result, str) and bool(_ERROR_RESULT.match(result))
+
+
+def _number_literal(number) -> re.Pattern:
+    return re.compile(r"(?<![\w.])" + re.escape(str(number)) + r"(?![\w.])")
+
+
+class Slot(BaseModel):
+    name: str
+    kind: str
+    column: Optional[str] = None
+
+
+class SQLTemplate(BaseModel):
+    pattern: str
+    slots: List[Slot]
+    sql: str
+    example: str
+    hits: int = 0
+    last_used: float = 0.0
+
+    def render(self, values: Dict[str, object]) -> str:
+        return _SLOT_TOKEN.sub(lambda m: render_literal(values[m.group(1)]), self.sql)
+
+
+class TemplateMatch(BaseModel):
+    template: SQLTemplate
+    sql: str
+
+
+def _slot_value(slot: Slot, text: str, domains: Dict[str, list]):
+    """Typed value of a matched slot, or None when it is not valid."""
+    if slot.kind == 'value':
+        # 問題已轉成小寫，比對時忽略大小寫並回傳資料庫中的原值
+        for value in domains.get(slot.column, ()):
+            if isinstance(value, str) and value.lower() == text:
+                return value
+        return None
+    if slot.kind == 'month':
+        return _MONTH_NAMES.get(text)
+    return int(text) if text.isdigit() else None
+
+
+def _unbound_literals(parts: list) -> bool:
+    """True if a string or numeric literal is left in the templated SQL."""
+    if any(not _SLOT_TOKEN.fullmatch(part) for part in parts[1::2]):
+        return True
+    code = _ROW_LIMIT.sub(' ', ''.join(parts[0::2]))
+    return bool(_NUMBER.search(code))
+
+
+def generalize(question: str, sql: str, domains: Dict[str, list]) -> Optional[SQLTemplate]:
+    """Turn a (question, SQL) pair into a template, or None if the SQL is not
+    a read-only query or not every literal in it comes from the question."""
+    if not is_read_only(sql):
+        return None
+    question = normalize_question(question)
+    parts = split_literals(sql.strip().rstrip(';'))
+    spans = []  # (start, end, kind, column, value)
+
+    def free(start: int, end: int) -> bool:
+        return all(end <= s or start >= e for s, e, *_ in spans)
+
+    # 維度值：最長的先比對，避免「東京」之類的子字串被重複認領
+    values = sorted(((v, c) for c, vs in domains.items() for v in vs if isinstance(v, str) and v),
+                    key=lambda item: len(item[0]), reverse=True)
+    for value, column in values:
+        literal = render_literal(value)
+        if literal not in parts[1::2]:
+            continue
+        start = question.find(value.lower())
+        if start >= 0 and free(start, start + len(value)):
+            spans.append((start, start + len(value), 'value', column, value))
+
+    code = ''.join(parts[0::2])
+    for match in re.finditer(_MONTH_PATTERN, question):
+        number = _MONTH_NAMES[match.group(1)]
+        if _number_literal(number).search(code) and free(*match.span()):
+            spans.append((*match.span(), 'month', None, number))
+    for match in re.finditer(r"(?<![0-9.])[0-9]+(?![0-9.])", question):
+        if _number_literal(match.group()).search(code) and free(*match.span()):
+            spans.append((*match.span(), 'number', None, int(match.group())))
+    spans.sort()
+    numbers = [value for _, _, kind, _, value in spans if kind != 'value']
+    if len(numbers) != len(set(numbers)):
+        # 同一個數字對應兩個槽位時無法判斷 SQL 中哪個是哪個
+        return None
+
+    pattern, slots, position = [], [], 0
+    for i, (start, end, kind, column, value) in enumerate(spans):
+        name = f"s{i}"
+        pattern.append(re.escape(question[position:start]))
+        pattern.append(f"(?P<{name}>{_SLOT_PATTERNS[kind]})")
+        slots.append(Slot(name=name, kind=kind, column=column))
+        position = end
+        if kind == 'value':
+            literal = render_literal(value)
+            parts = [f"{{{name}}}" if i % 2 and part == literal else part
+                     for i, part in enumerate(parts)]
+        else:
+            parts = [_number_literal(value).sub(f"{{{name}}}", part) if i % 2 == 0 else part
+                     for i, part in enumerate(parts)]
+    pattern.append(re.escape(question[position:]))
+    if not slots or _unbound_literals(parts):
+        # 沒有槽位，或有條件不是來自問題（多半沿用了前幾輪的篩選）
+        return None
+
+    return SQLTemplate(pattern=''.join(pattern), slots=slots, sql=''.join(parts), example=question)
+
+
+def sales_domains() -> Dict[str, list]:
+    """Low-cardinality text columns of sales and their values, from the
+    cached schema introspection."""
+    from tools.db import get_pool
+    from tools.sql_schema import get_introspector
+
+    pool = get_pool()
+    if not pool:
+        return {}
+    try:
+        with pool.connection() as connection:
+            description = get_introspector().describe(connection, 'sales', pool.dialect)
+    except Exception:
+        return {}
+    if not description:
+        return {}
+    return {c['name']: c['values'] for c in description['columns'] if 'values' in c}
+
+
+class SQLTemplateStore:
+    """Thread-safe set of learned templates persisted as JSON."""
+
+    def __init__(self, path: Optional[str] = SQL_TEMPLATE_PATH, max_templates: int = SQL_TEMPLATE_MAX,
+                 domains: Callable[[], Dict[str, list]] = sales_domains):
+        self.path = path
+        self.max_templates = max_templates
+        self.domains = domains
+        self._templates: Dict[str, SQLTemplate] = {}
+        self._compiled: Dict[str, re.Pattern] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if path and os.path.exists(path):
+            self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+        for entry in entries:
+            template = SQLTemplate(**entry)
+            self._templates[template.pattern] = template
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = [t.model_dump() for t in self._templates.values()]
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(temporary, self.path)
+
+    def _regex(self, pattern: str) -> re.Pattern:
+        compiled = self._compiled.get(pattern)
+        if compiled is None:
+            compiled = self._compiled[pattern] = re.compile(pattern)
+        return compiled
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def learn(self, question: str, sql: str) -> Optional[SQLTemplate]:
+        template = generalize(question, sql, self.domains())
+        if template is None:
+            return None
+        with self._lock:
+            self._templates.pop(template.pattern, None)
+            self._templates[template.pattern] = template
+            while len(self._templates) > self.max_templates:
+                # 淘汰最久沒有被使用的樣板
+                oldest = min(self._templates.values(), key=lambda t: t.last_used)
+                del self._templates[oldest.pattern]
+            self._save()
+        return template
+
+    def learn_from_steps(self, question: str, intermediate_steps, chat_history=None) -> Optional[SQLTemplate]:
+        """Learn from an agent turn that opened the conversation and ran
+        exactly one successful SQL query."""
+        if chat_history:
+            # 後續問題會沿用前面的條件，學成樣板後會套用到其他對話
+            return None
+        queries = [(action, observation) for action, observation in intermediate_steps
+                   if getattr(action, 'tool', None) == SQL_TOOL_NAME]
+        if len(queries) != 1:
+            return None
+        action, observation = queries[0]
+        if is_error_result(observation):
+            return None
+        tool_input = action.tool_input
+        sql = tool_input.get('query') if isinstance(tool_input, dict) else tool_input
+        return self.learn(question, sql) if sql else None
+
+    def match(self, question: str) -> Optional[TemplateMatch]:
+        question = normalize_question(question)
+        with self._lock:
+            templates = list(self._templates.values())
+        domains = None
+        for template in templates:
+            found = self._regex(template.pattern).fullmatch(question)
+            if not found:
+                continue
+            if domains is None and any(s.kind == 'value' for s in template.slots):
+                domains = self.domains()
+            values = {s.name: _slot_value(s, found.group(s.name), domains or {})
+                      for s in template.slots}
+            if any(value is None for value in values.values()):
+                continue
+            with self._lock:
+                template.hits += 1
+                template.last_used = time.time()
+                self.hits += 1
+            return TemplateMatch(template=template, sql=template.render(values))
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def forget(self, template: SQLTemplate) -> None:
+        """Drop a template whose SQL failed."""
+        with self._lock:
+            if self._templates.pop(template.pattern, None) is not None:
+                self._save()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'templates': len(self._templates),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+_template_store = None
+
+
+def get_template_store() -> Optional[SQLTemplateStore]:
+    global _template_store
+    if not SQL_TEMPLATES:
+        return None
+    if _template_store is None:
+        _template_store = SQLTemplateStore()
+    return _template_store
@@ -0,0 +1,97 @@
+import re
+
+# 字串常值與識別字引號內的內容不做任何正規化
+_QUOTED = re.compile(r"""('(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*"|`[^`]*`)""")
+_LINE_COMMENT = re.compile(r"(--[^\n]*|#[^\n]*)")
+_BLOCK_COMMENT = re.compile(r"/\*(?!\+).*?\*/", re.S)
+
+READ_ONLY_VERBS = ('select', 'with', 'show', 'describe', 'desc', 'explain')
+
+_WRITE_KEYWORDS = re.compile(
+    r"\b(insert(?!\s*\()|update|delete|replace(?!\s*\()|drop|alter|create|truncate|grant|revoke|"
+    r"call|set|load|handler|lock|unlock|rename|into\s+outfile|into\s+dumpfile)\b"
+)
+_NON_DETERMINISTIC = re.compile(
+    r"\b(now|curdate|curtime|current_date|current_time|current_timestamp|"
+    r"sysdate|utc_date|utc_time|utc_timestamp|rand|uuid|unix_timestamp|"
+    r"localtime|localtimestamp|connection_id|last_insert_id)\b"
+)
+_TABLE_REF = re.compile(r"\b(?:from|join)\s+`?([\w.]+)`?")
+
+
+def split_literals(sql: str) -> list:
+    """Split SQL into alternating (code, literal, code, ...) parts."""
+    return _QUOTED.split(sql)
+
+
+def strip_comments(sql: str) -> str:
+    """Remove SQL comments, keeping optimizer hints (/*+ ... */)."""
+    parts = split_literals(sql)
+    for i in range(0, len(parts), 2):
+        code = _BLOCK_COMMENT.sub(' ', parts[i])
+        parts[i] = _LINE_COMMENT.sub(' ', code)
+    return ''.join(parts)
+
+
+def normalize_sql(sql: str) -> str:
+    """Canonical form of a query: comments removed, whitespace collapsed,
+    keywords and identifiers lower-cased, trailing semicolon dropped.
+    String literals are kept verbatim."""
+    parts = split_literals(strip_comments(sql))
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r"\s+", ' ', parts[i]).lower()
+    normalized = ''.join(parts).strip()
+    return normalized.rstrip(';').strip()
+
+
+def code_only(sql: str) -> str:
+    """Normalized SQL with every string literal blanked out, for keyword checks.
+    Backquoted identifiers are kept, lower-cased."""
+    parts = split_literals(normalize_sql(sql))
+    for i in range(1, len(parts), 2):
+        parts[i] = parts[i].lower() if parts[i].startswith('`') else "''"
+    return ''.join(parts)
+
+
+def is_read_only(sql: str) -> bool:
+    """True for a single SELECT/SHOW/DESCRIBE/EXPLAIN statement that cannot
+    modify data or lock rows."""
+    code = code_only(sql)
+    if not code or ';' in code:
+        return False
+    verb = code.split(' ', 1)[0].lstrip('(')
+    if verb not in READ_ONLY_VERBS:
+        return False
+    if _WRITE_KEYWORDS.search(code):
+        return False
+    if re.search(r"\bfor\s+share\b|\block\s+in\s+share\s+mode\b|\binto\s+@", code):
+        return False
+    return True
+
+
+def is_cacheable(sql: str) -> bool:
+    """Read-only and free of functions whose value changes between calls."""
+    return is_read_only(sql) and not _NON_DETERMINISTIC.search(code_only(sql))
+
+
+def referenced_tables(sql: str) -> list:
+    """Tables named after FROM/JOIN, in order of first appearance."""
+    tables = []
+    for name in _TABLE_REF.findall(code_only(sql)):
+        name = name.split('.')[-1]
+        if name not in tables:
+            tables.append(name)
+    return tables
+
+
+def query_shape(sql: str) -> str:
+    """Normalized SQL with literals replaced by ``?`` and IN lists collapsed,
+    so queries differing only in constants share one shape."""
+    parts = split_literals(normalize_sql(sql))
+    for i in range(len(parts)):
+        if i % 2 == 1:
+            parts[i] = parts[i] if parts[i].startswith('`') else '?'
+        else:
+            parts[i] = re.sub(r"(?<![\w.])\d+(\.\d+)?\b", '?', parts[i])
+    shape = ''.join(parts)
+    return re.sub(r"\(\s*\?(\s*,\s*\?)*\s*\)", '(?)', shape)
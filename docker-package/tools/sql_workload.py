@@ -0,0 +1,113 @@
+import json
+import os
+import threading
+import time
+from typing import Iterator, List, Optional
+
+from tools.sql_utils import query_shape
+
+# 查詢工作負載紀錄檔（JSON Lines），預設停用；紀錄包含完整的 SQL，請指向程式目錄以外的位置
+SQL_WORKLOAD_LOG = os.getenv('SQL_WORKLOAD_LOG', '')
+# 檔案超過這個大小就輪替，最多保留 SQL_WORKLOAD_BACKUPS 個舊檔（.1 最新）
+SQL_WORKLOAD_MAX_BYTES = int(os.getenv('SQL_WORKLOAD_MAX_BYTES', str(20 * 2 ** 20)))
+SQL_WORKLOAD_BACKUPS = int(os.getenv('SQL_WORKLOAD_BACKUPS', '3'))
+
+
+class WorkloadLog:
+    """Append-only log of executed query shapes and their latencies.
+
+    Each line holds the shape, one concrete example of it (needed to run
+    EXPLAIN later) and the measured latency. tools/index_advisor.py reads it.
+    The file stays open between queries and is rotated once it reaches
+    ``max_bytes``.
+    """
+
+    def __init__(self, path: str, max_bytes: int = SQL_WORKLOAD_MAX_BYTES,
+                 backups: int = SQL_WORKLOAD_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _open(self) -> None:
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._size = self._file.tell()
+
+    def _rotate(self) -> None:
+        self._file.close()
+        self._file = None
+        if self.backups > 0:
+            for index in range(self.backups - 1, 0, -1):
+                older = f"{self.path}.{index}"
+                if os.path.exists(older):
+                    os.replace(older, f"{self.path}.{index + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def record(self, sql: str, latency_ms: float, rows: Optional[int] = None) -> None:
+        entry = {
+            'ts': round(time.time(), 3),
+            'shape': query_shape(sql),
+            'sql': sql,
+            'latency_ms': round(latency_ms, 3),
+        }
+        if rows is not None:
+            entry['rows'] = rows
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        size = len(line.encode('utf-8'))
+        with self._lock:
+            if self._file is None:
+                self._open()
+            if self._size and self.max_bytes and self._size + size > self.max_bytes:
+                self._rotate()
+            self._file.write(line)
+            # 逐行寫出，索引建議工具可在服務執行中讀取
+            self._file.flush()
+            self._size += size
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def workload_files(path: str) -> List[str]:
+    """The log and its rotated copies, oldest first."""
+    backups = []
+    index = 1
+    while os.path.exists(f"{path}.{index}"):
+        backups.append(f"{path}.{index}")
+        index += 1
+    return backups[::-1] + ([path] if os.path.exists(path) else [])
+
+
+def read_workload(path: str) -> Iterator[dict]:
+    """Yield the entries of a workload log and its rotated copies, skipping
+    malformed lines."""
+    for name in workload_files(path):
+        with open(name, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+_workload_log = None
+
+
+def get_workload_log() -> Optional[WorkloadLog]:
+    global _workload_log
+    if not SQL_WORKLOAD_LOG:
+        return None
+    if _workload_log is None:
+        _workload_log = WorkloadLog(SQL_WORKLOAD_LOG)
+    return _workload_log
@@ -0,0 +1,271 @@
+"""Embedded SQLite backend for local runs, tests and benchmarks.
+
+Selected with CLEARDB_DATABASE_URL=sqlite:// (in-memory) or
+sqlite:///path/to/file.db. A database without a sales table is created from
+init.sql. Connections mimic the small part of the pymysql API the tools use
+(dict rows, %s placeholders, begin/commit/rollback/ping), and a handful of
+MySQL functions the agent writes (YEAR, MONTH, DATE_FORMAT, ...) are
+registered so its queries run unchanged.
+"""
+import datetime
+import os
+import re
+import sqlite3
+import time
+from typing import Optional
+
+from tools.db import ConnectionPool, DB_POOL_SIZE
+from tools.sql_utils import split_literals
+
+INIT_SQL_PATH = os.getenv(
+    'SQLITE_INIT_SQL',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'init.sql')
+)
+SQLITE_MAX_EXECUTION_MS = int(os.getenv('SQL_MAX_EXECUTION_MS', '15000'))
+
+# MySQL DATE_FORMAT 格式碼對應的 strftime 格式
+_DATE_FORMAT_CODES = {
+    'Y': '%Y', 'y': '%y', 'm': '%m', 'd': '%d', 'H': '%H', 'i': '%M',
+    's': '%S', 'M': '%B', 'b': '%b', 'W': '%A', 'a': '%a', '%': '%%',
+}
+
+
+def _as_date(value) -> Optional[datetime.datetime]:
+    if value is None:
+        return None
+    text = str(value)
+    try:
+        return datetime.datetime.fromisoformat(text)
+    except ValueError:
+        return datetime.datetime.fromisoformat(text[:10])
+
+
+def _date_part(attribute: str):
+    def function(value):
+        date = _as_date(value)
+        return getattr(date, attribute) if date else None
+    return function
+
+
+def _quarter(value):
+    date = _as_date(value)
+    return (date.month - 1) // 3 + 1 if date else None
+
+
+def date_format(value, pattern):
+    """MySQL DATE_FORMAT of a date, datetime or ISO date string."""
+    date = _as_date(value)
+    if date is None or pattern is None:
+        return None
+    result = []
+    characters = iter(pattern)
+    for character in characters:
+        if character != '%':
+            result.append(character)
+            continue
+        code = next(characters, '')
+        if code == 'c':
+            result.append(str(date.month))
+        elif code == 'e':
+            result.append(str(date.day))
+        else:
+            result.append(date.strftime(_DATE_FORMAT_CODES.get(code, code)))
+    return ''.join(result)
+
+
+def _register_functions(connection: sqlite3.Connection) -> None:
+    connection.create_function('YEAR', 1, _date_part('year'), deterministic=True)
+    connection.create_function('MONTH', 1, _date_part('month'), deterministic=True)
+    connection.create_function('DAY', 1, _date_part('day'), deterministic=True)
+    connection.create_function('DAYOFMONTH', 1, _date_part('day'), deterministic=True)
+    connection.create_function('QUARTER', 1, _quarter, deterministic=True)
+    connection.create_function('DATE_FORMAT', 2, date_format, deterministic=True)
+    connection.create_function('CONCAT', -1, lambda *a: None if None in a else ''.join(map(str, a)),
+                               deterministic=True)
+    connection.create_function('NOW', 0, lambda: datetime.datetime.now().isoformat(' ', 'seconds'))
+    connection.create_function('CURDATE', 0, lambda: datetime.date.today().isoformat())
+
+
+def _placeholders(sql: str) -> str:
+    """Convert pymysql-style %s placeholders to SQLite's ``?``."""
+    parts = split_literals(sql)
+    for i in range(0, len(parts), 2):
+        parts[i] = parts[i].replace('%s', '?').replace('%%', '%')
+    return ''.join(parts)
+
+
+class SQLiteCursor:
+    """DB-API cursor returning rows as dicts, like pymysql's DictCursor.
+
+    Rows are read lazily, so iterating the cursor streams the result the
+    way an unbuffered MySQL cursor does.
+    """
+
+    def __init__(self, connection: 'SQLiteConnection'):
+        self._connection = connection
+        self._cursor = connection.raw.cursor()
+
+    def execute(self, sql: str, params=None):
+        if params is not None:
+            sql = _placeholders(sql)
+        self._connection.arm_timeout()
+        return self._cursor.execute(sql, tuple(params) if params is not None else ())
+
+    def executemany(self, sql: str, seq_of_params):
+        self._connection.arm_timeout()
+        return self._cursor.executemany(_placeholders(sql), seq_of_params)
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return dict(row) if row is not None else None
+
+    def fetchall(self):
+        return [dict(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        for row in self._cursor:
+            yield dict(row)
+
+    def close(self):
+        self._cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SQLiteConnection:
+    """A sqlite3 connection wrapped in the pymysql calls the tools rely on."""
+
+    def __init__(self, raw: sqlite3.Connection, max_execution_ms: int = SQLITE_MAX_EXECUTION_MS):
+        self.raw = raw
+        self.max_execution_ms = max_execution_ms
+        self._deadline = None
+        if max_execution_ms > 0:
+            # 每執行一批虛擬機指令檢查一次是否逾時
+            raw.set_progress_handler(self._check_deadline, 10000)
+
+    def _check_deadline(self) -> int:
+        return 1 if self._deadline is not None and time.monotonic() > self._deadline else 0
+
+    def arm_timeout(self) -> None:
+        if self.max_execution_ms > 0:
+            self._deadline = time.monotonic() + self.max_execution_ms / 1000
+
+    def cursor(self, cursorclass=None) -> SQLiteCursor:
+        # cursorclass 只為與 pymysql 相容，SQLite 游標本來就是逐列讀取
+        return SQLiteCursor(self)
+
+    def begin(self) -> None:
+        self.raw.execute("BEGIN")
+
+    def commit(self) -> None:
+        if self.raw.in_transaction:
+            self.raw.commit()
+
+    def rollback(self) -> None:
+        if self.raw.in_transaction:
+            self.raw.rollback()
+
+    def ping(self, reconnect: bool = False) -> None:
+        pass
+
+    def close(self) -> None:
+        self.raw.close()
+
+
+def load_init_sql(connection: sqlite3.Connection, path: str = INIT_SQL_PATH) -> None:
+    """Create the schema and seed data from a MySQL init script."""
+    with open(path, encoding='utf-8') as f:
+        script = f.read()
+    connection.executescript(mysql_to_sqlite(script))
+
+
+def _masked(script: str) -> str:
+    """``script`` with string literals blanked out, keeping every position."""
+    parts = split_literals(script)
+    return ''.join(part if i % 2 == 0 else ' ' * len(part) for i, part in enumerate(parts))
+
+
+def mysql_to_sqlite(script: str) -> str:
+    """Drop the MySQL-only parts of a DDL script (table options, partitioning).
+
+    A table partitioned by RANGE on a column gets an index on that column
+    instead, the closest SQLite equivalent for range pruning."""
+    masked = _masked(script)
+    pieces, position = [], 0
+    for create in re.finditer(r"\bcreate\s+table\s+(?:if\s+not\s+exists\s+)?`?(\w+)`?", masked, re.I):
+        start = masked.find('(', create.end())
+        if start < 0:
+            continue
+        depth, end = 0, start
+        for end in range(start, len(masked)):
+            if masked[end] == '(':
+                depth += 1
+            elif masked[end] == ')':
+                depth -= 1
+                if depth == 0:
+                    break
+        terminator = masked.find(';', end)
+        if terminator < 0:
+            terminator = len(masked)
+        options = masked[end + 1:terminator]
+        pieces.append(script[position:end + 1])
+        position = terminator
+        partition = re.search(r"partition\s+by\s+range\s*(?:columns\s*)?\(\s*(?:to_days\s*\()?\s*`?(\w+)",
+                              options, re.I)
+        if partition:
+            table, column = create.group(1), partition.group(1)
+            pieces.append(f";\nCREATE INDEX idx_{table}_{column.lower()} ON {table} ({column})")
+    pieces.append(script[position:])
+
+    parts = split_literals(''.join(pieces))
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r"\bAUTO_INCREMENT\b", '', parts[i], flags=re.I)
+    return ''.join(parts)
+
+
+class SQLitePool(ConnectionPool):
+    """Pool of embedded SQLite connections.
+
+    ``sqlite://`` is an in-memory database; it lives in a single connection,
+    so the pool size is 1 and queries are serialized. ``sqlite:///path``
+    uses a file in WAL mode, which allows concurrent readers.
+    """
+
+    dialect = 'sqlite'
+
+    def __init__(self, db_url: str, size: int = DB_POOL_SIZE):
+        self.path = db_url.split('://', 1)[1]
+        # 與 SQLAlchemy 相同：sqlite:///rel.db 為相對路徑，sqlite:////abs.db 為絕對路徑
+        if self.path.startswith('/'):
+            self.path = self.path[1:]
+        self.in_memory = self.path in ('', ':memory:')
+        super().__init__(db_url, 1 if self.in_memory else size)
+        self._initialized = False
+
+    def _connect(self):
+        raw = sqlite3.connect(
+            ':memory:' if self.in_memory else self.path,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        raw.row_factory = sqlite3.Row
+        _register_functions(raw)
+        if not self.in_memory:
+            raw.execute("PRAGMA journal_mode=WAL")
+        with self._lock:
+            if not self._initialized or self.in_memory:
+                exists = raw.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sales'"
+                ).fetchone()
+                if not exists:
+                    load_init_sql(raw)
+                self._initialized = True
+        return SQLiteConnection(raw)
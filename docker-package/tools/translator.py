@@ -1,26 +1,32 @@
-from pptx import Presentation
-from pptx.enum.shapes import MSO_SHAPE_TYPE
-from pptx.enum.dml import MSO_THEME_COLOR_INDEX, MSO_COLOR_TYPE
-from pptx.dml.color import RGBColor
-from pptx.util import Pt
 import asyncio
-import nest_asyncio
+import logging
 import tempfile
 import os
 import chainlit as cl
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from copy import deepcopy
 from langchain.tools import BaseTool
 from pydantic import BaseModel, Field
-from typing import Type, Optional, Dict, Any
-import time
+from typing import Type
+
+from tools.llm_scheduler import BULK, http_clients, llm_context
+from tools.logging_setup import get_logger, log_event
+from tools.metrics import TRANSLATED_SEGMENTS, TRANSLATION_PHASE_SECONDS
+
+logger = get_logger('translator')
 
 # 定義輸出路徑
 OUTPUT_PATH = 'output'
 
-nest_asyncio.apply()
+# python-pptx 與 OpenAI 用戶端在第一次翻譯時才載入，縮短啟動時間
+_translation_model = None
+
+
+def get_translation_model():
+    """翻譯用的 ChatOpenAI，整個程序共用同一個用戶端與連線"""
+    global _translation_model
+    if _translation_model is None:
+        from langchain_openai import ChatOpenAI
+        _translation_model = ChatOpenAI(temperature=0, **http_clients())
+    return _translation_model
 
 class PowerPointTranslatorInput(BaseModel):
     """PowerPoint 翻譯工具的輸入模型"""
@@ -52,29 +58,25 @@ class PowerPointTranslator(BaseTool):
     args_schema: Type[BaseModel] = PowerPointTranslatorInput
 
     def _run(self, olang: str, tlang: str) -> str:
-        """同步運行方法"""
-        loop = asyncio.get_event_loop()
-        return loop.run_until_complete(self._arun(olang=olang, tlang=tlang))
+        """同步運行方法，只在沒有執行中的 event loop 時使用（代理一律走 _arun）"""
+        return asyncio.run(self._arun(olang=olang, tlang=tlang))
 
     async def _arun(self, olang: str, tlang: str) -> str:
         """異步運行方法，處理 PowerPoint 翻譯請求"""
         try:
-            print(f"\nStarting translation tool...")
-            print(f"Source language: {olang}")
-            print(f"Target language: {tlang}")
+            log_event(logger, logging.INFO, 'translate.requested', olang=olang, tlang=tlang)
             
             # 等待用戶上傳文件
-            print("Waiting for file upload...")
-            file_path = await upload_file()
-            print(f"Upload result: {file_path}")
+            with TRANSLATION_PHASE_SECONDS.time(phase='upload'):
+                file_path = await upload_file()
+            log_event(logger, logging.INFO, 'translate.uploaded', path=file_path)
             
             if not file_path:
                 return "No file received or upload failed"
 
             # 執行翻譯
-            print("Starting translation...")
             output_path = await translate_ppt(file_path, olang, tlang)
-            print(f"Translation result: {output_path}")
+            log_event(logger, logging.INFO, 'translate.finished', output=output_path)
             
             # 返回結果
             if output_path:
@@ -85,7 +87,7 @@ class PowerPointTranslator(BaseTool):
                 return "Error occurred during translation"
                 
         except Exception as e:
-            print(f"Translation tool execution error: {str(e)}")
+            log_event(logger, logging.ERROR, 'translate.tool_error', exc_info=e, error=str(e))
             return f"Error during translation: {str(e)}"
 
 async def translate_text(text: str, olang: str, tlang: str) -> str:
@@ -102,11 +104,8 @@ async def translate_text(text: str, olang: str, tlang: str) -> str:
     if not text.strip():
         return text
 
-    print(f"\n正在翻譯文本:")
-    print(f"原文 ({olang}): {text}")
-
-    # 創建 ChatGPT 模型
-    model = ChatOpenAI(temperature=0)
+    # 取得 ChatGPT 模型
+    model = get_translation_model()
     
     # 創建系統提示
     system_message = f"""You are a professional translator. Translate the following text from {olang} to {tlang}.
@@ -128,10 +127,15 @@ async def translate_text(text: str, olang: str, tlang: str) -> str:
     ]
     
     # 執行翻譯
-    response = await model.ainvoke(messages)
+    TRANSLATED_SEGMENTS.inc()
+    # 逐段翻譯屬於批次工作，排在使用者的對話之後
+    with llm_context(BULK):
+        response = await model.ainvoke(messages)
     translated_text = response.content.strip()
     
-    print(f"譯文 ({tlang}): {translated_text}\n")
+    # 每段文字都會經過這裡，只抽樣記錄（LOG_SAMPLE_RATES 的 translate.segment）
+    log_event(logger, logging.DEBUG, 'translate.segment', olang=olang, tlang=tlang,
+              source=text, translation=translated_text)
     return translated_text
 
 def get_text_frame_properties(text_frame):
@@ -189,6 +193,8 @@ def apply_color_properties(color_obj, properties):
     """應用顏色屬性"""
     if not properties or not color_obj:
         return
+    from pptx.dml.color import RGBColor
+    from pptx.enum.dml import MSO_THEME_COLOR_INDEX
         
     try:
         # 如果有 RGB 值，直接設置 RGB 顏色
@@ -203,7 +209,7 @@ def apply_color_properties(color_obj, properties):
             if properties['brightness'] is not None:
                 color_obj.brightness = properties['brightness']
     except Exception as e:
-        print(f"設置顏色時發生錯誤: {str(e)}")
+        log_event(logger, logging.WARNING, 'translate.color_error', error=str(e))
         pass  # 如果設置失敗，保持原有顏色
 
 def apply_text_frame_properties(text_frame, properties):
@@ -252,6 +258,8 @@ async def translate_group_shape(shape, olang: str, tlang: str) -> None:
         olang (str): 原始語言代碼
         tlang (str): 目標語言代碼
     """
+    from pptx.enum.shapes import MSO_SHAPE_TYPE
+
     try:
         if not hasattr(shape, 'shapes'):
             return
@@ -265,7 +273,7 @@ async def translate_group_shape(shape, olang: str, tlang: str) -> None:
                 # 翻譯單個形狀
                 await translate_shape(child_shape, olang, tlang)
     except Exception as e:
-        print(f"翻譯群組形狀時發生錯誤: {str(e)}")
+        log_event(logger, logging.ERROR, 'translate.group_shape_error', error=str(e))
         raise
 
 async def translate_shape(shape, olang: str, tlang: str) -> None:
@@ -276,6 +284,8 @@ async def translate_shape(shape, olang: str, tlang: str) -> None:
         olang (str): 原始語言代碼
         tlang (str): 目標語言代碼
     """
+    from pptx.enum.shapes import MSO_SHAPE_TYPE
+
     try:
         # 處理群組形狀
         if shape.shape_type == MSO_SHAPE_TYPE.GROUP:
@@ -327,7 +337,7 @@ async def translate_shape(shape, olang: str, tlang: str) -> None:
         apply_text_frame_properties(text_frame, text_frame_props)
         
     except Exception as e:
-        print(f"翻譯形狀時發生錯誤: {str(e)}")
+        log_event(logger, logging.ERROR, 'translate.shape_error', error=str(e))
         raise
 
 async def translate_ppt(file_path: str, olang: str, tlang: str) -> str:
@@ -341,6 +351,8 @@ async def translate_ppt(file_path: str, olang: str, tlang: str) -> str:
     Returns:
         str: 翻譯後的文件路徑
     """
+    from pptx import Presentation
+
     try:
         # 1. 建立輸出目錄
         os.makedirs(OUTPUT_PATH, exist_ok=True)
@@ -352,26 +364,26 @@ async def translate_ppt(file_path: str, olang: str, tlang: str) -> str:
         output_path = os.path.join(OUTPUT_PATH, output_file)
         
         # 3. 載入 PowerPoint
-        print("\nStarting PowerPoint translation...")
-        print(f"Source language: {olang}")
-        print(f"Target language: {tlang}")
+        log_event(logger, logging.INFO, 'translate.started', file=file_name, olang=olang, tlang=tlang)
         await cl.Message(content=f"Starting translation...\nFrom {olang} to {tlang}").send()
         
-        presentation = Presentation(file_path)
+        with TRANSLATION_PHASE_SECONDS.time(phase='parse'):
+            presentation = Presentation(file_path)
         total_slides = len(presentation.slides)
         
         # 4. 翻譯每個投影片
-        for index, slide in enumerate(presentation.slides, 1):
-            progress_msg = f"Translating slide {index}/{total_slides}..."
-            print(f"\n{progress_msg}")
-            await cl.Message(content=progress_msg).send()
-            for shape in slide.shapes:
-                await translate_shape(shape, olang, tlang)
+        with TRANSLATION_PHASE_SECONDS.time(phase='translate'):
+            for index, slide in enumerate(presentation.slides, 1):
+                progress_msg = f"Translating slide {index}/{total_slides}..."
+                log_event(logger, logging.DEBUG, 'translate.slide', slide=index, slides=total_slides)
+                await cl.Message(content=progress_msg).send()
+                for shape in slide.shapes:
+                    await translate_shape(shape, olang, tlang)
         
         # 5. 儲存翻譯後的文件
-        print("\nSaving translated file...")
         await cl.Message(content="Translation completed, generating file...").send()
-        presentation.save(output_path)
+        with TRANSLATION_PHASE_SECONDS.time(phase='save'):
+            presentation.save(output_path)
         
         # 6. 刪除臨時文件
         if os.path.exists(file_path):
@@ -394,12 +406,12 @@ async def translate_ppt(file_path: str, olang: str, tlang: str) -> str:
             ).send()
         except Exception as e:
             # 在非 Chainlit 環境中，只打印消息
-            print("\nTranslation completed! File saved to:", output_path)
+            log_event(logger, logging.INFO, 'translate.saved', output=output_path)
         
         return output_path
         
     except Exception as e:
-        print(f"\nError during translation process: {str(e)}")
+        log_event(logger, logging.ERROR, 'translate.error', exc_info=e, error=str(e))
         if os.path.exists(file_path):
             os.remove(file_path)
         raise
@@ -421,17 +433,16 @@ async def upload_file() -> str:
         ).send()
 
         if not files or len(files) == 0:
-            print("No file received")
+            log_event(logger, logging.INFO, 'upload.no_file')
             return None
 
         file = files[0]
-        print(f"\nFile received: {file.name}")
-        print(f"File object attributes: {dir(file)}")  # 打印文件物件的所有屬性
+        log_event(logger, logging.INFO, 'upload.received', file=file.name)
         
         # 檢查檔案副檔名
         file_name = file.name.lower()
         if not file_name.endswith(('.ppt', '.pptx')):
-            print(f"Unsupported file format: {file_name}")
+            log_event(logger, logging.WARNING, 'upload.unsupported', file=file_name)
             await cl.Message(content="Please upload a .ppt or .pptx file").send()
             return None
 
@@ -446,18 +457,16 @@ async def upload_file() -> str:
                 with open(file.path, 'rb') as source:
                     f.write(source.read())
             elif hasattr(file, 'content'):
-                print(f" use File content")
                 f.write(file.content)
             elif hasattr(file, 'bytes'):
-                print(f" use File bytes")
                 f.write(file.bytes)
             else:
-                print("No valid file content found")
+                log_event(logger, logging.WARNING, 'upload.no_content', file=file.name)
                 return None
             
-        print(f"File saved to: {temp_file_path}")
+        log_event(logger, logging.DEBUG, 'upload.saved', path=temp_file_path)
         return temp_file_path
         
     except Exception as e:
-        print(f"Error during file upload: {str(e)}")
+        log_event(logger, logging.ERROR, 'upload.error', exc_info=e, error=str(e))
         return None 
\ No newline at end of file